@@ -0,0 +1,65 @@
+"""Throughput of the file store checksum algorithms and read sizes.
+
+Run with::
+
+    python benchmarks/bench_checksum.py --size_mb=500
+
+The package is random data so it is not compressible, like most of a real tar.gz. The
+file is read once before timing so the numbers are for hashing from the page cache and
+not for the disk.
+"""
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import os
+import tempfile
+import time
+
+import fire
+
+from submit_ce.file_store.checksum import ALGORITHMS, checksum_file
+
+
+def bench_checksum(
+    size_mb: int = 300,
+    read_sizes: tuple = (4096, 64 * 1024, 1024 * 1024, 8 * 1024 * 1024),
+    algorithms: tuple = ("md5", "sha256", "blake2b", "md5,sha256", "md5,blake2b"),
+    repeat: int = 3,
+) -> None:
+    """Print MB/s for each algorithm (comma separated for several in one pass) and read
+    size."""
+    with tempfile.NamedTemporaryFile(suffix=".tar.gz") as package:
+        for _ in range(size_mb):
+            package.write(os.urandom(1024 * 1024))
+        package.flush()
+        checksum_file(package.name, ["md5"])  # warm the page cache
+
+        print(
+            f"{size_mb} MB package, best of {repeat}, "
+            f"algorithms available: {', '.join(ALGORITHMS)}"
+        )
+        print(
+            f"{'algorithms':<14}"
+            + "".join(f"{f'{size // 1024} KB reads':>16}" for size in read_sizes)
+        )
+        for names in algorithms:
+            names = names.split(",") if isinstance(names, str) else list(names)
+            row = f"{','.join(names):<14}"
+            for read_size in read_sizes:
+                best = min(_time(package.name, names, read_size) for _ in range(repeat))
+                row += f"{f'{size_mb / best:,.0f} MB/s':>16}"
+            print(row)
+
+
+def _time(path: str, algorithms: list, read_size: int) -> float:
+    start = time.perf_counter()
+    checksum_file(path, algorithms, read_size)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    fire.Fire(bench_checksum)
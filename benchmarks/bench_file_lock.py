@@ -0,0 +1,175 @@
+"""Contention between file writers and other requests with the ``row`` and ``lease``
+file locks.
+
+Run with::
+
+    python benchmarks/bench_file_lock.py --uploaders=50 --submissions=5
+
+Simulates the `legacy_file_lock` settings of the legacy implementation. Uploaders write
+the files of a few hot submissions and metadata writers, like setLicense, take the row
+lock of the same submissions for a moment. Both need a connection from a pool of
+`pool_size`. The submission row lock is a `threading.Lock` and the IO of an upload is a
+sleep of `upload_s`, but the leases are real `submit_ce.file_store.lease.LeaseFile`
+files.
+
+With ``row`` an upload holds a connection and the row lock for all of its IO. With
+``lease`` it holds them only to take the lease and to publish, so metadata writers and
+the pool are not held up by uploads.
+"""
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import fire
+
+from submit_ce.file_store.lease import LeaseFile, LeaseHeld
+
+
+class _Db:
+    """Connection pool and submission row locks."""
+
+    def __init__(self, pool_size: int, submissions: int):
+        self.pool = threading.BoundedSemaphore(pool_size)
+        self.rows = [threading.Lock() for _ in range(submissions)]
+        self.hold_times = []
+        self._hold_lock = threading.Lock()
+
+    def locked(self, submission: int, hold_s: float, fn=None):
+        """Take a connection and the row lock, sleep `hold_s`, run `fn` and let go."""
+        with self.pool, self.rows[submission]:
+            start = time.perf_counter()
+            time.sleep(hold_s)
+            result = fn() if fn is not None else None
+            with self._hold_lock:
+                self.hold_times.append(time.perf_counter() - start)
+            return result
+
+
+def _upload_row(
+    db: _Db, lease: LeaseFile, submission: int, upload_s: float, publish_s: float
+) -> None:
+    db.locked(submission, upload_s + publish_s)
+
+
+def _upload_lease(
+    db: _Db, lease: LeaseFile, submission: int, upload_s: float, publish_s: float
+) -> None:
+    delay = 0.005
+    while True:
+        try:
+            held = db.locked(submission, 0, lambda: lease.acquire(ttl=60))
+            break
+        except LeaseHeld:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+    time.sleep(upload_s)
+    db.locked(submission, publish_s, lambda: lease.release(held, published=True))
+
+
+def _run(
+    mode: str,
+    uploaders: int,
+    submissions: int,
+    metadata_writers: int,
+    pool_size: int,
+    upload_s: float,
+    publish_s: float,
+    seed: int,
+) -> dict:
+    random.seed(seed)
+    db = _Db(pool_size, submissions)
+    upload = _upload_row if mode == "row" else _upload_lease
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp:
+        leases = [LeaseFile(Path(tmp) / f"{n}.lease.json") for n in range(submissions)]
+
+        def uploader(n: int):
+            submission = n % submissions
+            upload(
+                db,
+                leases[submission],
+                submission,
+                upload_s * random.uniform(0.5, 1.5),
+                publish_s,
+            )
+
+        def metadata_writer(n: int):
+            time.sleep(random.uniform(0, upload_s * uploaders / submissions / 2))
+            start = time.perf_counter()
+            db.locked(n % submissions, 0.001)
+            latencies.append(time.perf_counter() - start)
+
+        threads = [
+            threading.Thread(target=uploader, args=(n,)) for n in range(uploaders)
+        ]
+        threads += [
+            threading.Thread(target=metadata_writer, args=(n,))
+            for n in range(metadata_writers)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "wall": wall,
+        "max_hold": max(db.hold_times),
+        "mean_hold": statistics.mean(db.hold_times),
+        "metadata_p50": latencies[len(latencies) // 2],
+        "metadata_p95": latencies[int(len(latencies) * 0.95)],
+    }
+
+
+def bench_file_lock(
+    uploaders: int = 50,
+    submissions: int = 5,
+    metadata_writers: int = 200,
+    pool_size: int = 10,
+    upload_s: float = 0.2,
+    publish_s: float = 0.002,
+    seed: int = 1,
+) -> None:
+    """Print wall time, row lock hold times and the latency of metadata writers for each
+    mode."""
+    print(
+        f"{uploaders} uploaders and {metadata_writers} metadata writers on "
+        f"{submissions} submissions, "
+        f"pool of {pool_size}, {upload_s}s uploads"
+    )
+    print(
+        f"{'mode':<8}{'wall s':>10}{'max hold s':>14}{'mean hold s':>14}"
+        f"{'metadata p50 s':>18}{'metadata p95 s':>18}"
+    )
+    for mode in ("row", "lease"):
+        result = _run(
+            mode,
+            uploaders,
+            submissions,
+            metadata_writers,
+            pool_size,
+            upload_s,
+            publish_s,
+            seed,
+        )
+        print(
+            f"{mode:<8}{result['wall']:>10.2f}{result['max_hold']:>14.3f}"
+            f"{result['mean_hold']:>14.3f}{result['metadata_p50']:>18.3f}"
+            f"{result['metadata_p95']:>18.3f}"
+        )
+
+
+if __name__ == "__main__":
+    fire.Fire(bench_file_lock)
@@ -0,0 +1,201 @@
+"""Time to get pages of ``GET /v1/submissions`` from a SQLite database of millions of
+synthetic submissions.
+
+Run with::
+
+    python benchmarks/bench_listing.py --rows=2000000 --pages=50
+
+Makes the database with `tests.make_test_db`, loads `rows` submissions spread over
+`submitters` users, the stages and the types, updated over ten years, and builds the
+`LISTING_INDEXES`. For each filter it walks `pages` pages with the keyset cursor and
+compares the last of them with getting the same page with OFFSET, then does the same
+without the indexes. The plan SQLite chose for the first page is printed. Pass `db` to
+keep the database and use it again.
+"""
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import datetime
+import os
+import random
+import tempfile
+import time
+
+import fire
+from arxiv.db.models import Submission
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from submit_ce.fastapi.api.models.submission import SubmissionFilter
+from submit_ce.fastapi.implementations.submission_listing import (
+    LISTING_INDEXES,
+    create_listing_indexes,
+    select_submissions,
+)
+from tests.make_test_db import create_all_legacy_db
+
+NOW = datetime.datetime(2024, 1, 1)
+STAGES = (0, 1, 2, 3, 4, 5)
+STAGE_WEIGHTS = (5, 5, 10, 10, 20, 50)
+TYPES = ("new", "replacement", "cross", "withdrawal", "jref")
+TYPE_WEIGHTS = (60, 30, 5, 3, 2)
+
+
+def bench_listing(
+    rows: int = 2_000_000,
+    submitters: int = 50_000,
+    pages: int = 50,
+    limit: int = 100,
+    db: str = None,
+    batch: int = 50_000,
+) -> None:
+    """Print ms per page for each filter, walking `pages` pages of `limit`, with and
+    without the indexes."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = db or os.path.join(tmp, "listing.db")
+        engine = _make_db(path, rows, submitters, batch)
+        statements = []
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, parameters, context, many: (
+                statements.append((statement, parameters))
+            ),
+        )
+
+        with Session(engine) as session:
+            busy = session.execute(
+                select(Submission.submitter_id)
+                .group_by(Submission.submitter_id)
+                .order_by(func.count().desc())
+                .limit(1)
+            ).scalar_one()
+        filters = {
+            "all": SubmissionFilter(),
+            f"submitter {busy}": SubmissionFilter(submitter_id=str(busy)),
+            "stage 0": SubmissionFilter(stage=0),
+            "type cross": SubmissionFilter(type="cross"),
+            "stage 5, type new": SubmissionFilter(stage=5, type="new"),
+            "updated in 30 days": SubmissionFilter(
+                updated_since=NOW - datetime.timedelta(days=30)
+            ),
+        }
+        print(f"{rows} submissions, {submitters} submitters, pages of {limit}")
+        for indexed in (True, False):
+            if not indexed:
+                for index in LISTING_INDEXES:
+                    index.drop(engine, checkfirst=True)
+            print(f"\n{'with' if indexed else 'without'} the listing indexes")
+            print(
+                f"{'':<24}{'first ms':>10}{'mean ms':>10}{'last ms':>10}"
+                f"{'offset ms':>11}{'pages':>7}   plan"
+            )
+            for label, listing in filters.items():
+                with Session(engine) as session:
+                    statements.clear()
+                    times = _walk(session, listing, pages, limit)
+                    plan = _plan(engine, *statements[0])
+                    offset = _time(
+                        lambda: session.scalars(
+                            select_submissions(listing, None, limit).offset(
+                                limit * (len(times) - 1)
+                            )
+                        ).all()
+                    )
+                print(
+                    f"{label:<24}{times[0] * 1000:>10.1f}"
+                    f"{sum(times) / len(times) * 1000:>10.1f}{times[-1] * 1000:>10.1f}"
+                    f"{offset * 1000:>11.1f}{len(times):>7}   {plan}"
+                )
+        if db is not None:
+            create_listing_indexes(engine)
+
+
+def _make_db(path: str, rows: int, submitters: int, batch: int):
+    """The database at `path`, loaded with `rows` submissions unless it already has
+    them."""
+    engine = create_all_legacy_db(path)[0]
+    with Session(engine) as session:
+        existing = session.scalar(select(func.count()).select_from(Submission))
+    if existing >= rows:
+        create_listing_indexes(engine)
+        return engine
+
+    for (
+        index
+    ) in (
+        LISTING_INDEXES
+    ):  # loading is faster without them, they are built in one go after
+        index.drop(engine, checkfirst=True)
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for first in range(existing, rows, batch):
+        with engine.begin() as conn:
+            conn.execute(
+                Submission.__table__.insert(),
+                [_row(rng, submitters) for _ in range(first, min(first + batch, rows))],
+            )
+    print(
+        f"loaded {rows - existing} submissions in {time.perf_counter() - start:.1f} s"
+    )
+    elapsed = _time(lambda: create_listing_indexes(engine))
+    print(f"built the listing indexes in {elapsed:.1f} s")
+    return engine
+
+
+def _row(rng: random.Random, submitters: int) -> dict:
+    updated = NOW - datetime.timedelta(seconds=rng.randrange(10 * 365 * 24 * 3600))
+    return dict(
+        submitter_id=int(rng.paretovariate(1.2)) % submitters + 1,
+        submitter_name="Bench Mark",
+        submitter_email="bench@example.com",
+        userinfo=0,
+        agree_policy=1,
+        viewed=0,
+        stage=rng.choices(STAGES, STAGE_WEIGHTS)[0],
+        type=rng.choices(TYPES, TYPE_WEIGHTS)[0],
+        created=updated - datetime.timedelta(days=rng.randrange(30)),
+        updated=updated,
+        source_size=0,
+        allow_tex_produced=0,
+        is_oversize=0,
+        auto_hold=0,
+        remote_addr="127.0.0.1",
+        remote_host="",
+        package="",
+        must_process=1,
+        title=f"Synthetic submission {rng.random()}",
+    )
+
+
+def _walk(session: Session, listing: SubmissionFilter, pages: int, limit: int):
+    """Seconds of each page, walking up to `pages` pages."""
+    times, after = [], None
+    for _ in range(pages):
+        start = time.perf_counter()
+        page = session.scalars(select_submissions(listing, after, limit)).all()
+        times.append(time.perf_counter() - start)
+        if len(page) < limit:
+            break
+        after = (page[-1].updated, page[-1].submission_id)
+    return times
+
+
+def _plan(engine, statement: str, parameters) -> str:
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return "; ".join(row[-1] for row in plan)
+
+
+def _time(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    fire.Fire(bench_listing)
@@ -0,0 +1,155 @@
+"""Syscalls and time spent setting the modes and owner of a source tree.
+
+Run with::
+
+    python benchmarks/bench_permissions.py --files=20000
+
+Compares walking the tree to chown and chmod every path, as the store did after each
+upload, with `set_tree_modes` on a tree that is already right and on one with some paths
+wrong, and counts the mode and owner syscalls made by extracting a package, which sets
+them on the open files.
+"""
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import asyncio
+import io
+import os
+import tarfile
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import fire
+from fastapi import UploadFile
+
+from submit_ce.file_store.extract import FileModes
+from submit_ce.file_store.legacy_file_store import LegacyFileStore
+from submit_ce.file_store.permissions import set_tree_modes
+
+MODES = FileModes(file_mode=0o664, dir_mode=0o775, uid=os.geteuid(), gid=os.getegid())
+COUNTED = ("chown", "chmod", "fchown", "fchmod", "lstat")
+
+
+def bench_permissions(
+    files: int = 20000,
+    per_dir: int = 100,
+    wrong_share: float = 0.1,
+    workers: tuple = (1, 8),
+) -> None:
+    """Print syscalls and ms for each way of setting the modes of a tree of `files`
+    files."""
+    with tempfile.TemporaryDirectory() as root:
+        tree = os.path.join(root, "src")
+        paths = _make_tree(tree, files, per_dir)
+        set_tree_modes(tree, MODES)
+        print(f"{files} files in {files // per_dir} directories")
+        print(f"{'':<36}{'syscalls':>10}{'ms':>10}")
+
+        with _count() as calls:
+            elapsed = _time(lambda: _chmod_recurse(tree))
+        _report("walk, chown and chmod every path", calls, elapsed)
+
+        for n in workers:
+            with _count() as calls:
+                elapsed = _time(lambda: set_tree_modes(tree, MODES, n))
+            _report(f"set_tree_modes, right, {n} threads", calls, elapsed)
+
+        for n in workers:
+            for path in paths[:: int(1 / wrong_share)]:
+                os.chmod(path, 0o600)
+            with _count() as calls:
+                elapsed = _time(lambda: set_tree_modes(tree, MODES, n))
+            _report(
+                f"set_tree_modes, {wrong_share:.0%} wrong, {n} threads", calls, elapsed
+            )
+
+        package = _tar_gz(tree)
+        store = LegacyFileStore(
+            root_dir=os.path.join(root, "store"),
+            source_file_mode=MODES.file_mode,
+            source_dir_mode=MODES.dir_mode,
+        )
+        with _count() as calls:
+            elapsed = _time(
+                lambda: asyncio.run(
+                    store.store_source_package(
+                        12345678, UploadFile(io.BytesIO(package))
+                    )
+                )
+            )
+        _report("extract package, modes on the fds", calls, elapsed)
+
+
+def _make_tree(tree: str, files: int, per_dir: int) -> list:
+    paths = []
+    for i in range(files):
+        directory = os.path.join(tree, f"d{i // per_dir}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"f{i}.tex")
+        with open(path, "wb") as f:
+            f.write(b"x")
+        paths.append(path)
+    return paths
+
+
+def _chmod_recurse(parent: str) -> None:
+    """What the store did before, for comparison."""
+    for path, directories, names in os.walk(parent):
+        for directory in directories:
+            os.chown(os.path.join(path, directory), MODES.uid, MODES.gid)
+            os.chmod(os.path.join(path, directory), MODES.dir_mode)
+        for name in names:
+            os.chown(os.path.join(path, name), MODES.uid, MODES.gid)
+            os.chmod(os.path.join(path, name), MODES.file_mode)
+    os.chown(parent, MODES.uid, MODES.gid)
+    os.chmod(parent, MODES.dir_mode)
+
+
+def _tar_gz(tree: str) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz", compresslevel=1) as tar:
+        tar.add(tree, arcname=".")
+    return buf.getvalue()
+
+
+@contextmanager
+def _count():
+    """Count the calls of the mode, owner and stat functions of `os`."""
+    calls = Counter()
+    originals = {name: getattr(os, name) for name in COUNTED}
+
+    def counted(name):
+        def call(*args, **kwargs):
+            calls[name] += 1
+            return originals[name](*args, **kwargs)
+
+        return call
+
+    for name in COUNTED:
+        setattr(os, name, counted(name))
+    try:
+        yield calls
+    finally:
+        for name, original in originals.items():
+            setattr(os, name, original)
+
+
+def _report(label: str, calls: Counter, elapsed: float) -> None:
+    detail = ", ".join(f"{name} {calls[name]}" for name in COUNTED if calls[name])
+    print(f"{label:<36}{sum(calls.values()):>10}{elapsed * 1000:>10.1f}   {detail}")
+
+
+def _time(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    fire.Fire(bench_permissions)
@@ -0,0 +1,138 @@
+"""Cost of detecting file types and main TeX files as a large package is extracted.
+
+Run with::
+
+    python benchmarks/bench_tex_detect.py --files=5000
+
+Prints the time to store the package, which detects inline, the time the detection
+itself takes on the heads of the files, the time to rank the main files of the manifest,
+and for comparison the time to find them by walking the source and reading every TeX
+file after extraction.
+"""
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import asyncio
+import io
+import os
+import re
+import tarfile
+import tempfile
+import time
+
+import fire
+from fastapi import UploadFile
+
+from submit_ce.file_store.legacy_file_store import LegacyFileStore
+from submit_ce.file_store.manifest import HEAD_SIZE, ManifestEntry, summarize_source
+
+PREAMBLE = (
+    b"\\documentclass[11pt]{article}\n"
+    + b"\\usepackage{amsmath}\n" * 50
+    + b"\\begin{document}\n"
+)
+BODY = b"Some text with $x^2$ math and a \\cite{ref}.\n" * 400
+
+
+def bench_tex_detect(
+    files: int = 5000, tex_share: float = 0.2, main_files: int = 3, repeat: int = 3
+) -> None:
+    """Print timings for a package of `files` files, `tex_share` of them TeX and
+    `main_files` of those main files."""
+    contents = _contents(files, tex_share, main_files)
+    package = _tar_gz(contents)
+    heads = [(name, data[:HEAD_SIZE]) for name, data in contents.items()]
+    print(
+        f"{files} files, {sum(map(len, contents.values())) / 1e6:.1f} MB unpacked, "
+        f"{len(package) / 1e6:.1f} MB package, best of {repeat}"
+    )
+
+    with tempfile.TemporaryDirectory() as root:
+        store = LegacyFileStore(root_dir=root)
+        best = min(
+            _time(
+                lambda: asyncio.run(
+                    store.store_source_package(
+                        12345678, UploadFile(io.BytesIO(package))
+                    )
+                )
+            )
+            for _ in range(repeat)
+        )
+        print(f"{'store package with detection':<34}{best * 1000:>10.1f} ms")
+
+        best = min(
+            _time(
+                lambda: [
+                    ManifestEntry.from_head(name, 0, "", None, head)
+                    for name, head in heads
+                ]
+            )
+            for _ in range(repeat)
+        )
+        print(
+            f"{'detection of the heads':<34}{best * 1000:>10.1f} ms"
+            f"{best / files * 1e6:>10.1f} us/file"
+        )
+
+        entries = asyncio.run(store.list_source_files(12345678))
+        best = min(_time(lambda: summarize_source(entries)) for _ in range(repeat))
+        print(
+            f"{'rank main files from manifest':<34}{best * 1000:>10.1f} ms"
+            f"   {', '.join(summarize_source(entries).main_files)}"
+        )
+
+        source = os.path.join(root, "1234", "12345678", "src")
+        best = min(_time(lambda: _scan(source)) for _ in range(repeat))
+        print(f"{'scan and read the TeX files':<34}{best * 1000:>10.1f} ms")
+
+
+def _contents(files: int, tex_share: float, main_files: int) -> dict:
+    contents = {}
+    tex_files = int(files * tex_share)
+    for i in range(files):
+        if i < main_files:
+            contents[f"paper{i}/main.tex"] = PREAMBLE + BODY
+        elif i < tex_files:
+            contents[f"sections/s{i}.tex"] = b"\\section{Part}\n" + BODY
+        elif i % 2:
+            contents[f"figures/f{i}.png"] = b"\x89PNG\r\n\x1a\n" + os.urandom(8 * 1024)
+        else:
+            contents[f"data/d{i}.dat"] = b"1 2 3\n" * 1000
+    return contents
+
+
+def _tar_gz(contents: dict) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz", compresslevel=1) as tar:
+        for name, data in contents.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def _scan(source: str) -> list:
+    """Find the main files the slow way, reading the whole of every TeX file."""
+    found = []
+    for dir_path, _, names in os.walk(source):
+        for name in names:
+            if name.endswith(".tex"):
+                with open(os.path.join(dir_path, name), "rb") as f:
+                    if re.search(rb"\\documentclass", f.read()):
+                        found.append(name)
+    return found
+
+
+def _time(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    fire.Fire(bench_tex_detect)
@@ -0,0 +1,212 @@
+"""Read-through cache of values loaded from the database, such as the submission rows of
+`get_submission`.
+
+`ReadThroughCache.get` returns the cached value of a key, or loads, caches and returns
+it. There are two tiers. A `LocalCache` in the memory of the process answers without any
+round trip, its entries live for a few seconds. An optional shared `CacheBackend`, see
+`submit_ce.cache.redis_backend`, is shared by all the API and job worker processes and
+keeps entries longer.
+
+Handlers that change a row call `ReadThroughCache.invalidate` once the change is
+committed. That drops the entry from the local tier of the process and from the shared
+tier. Other processes keep their local entry until it expires, so a read from another
+process can be as stale as the local TTL. A value another process loaded just before a
+change was committed can still land in the shared tier after the invalidation, the
+shared TTL bounds how long it stays. Changes made by other systems are seen once entries
+expire. Values are JSON compatible so they can be kept in the shared tier as JSON.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+"""Returned by `LocalCache.get` for a key that is not cached."""
+
+
+@dataclass
+class CacheMetrics:
+    """Counts of what a `ReadThroughCache` did since it was made."""
+
+    local_hits: int = 0
+    shared_hits: int = 0
+    """Reads answered by the shared tier after a miss in the local tier."""
+    misses: int = 0
+    """Reads that loaded the value."""
+    invalidations: int = 0
+    evictions: int = 0
+    """Entries dropped from the local tier to make room, expired entries are not
+    counted."""
+    shared_errors: int = 0
+    """Reads and writes of the shared tier that failed, the cache carries on without
+    it."""
+
+    @property
+    def hits(self) -> int:
+        return self.local_hits + self.shared_hits
+
+    @property
+    def hit_ratio(self) -> float:
+        reads = self.hits + self.misses
+        return self.hits / reads if reads else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "hits": self.hits,
+            "hit_ratio": round(self.hit_ratio, 4),
+        }
+
+
+class CacheBackend(metaclass=ABCMeta):
+    """A cache shared between processes. Calls block, `ReadThroughCache` runs them in
+    threads."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Keep `value` for `ttl` seconds."""
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None: ...
+
+
+class LocalCache:
+    """LRU of at most `max_entries` entries that each live `ttl` seconds, safe to use
+    from several threads."""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        """Expiry and value by key, least recently used first."""
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """The value of `key`, `MISSING` if it is not cached or has expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] <= self.clock():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ReadThroughCache:
+    """`local` in front of an optional `shared` backend, whose entries live `shared_ttl`
+    seconds.
+
+    Keys are prefixed with `prefix` in the shared backend so several caches can share
+    it."""
+
+    def __init__(
+        self,
+        local: Optional[LocalCache],
+        shared: Optional[CacheBackend] = None,
+        shared_ttl: float = 30.0,
+        prefix: str = "",
+    ):
+        self.local = local
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.prefix = prefix
+        self.metrics = CacheMetrics()
+        self._invalidation_count = 0
+        """Bumped by each invalidation. A value loaded while it changed may be older
+        than the change, so it is returned but not cached."""
+
+    async def get(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        """The value of `key`, loaded with `load` if it is not cached.
+
+        The value is shared with other callers, copy it before changing it."""
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not MISSING:
+                self.metrics.local_hits += 1
+                return value
+        if self.shared is not None:
+            data = await self._shared(self.shared.get, self.prefix + key)
+            if data is not None:
+                self.metrics.shared_hits += 1
+                value = orjson.loads(data)
+                if self.local is not None:
+                    self.local.set(key, value)
+                return value
+
+        self.metrics.misses += 1
+        invalidation_count = self._invalidation_count
+        value = await load()
+        if invalidation_count == self._invalidation_count:
+            if self.local is not None:
+                self.local.set(key, value)
+            if self.shared is not None:
+                await self._shared(
+                    self.shared.set,
+                    self.prefix + key,
+                    orjson.dumps(value),
+                    self.shared_ttl,
+                )
+        return value
+
+    async def invalidate(self, key: str) -> None:
+        """Drop `key`, call after the change to its value is committed."""
+        self._invalidation_count += 1
+        self.metrics.invalidations += 1
+        if self.local is not None:
+            self.local.delete(key)
+        if self.shared is not None:
+            await self._shared(self.shared.delete, self.prefix + key)
+
+    def metrics_dict(self) -> dict:
+        if self.local is not None:
+            self.metrics.evictions = self.local.evictions
+        return self.metrics.as_dict()
+
+    async def _shared(self, fn: Callable[..., Any], *args) -> Any:
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except Exception:
+            logger.warning(
+                "Shared cache call %s failed",
+                getattr(fn, "__name__", fn),
+                exc_info=True,
+            )
+            self.metrics.shared_errors += 1
+            return None
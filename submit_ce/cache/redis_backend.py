@@ -0,0 +1,26 @@
+"""`CacheBackend` in Redis, or anything that speaks its protocol such as Valkey.
+
+Needs the redis package, which is imported by whoever makes the client. Ex.
+``redis.Redis.from_url(url)``
+"""
+
+from typing import Optional
+
+from submit_ce.cache import CacheBackend
+
+
+class RedisBackend(CacheBackend):
+
+    def __init__(self, client):
+        self.client = client
+        """A ``redis.Redis`` client, its connection pool is shared by the threads that
+        call it."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
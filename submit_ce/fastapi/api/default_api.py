@@ -1,6 +1,15 @@
 # coding: utf-8
 
-from typing import Dict, List, Callable, Annotated, Union, Literal  # noqa: F401
+from datetime import datetime
+from typing import (
+    Dict,
+    List,
+    Callable,
+    Annotated,
+    Union,
+    Literal,
+    Optional,
+)  # noqa: F401
 
 from fastapi import (  # noqa: F401
     APIRouter,
@@ -14,15 +23,38 @@ from fastapi import (  # noqa: F401
     Query,
     Response,
     Security,
-    status, UploadFile,
+    status,
+    UploadFile,
+    Request,
+)
+from fastapi.responses import (
+    PlainTextResponse,
+    FileResponse,
+    JSONResponse,
+    ORJSONResponse,
 )
-from fastapi.responses import PlainTextResponse
 
 from submit_ce.fastapi.config import config
 from .default_api_base import BaseDefaultApi
-from .models import CategoryChangeResult
-from .models.events import AgreedToPolicy, StartedNew, StartedAlterExising, SetLicense, AuthorshipDirect, \
-    AuthorshipProxy, SetCategories, SetMetadata
+from .responses import stored_file_response, etag_matches
+from .models import CategoryChangeResult, SourceFileList, FileProcessing, Preview
+from .models.submission import (
+    SubmissionData,
+    SubmissionFilter,
+    SubmissionPage,
+    parse_fields,
+)
+from .models.events import (
+    AgreedToPolicy,
+    StartedNew,
+    StartedAlterExising,
+    SetLicense,
+    AuthorshipDirect,
+    AuthorshipProxy,
+    SetCategories,
+    SetMetadata,
+    BatchOperation,
+)
 from ..auth import get_user, get_client
 from ..implementations import ImplementationConfig
 
@@ -38,12 +70,16 @@ impl_depends: Callable = config.submission_api_implementation.depends_fn
 userDep = Depends(get_user)
 clentDep = Depends(get_client)
 
+IF_MATCH = (
+    "ETag of the submission the change was made from, as got without `fields`. If the "
+    "submission has changed "
+    "since, the change is not made and the response is 412."
+)
+
 router = APIRouter()
 router.prefix="/v1"
 
 
-
-
 @router.post(
     "/start",
     response_class=PlainTextResponse,
@@ -65,69 +101,224 @@ async def start(started: Union[StartedNew, StartedAlterExising],
 
 @router.get(
     "/submission/{submission_id}",
+    response_class=ORJSONResponse,
+    response_model=SubmissionData,
     responses={
-        200: {"model": object, "description": "The submission data."},
+        200: {"model": SubmissionData, "description": "The submission data."},
+        304: {"description": "The submission matches the ETag of If-None-Match."},
+        400: {
+            "description": "A field that the submission does not have was asked for."
+        },
     },
     tags=["submit"],
-    response_model_by_alias=True,
 )
 async def get_submission(
-        submission_id: str = Path(..., description="Id of the submission to get."),
-        impl_dep=Depends(impl_depends), user=userDep, client=clentDep
-) -> object:
-    """Get information about a submission."""
-    return await implementation.get_submission(impl_dep, user, client, submission_id)
+    request: Request,
+    submission_id: str = Path(..., description="Id of the submission to get."),
+    fields: Optional[str] = Query(
+        None, description="Comma separated fields to get, all of them if not given."
+    ),
+    impl_dep=Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> Response:
+    """Get information about a submission.
+
+    The ETag changes whenever the submission or the processing of its files does. Poll
+    with If-None-Match to get a 304 until it changes, and send it as If-Match with a
+    change so the change fails if someone else's came first.
+
+    With `fields` only those fields and `submission_id` are returned, and the ETag is
+    weak and changes only when they do. It works with If-None-Match but not as If-Match,
+    use the ETag of the whole submission for that."""
+    try:
+        field_names = parse_fields(fields)
+    except ValueError as ex:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex))
+    version, submission = await implementation.get_submission_version(
+        impl_dep, user, client, submission_id, field_names
+    )
+    etag = f'"{version}"'
+    headers = {
+        "etag": etag if field_names is None else f"W/{etag}",
+        "cache-control": "no-cache",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # The values are already JSON compatible, so they skip validation against the model
+    # and go straight to orjson.
+    return ORJSONResponse(submission, headers=headers)
+
+
+@router.get(
+    "/submissions",
+    response_class=ORJSONResponse,
+    response_model=SubmissionPage,
+    responses={
+        200: {"model": SubmissionPage, "description": "A page of the submissions."},
+        400: {
+            "description": (
+                "A field that submissions do not have was asked for or the cursor is "
+                "not valid."
+            )
+        },
+    },
+    tags=["submit"],
+)
+async def list_submissions(
+    submitter: Optional[str] = Query(
+        None, description="Only the submissions of this user."
+    ),
+    stage: Optional[int] = Query(
+        None, description="Only the submissions at this stage."
+    ),
+    submission_type: Optional[str] = Query(
+        None, alias="type", description="Only the submissions of this type. Ex. new"
+    ),
+    updated_since: Optional[datetime] = Query(
+        None, description="Only submissions updated at or after this."
+    ),
+    cursor: Optional[str] = Query(
+        None, description="The `next_cursor` of the previous page."
+    ),
+    limit: int = Query(100, ge=1, le=1000, description="Most submissions to return."),
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated fields to get, all of them if not given. "
+        "file_processing and preview_processing are not listed.",
+    ),
+    impl_dep=Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> Response:
+    """List submissions, most recently updated first.
+
+    Get the following pages by passing the `next_cursor` of a page as `cursor` with the
+    same filters, until it is null. A submission that is updated while paging moves to
+    the front of the listing and is not listed again."""
+    try:
+        field_names = parse_fields(fields)
+    except ValueError as ex:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex))
+    filters = SubmissionFilter(
+        submitter_id=submitter,
+        stage=stage,
+        type=submission_type,
+        updated_since=updated_since,
+    )
+    return ORJSONResponse(
+        await implementation.list_submissions(
+            impl_dep, user, client, filters, cursor, limit, field_names
+        )
+    )
 
 
 @router.post(
     "/submission/{submission_id}/acceptPolicy",
     responses={
         200: {"model": object, "description": "The has been accepted."},
-        400: {"model": str, "description": "There was an problem when processing the agreement. It was not accepted."},
-        401: {"description": "Unauthorized. Missing valid authentication information. The agreement was not accepted."},
-        403: {"description": "Forbidden. User or client is not authorized to upload. The agreement was not accepted."},
-        500: {"description": "Error. There was a problem. The agreement was not accepted."},
+        400: {
+            "model": str,
+            "description": (
+                "There was an problem when processing the agreement. It was not "
+                "accepted."
+            ),
+        },
+        401: {
+            "description": (
+                "Unauthorized. Missing valid authentication information. The agreement "
+                "was not accepted."
+            )
+        },
+        403: {
+            "description": (
+                "Forbidden. User or client is not authorized to upload. The agreement "
+                "was not accepted."
+            )
+        },
+        412: {
+            "description": (
+                "The submission changed since the ETag of If-Match. The agreement was "
+                "not accepted."
+            )
+        },
+        500: {
+            "description": "Error. There was a problem. The agreement was not accepted."
+        },
     },
     tags=["submit"],
 )
 async def accept_policy_post(
-        submission_id: str = Path(..., description="Id of the submission to get."),
-        agreement: AgreedToPolicy = Body(None, description=""),
-        impl_dep: dict = Depends(impl_depends),
-        user=userDep, client=clentDep
+    submission_id: str = Path(..., description="Id of the submission to get."),
+    agreement: AgreedToPolicy = Body(None, description=""),
+    if_match: Optional[str] = Header(None, description=IF_MATCH),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
 ) -> object:
     """Agree to an arXiv policy to initiate a new item submission or  a change to an existing item. """
-    return await implementation.accept_policy_post(impl_dep, user, client, submission_id, agreement)
+    return await implementation.accept_policy_post(
+        impl_dep, user, client, submission_id, agreement, if_match
+    )
 
 
 @router.post(
     "/submission/{submission_id}/setLicense",
+    responses={
+        412: {"description": "The submission changed since the ETag of If-Match."}
+    },
     tags=["submit"],
 )
 async def set_license_post(
-        submission_id: str = Path(..., description="Id of the submission to set the license for."),
-        license: SetLicense = Body(None, description="The license to set"),
-        impl_dep: dict = Depends(impl_depends),
-        user=userDep, client=clentDep
+    submission_id: str = Path(
+        ..., description="Id of the submission to set the license for."
+    ),
+    license: SetLicense = Body(None, description="The license to set"),
+    if_match: Optional[str] = Header(None, description=IF_MATCH),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
 ) -> None:
     """Set a license for a files of a submission."""
-    return await implementation.set_license_post(impl_dep, user, client, submission_id, license)
+    return await implementation.set_license_post(
+        impl_dep, user, client, submission_id, license, if_match
+    )
 
 
 @router.post(
     "/submission/{submission_id}/assertAuthorship",
+    responses={
+        412: {"description": "The submission changed since the ETag of If-Match."}
+    },
     tags=["submit"],
 )
 async def assert_authorship_post(
-        submission_id: str = Path(..., description="Id of the submission to assert authorship for."),
-        authorship: Union[AuthorshipDirect, AuthorshipProxy] = Body(None, description=""),
-        impl_dep: dict = Depends(impl_depends),
-        user=userDep, client=clentDep
+    submission_id: str = Path(
+        ..., description="Id of the submission to assert authorship for."
+    ),
+    authorship: Union[AuthorshipDirect, AuthorshipProxy] = Body(None, description=""),
+    if_match: Optional[str] = Header(None, description=IF_MATCH),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
 ) -> str:
-    return await implementation.assert_authorship_post(impl_dep, user, client, submission_id, authorship)
+    return await implementation.assert_authorship_post(
+        impl_dep, user, client, submission_id, authorship, if_match
+    )
+
 
 @router.post(
     "/submission/{submission_id}/files",
+    responses={
+        200: {"description": "The package was unpacked, the body is its checksum."},
+        202: {
+            "model": FileProcessing,
+            "description": (
+                "The package was saved and will be unpacked in the background. Its "
+                "progress is the file_processing of the submission."
+            ),
+        },
+    },
     tags=["submit"],
 )
 async def file_post(
@@ -140,40 +331,518 @@ async def file_post(
 
     The file can be a single file, a zip, or a tar.gz. Zip and tar.gz files will be unpacked.
     """
-    return await implementation.file_post(impl_dep, user, client, submission_id, uploadFile)
+    result = await implementation.file_post(
+        impl_dep, user, client, submission_id, uploadFile
+    )
+    if isinstance(result, FileProcessing):
+        return JSONResponse(
+            result.model_dump(mode="json"),
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={"Location": f"{router.prefix}/submission/{submission_id}"},
+        )
+    return result
+
+
+@router.post(
+    "/submission/{submission_id}/upload",
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {"description": "The upload was created, send the package with PATCH."},
+        400: {"description": "The Upload-Metadata header is not valid."},
+    },
+    tags=["submit"],
+)
+async def upload_create(
+    request: Request,
+    response: Response,
+    submission_id: str = Path(
+        ..., description="Id of the submission to upload the source package of."
+    ),
+    upload_length: int = Header(
+        ..., ge=0, description="Size of the whole package in bytes."
+    ),
+    upload_metadata: Optional[str] = Header(
+        None,
+        description="Comma separated `{key} {base64 value}` pairs, "
+        "`filename` is used for a single file.",
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> None:
+    """Start a resumable upload of a source package.
+
+    Replaces any upload in progress for the submission. The package is then sent with
+    PATCH, in as many chunks as needed, and is unpacked when the last byte arrives. A
+    dropped connection only loses the chunk in flight."""
+    state = await implementation.upload_create(
+        impl_dep, user, client, submission_id, upload_length, upload_metadata
+    )
+    response.headers["Location"] = str(request.url)
+    response.headers["Upload-Offset"] = str(state.offset)
+
+
+@router.head(
+    "/submission/{submission_id}/upload",
+    responses={
+        200: {"description": "Upload-Offset is the number of bytes received so far."},
+        404: {"description": "There is no upload in progress."},
+    },
+    tags=["submit"],
+)
+async def upload_head(
+    response: Response,
+    submission_id: str = Path(
+        ..., description="Id of the submission the upload is for."
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> None:
+    """Get the offset of an upload in progress, to resume it after a dropped
+    connection."""
+    state = await implementation.upload_head(impl_dep, user, client, submission_id)
+    response.headers["Upload-Offset"] = str(state.offset)
+    response.headers["Upload-Length"] = str(state.length)
+    response.headers["Cache-Control"] = "no-store"
+
+
+@router.patch(
+    "/submission/{submission_id}/upload",
+    response_class=PlainTextResponse,
+    responses={
+        200: {
+            "description": (
+                "The chunk was appended. When the upload is complete the body is the "
+                "package checksum."
+            )
+        },
+        400: {
+            "description": (
+                "The package is not valid or the Upload-Checksum header can't be "
+                "parsed."
+            )
+        },
+        404: {"description": "There is no upload in progress."},
+        409: {
+            "description": (
+                "Upload-Offset is not the offset of the upload, HEAD the upload to get "
+                "it."
+            )
+        },
+        413: {"description": "More bytes were sent than Upload-Length."},
+        460: {
+            "description": (
+                "The chunk does not match Upload-Checksum, it was not appended."
+            )
+        },
+    },
+    tags=["submit"],
+)
+async def upload_patch(
+    request: Request,
+    response: Response,
+    submission_id: str = Path(
+        ..., description="Id of the submission the upload is for."
+    ),
+    upload_offset: int = Header(
+        ..., ge=0, description="Offset of the chunk, must be the offset of the upload."
+    ),
+    upload_checksum: Optional[str] = Header(
+        None, description="`{algorithm} {base64 digest}` of the chunk."
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> str:
+    """Append the body of the request to an upload in progress."""
+    state, checksum = await implementation.upload_patch(
+        impl_dep,
+        user,
+        client,
+        submission_id,
+        upload_offset,
+        upload_checksum,
+        request.stream(),
+    )
+    response.headers["Upload-Offset"] = str(state.offset)
+    return checksum or ""
+
+
+@router.delete(
+    "/submission/{submission_id}/upload",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        204: {"description": "The upload was discarded."},
+        404: {"description": "There is no upload in progress."},
+    },
+    tags=["submit"],
+)
+async def upload_delete(
+    submission_id: str = Path(
+        ..., description="Id of the submission the upload is for."
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> None:
+    """Discard an upload in progress."""
+    return await implementation.upload_delete(impl_dep, user, client, submission_id)
+
+
+@router.get(
+    "/submission/{submission_id}/files",
+    response_model=SourceFileList,
+    responses={
+        200: {"description": "The files of the source."},
+        304: {
+            "description": (
+                "The files have not changed since the listing with the ETag of "
+                "If-None-Match."
+            )
+        },
+    },
+    tags=["submit"],
+)
+async def source_files_list(
+    request: Request,
+    response: Response,
+    submission_id: str = Path(
+        ..., description="Id of the submission to list the files of."
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> Union[SourceFileList, Response]:
+    """List the files of the source of a submission with their sizes, checksums and
+    types.
+
+    This is read from the manifest kept with the source, the files are not read. The
+    ETag is the checksum of the listing, poll with If-None-Match to get a 304 until a
+    file changes."""
+    listing = await implementation.source_files_list(
+        impl_dep, user, client, submission_id
+    )
+    etag = f'"{listing.checksum}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"etag": etag}
+        )
+    response.headers["etag"] = etag
+    return listing
+
+
+@router.put(
+    "/submission/{submission_id}/files/{path:path}",
+    response_class=PlainTextResponse,
+    responses={
+        200: {"description": "The file was stored, the body is its checksum."},
+        400: {
+            "description": (
+                "The path is not allowed or the file puts the source over its "
+                "limits."
+            )
+        },
+    },
+    tags=["submit"],
+)
+async def source_file_put(
+    request: Request,
+    submission_id: str = Path(
+        ..., description="Id of the submission to add the file to."
+    ),
+    path: str = Path(
+        ..., description="Path of the file in the source. Ex. figures/fig1.jpg"
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> str:
+    """Add or replace a single file in the source of a submission.
+
+    The body of the request is the content of the file. Only this file is written, the
+    rest of the source is not re-uploaded or re-extracted."""
+    return await implementation.source_file_put(
+        impl_dep, user, client, submission_id, path, request.stream()
+    )
+
+
+@router.api_route(
+    "/submission/{submission_id}/files/{path:path}",
+    methods=["GET", "HEAD"],
+    response_class=FileResponse,
+    responses={
+        200: {"description": "The content of the file."},
+        206: {"description": "The requested range of the file."},
+        304: {"description": "The file matches the ETag of If-None-Match."},
+        404: {"description": "No such file in the source of the submission."},
+    },
+    tags=["submit"],
+)
+async def source_file_get(
+    request: Request,
+    submission_id: str = Path(
+        ..., description="Id of the submission to get the file from."
+    ),
+    path: str = Path(
+        ..., description="Path of the file in the source. Ex. figures/fig1.jpg"
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> Response:
+    """Get a single file from the source of a submission.
+
+    Supports Range requests, the ETag is the checksum of the file."""
+    stored = await implementation.source_file_get(
+        impl_dep, user, client, submission_id, path
+    )
+    return stored_file_response(request, stored)
+
+
+@router.delete(
+    "/submission/{submission_id}/files/{path:path}",
+    responses={
+        200: {"description": "The file was removed."},
+        404: {"description": "No such file in the source of the submission."},
+    },
+    tags=["submit"],
+)
+async def source_file_delete(
+    submission_id: str = Path(
+        ..., description="Id of the submission to remove the file from."
+    ),
+    path: str = Path(
+        ..., description="Path of the file in the source. Ex. figures/fig1.jpg"
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> None:
+    """Remove a single file from the source of a submission."""
+    return await implementation.source_file_delete(
+        impl_dep, user, client, submission_id, path
+    )
+
+
+@router.api_route(
+    "/submission/{submission_id}/package",
+    methods=["GET", "HEAD"],
+    response_class=FileResponse,
+    responses={
+        200: {"description": "The source package."},
+        206: {"description": "The requested range of the source package."},
+        304: {"description": "The package matches the ETag of If-None-Match."},
+        404: {"description": "No source has been deposited."},
+    },
+    tags=["submit"],
+)
+async def source_package_get(
+    request: Request,
+    submission_id: str = Path(
+        ..., description="Id of the submission to get the source package of."
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> Response:
+    """Get the source package of a submission.
+
+    Supports Range requests, the ETag is the checksum of the package."""
+    stored = await implementation.source_package_get(
+        impl_dep, user, client, submission_id
+    )
+    return stored_file_response(request, stored, filename=stored.name)
+
+
+@router.api_route(
+    "/submission/{submission_id}/preview",
+    methods=["GET", "HEAD"],
+    response_class=FileResponse,
+    responses={
+        200: {"description": "The preview PDF."},
+        206: {"description": "The requested range of the preview PDF."},
+        304: {"description": "The preview matches the ETag of If-None-Match."},
+        404: {"description": "There is no preview."},
+    },
+    tags=["submit"],
+)
+async def preview_get(
+    request: Request,
+    submission_id: str = Path(
+        ..., description="Id of the submission to get the preview of."
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> Response:
+    """Get the preview PDF of a submission.
+
+    Supports Range requests, the ETag is the checksum of the PDF. Poll with
+    If-None-Match to get a 304 until the preview changes."""
+    stored = await implementation.preview_get(impl_dep, user, client, submission_id)
+    response = stored_file_response(request, stored, media_type="application/pdf")
+    response.headers["cache-control"] = "no-cache"
+    return response
+
+
+@router.post(
+    "/submission/{submission_id}/preview",
+    responses={
+        200: {
+            "description": (
+                "The preview was built, or was already of the current source."
+            )
+        },
+        202: {
+            "model": FileProcessing,
+            "description": (
+                "The preview will be built in the background. Its progress is the "
+                "preview_processing of the submission."
+            ),
+        },
+        400: {"description": "There is no source or it does not compile."},
+    },
+    tags=["submit"],
+)
+async def preview_post(
+    submission_id: str = Path(
+        ..., description="Id of the submission to build the preview of."
+    ),
+    force: bool = Query(
+        False, description="Build the preview even if it is of the current source."
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> Preview:
+    """Build the preview PDF of a submission from its source.
+
+    The preview is kept with the checksum of the source it was built from, a source that
+    has not changed is not compiled again."""
+    result = await implementation.preview_post(
+        impl_dep, user, client, submission_id, force
+    )
+    if isinstance(result, FileProcessing):
+        return JSONResponse(
+            result.model_dump(mode="json"),
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={"Location": f"{router.prefix}/submission/{submission_id}"},
+        )
+    return result
+
+
+@router.delete(
+    "/submission/{submission_id}/preview",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        204: {"description": "The preview was deleted."},
+        404: {"description": "There is no preview."},
+    },
+    tags=["submit"],
+)
+async def preview_delete(
+    submission_id: str = Path(
+        ..., description="Id of the submission to delete the preview of."
+    ),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> None:
+    """Delete the preview PDF of a submission."""
+    return await implementation.preview_delete(impl_dep, user, client, submission_id)
 
 
 @router.post(
     "/submission/{submission_id}/setCategories",
+    responses={
+        412: {"description": "The submission changed since the ETag of If-Match."}
+    },
     tags=["submit"],
 )
-async def set_categories_post(set_categoires: SetCategories,
-                              submission_id: str = Path(..., description="Id of the submission to set the categories for."),
-                              impl_dep: dict = Depends(impl_depends),
-                              user=userDep, client=clentDep
-                              ) -> CategoryChangeResult:
+async def set_categories_post(
+    set_categoires: SetCategories,
+    submission_id: str = Path(
+        ..., description="Id of the submission to set the categories for."
+    ),
+    if_match: Optional[str] = Header(None, description=IF_MATCH),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> CategoryChangeResult:
     """Set the categories for a submission.
 
     The categories will replace any categories already set on the submission."""
-    return await implementation.set_categories_post(impl_dep, user, client, submission_id, set_categoires)
+    return await implementation.set_categories_post(
+        impl_dep, user, client, submission_id, set_categoires, if_match
+    )
+
 
 @router.post(
     "/submission/{submission_id}/setMetadata",
+    responses={
+        412: {"description": "The submission changed since the ETag of If-Match."}
+    },
     tags=["submit"],
 )
-async def set_metadata_post(metadata: Union[SetMetadata],
-                            submission_id: str = Path(..., description="Id of the submission to set the metadata for."),
-                            impl_dep: dict = Depends(impl_depends),
-                            user=userDep, client=clentDep) -> str:
-    return await implementation.set_metadata_post(impl_dep, user, client, submission_id, metadata)
-"""
-/files get post head delete
+async def set_metadata_post(
+    metadata: Union[SetMetadata],
+    submission_id: str = Path(
+        ..., description="Id of the submission to set the metadata for."
+    ),
+    if_match: Optional[str] = Header(None, description=IF_MATCH),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> str:
+    return await implementation.set_metadata_post(
+        impl_dep, user, client, submission_id, metadata, if_match
+    )
 
-/files/{path} get post head delete
 
-process post
+@router.post(
+    "/submission/{submission_id}/batch",
+    responses={
+        200: {
+            "description": "All of the changes were made, the result of each in order."
+        },
+        400: {
+            "description": (
+                "One of the changes could not be made, the detail says which. None "
+                "were made."
+            )
+        },
+        412: {
+            "description": (
+                "The submission changed since the ETag of If-Match. None of the "
+                "changes were made."
+            )
+        },
+    },
+    tags=["submit"],
+)
+async def batch_post(
+    operations: List[BatchOperation] = Body(..., min_length=1, max_length=100),
+    submission_id: str = Path(..., description="Id of the submission to change."),
+    if_match: Optional[str] = Header(None, description=IF_MATCH),
+    impl_dep: dict = Depends(impl_depends),
+    user=userDep,
+    client=clentDep,
+) -> List[Union[CategoryChangeResult, str, None]]:
+    """Make several changes to a submission in one request and one transaction.
+
+    The changes are made in order and the result of each is what its own endpoint
+    returns. If one fails none of them are made. An If-Match is checked once, before the
+    first change."""
+    return await implementation.batch_post(
+        impl_dep, user, client, submission_id, operations, if_match
+    )
+
 
-preview post get head delete
+"""
+/files get head delete
+
+process post
 
 metadata get post head delete
 
@@ -1,26 +1,84 @@
 # coding: utf-8
 from abc import ABC, abstractmethod
-from typing import ClassVar, Dict, List, Tuple, Union  # noqa: F401
+from typing import (
+    ClassVar,
+    Dict,
+    List,
+    Tuple,
+    Union,
+    AsyncIterator,
+    Optional,
+    Sequence,
+)  # noqa: F401
 
 from fastapi import UploadFile
 
-from submit_ce.fastapi.api.models import CategoryChangeResult
+from submit_ce.fastapi.api.models import (
+    CategoryChangeResult,
+    SourceFileList,
+    FileProcessing,
+    Preview,
+)
 from submit_ce.fastapi.api.models.agent import User, Client
-from submit_ce.fastapi.api.models.events import AgreedToPolicy, StartedNew, AuthorshipDirect, AuthorshipProxy, \
-    SetLicense, SetCategories, SetMetadata
+from submit_ce.fastapi.api.models.submission import SubmissionFilter
+from submit_ce.file_store import StoredFile
+from submit_ce.file_store.upload import UploadState
+from submit_ce.fastapi.api.models.events import (
+    AgreedToPolicy,
+    StartedNew,
+    AuthorshipDirect,
+    AuthorshipProxy,
+    SetLicense,
+    SetCategories,
+    SetMetadata,
+    BatchOperation,
+)
 
 
 class BaseDefaultApi(ABC):
 
     @abstractmethod
     async def get_submission(
-            self,
-            impl_data: Dict,
-            user: User,
-            client: Client,
-            submission_id: str,
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        fields: Optional[Sequence[str]] = None,
     ) -> object:
-        """Get information about a ui-app."""
+        """Get information about a ui-app, only `fields` of it if given."""
+        ...
+
+    async def get_submission_version(
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[str, object]:
+        """The version of a submission, its ETag, and the submission, only `fields` of
+        it if given.
+
+        The version changes whenever the submission does. A mutation sent with an
+        If-Match header of an earlier version fails with 412. The version of only some
+        fields changes when they do and is not the version of the submission."""
+        ...
+
+    @abstractmethod
+    async def list_submissions(
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        filters: SubmissionFilter,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        fields: Optional[Sequence[str]] = None,
+    ) -> dict:
+        """A page of the submissions that match `filters`, most recently updated first,
+        only `fields` of them if given. It has the submissions and the cursor of the
+        next page, `None` if there are no more."""
         ...
 
     @abstractmethod
@@ -36,34 +94,35 @@ class BaseDefaultApi(ABC):
 
     @abstractmethod
     async def accept_policy_post(
-            self,
-            impl_data: Dict,
-            user: User,
-            client: Client,
-            submission_id: str,
-            agreement: AgreedToPolicy,
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        agreement: AgreedToPolicy,
+        if_match: Optional[str] = None,
     ) -> object:
         """Agree to an arXiv policy to initiate a new item ui-app or  a change to an existing item. """
         ...
 
     @abstractmethod
     async def mark_deposited_post(
-            self,
-            impl_data: Dict,
-            user: User,
-            client: Client,
-            submission_id: str,
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
     ) -> None:
         """The submission been successfully deposited into the arxiv corpus."""
         ...
 
     @abstractmethod
     async def mark_processing_for_deposit_post(
-            self,
-            impl_data: Dict,
-            user: User,
-            client: Client,
-            submission_id: str,
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
     ) -> None:
         """Mark that the ui-app is being processed for deposit."""
         ...
@@ -88,13 +147,27 @@ class BaseDefaultApi(ABC):
         ...
 
     @abstractmethod
-    async def set_license_post(self, impl_dep: Dict, user: User, client: Client,
-                               submission_id: str, license: SetLicense) -> None:
+    async def set_license_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        license: SetLicense,
+        if_match: Optional[str] = None,
+    ) -> None:
         """Sets the license of the submission files."""
         ...
 
-    async def assert_authorship_post(self, impl_dep: Dict, user: User, client: Client,
-                                     submission_id: str, authorship: Union[AuthorshipDirect, AuthorshipProxy]) -> str:
+    async def assert_authorship_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        authorship: Union[AuthorshipDirect, AuthorshipProxy],
+        if_match: Optional[str] = None,
+    ) -> str:
         """Assert authorship of the submission files.
 
         Or assert that the submitter has authority to submit the files as a proxy."""
@@ -103,14 +176,149 @@ class BaseDefaultApi(ABC):
     async def file_post(self, impl_dep: Dict, user: User, client: Client, submission_id: str, uploadFile: UploadFile):
         """Upload a file to a submission.
 
-        The file can be a single file, a zip, or a tar.gz. Zip and tar.gz files will be unpacked.
+        The file can be a single file, a zip, or a tar.gz. Zip and tar.gz files will be
+        unpacked.
+
+        Returns the checksum of the package, or the `FileProcessing` of the job that
+        will unpack it if that is done in the background.
         """
         ...
 
-    async def set_categories_post(self, impl_dep: Dict, user: User, client: Client, submission_id: str,
-                                  set_categoires: SetCategories) -> CategoryChangeResult:
+    async def upload_create(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        length: int,
+        metadata: Optional[str],
+    ) -> UploadState:
+        """Start a resumable upload of a source package of `length` bytes."""
+        ...
+
+    async def upload_head(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> UploadState:
+        """Get the state of the upload in progress."""
+        ...
+
+    async def upload_patch(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        offset: int,
+        checksum: Optional[str],
+        content: AsyncIterator[bytes],
+    ) -> Tuple[UploadState, Optional[str]]:
+        """Append a chunk to the upload in progress.
+
+        Returns the state of the upload and, once it is complete, the checksum of the
+        package."""
+        ...
+
+    async def upload_delete(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> None:
+        """Discard the upload in progress."""
+        ...
+
+    async def source_file_put(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        path: str,
+        content: AsyncIterator[bytes],
+    ) -> str:
+        """Add or replace a single file in the source of a submission.
+
+        Returns the checksum of the file."""
+        ...
+
+    async def source_files_list(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> SourceFileList:
+        """List the files of the source of a submission."""
+        ...
+
+    async def source_file_get(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str, path: str
+    ) -> StoredFile:
+        """Get a single file from the source of a submission."""
+        ...
+
+    async def source_package_get(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> StoredFile:
+        """Get the source package of a submission."""
+        ...
+
+    async def preview_get(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> StoredFile:
+        """Get the preview PDF of a submission."""
+        ...
+
+    async def preview_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        force: bool = False,
+    ) -> Union[Preview, FileProcessing]:
+        """Build the preview PDF of a submission from its source, unless the preview is
+        of the current source."""
+        ...
+
+    async def preview_delete(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> None:
+        """Delete the preview PDF of a submission."""
+        ...
+
+    async def source_file_delete(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str, path: str
+    ) -> None:
+        """Remove a single file from the source of a submission."""
+        ...
+
+    async def set_categories_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        set_categoires: SetCategories,
+        if_match: Optional[str] = None,
+    ) -> CategoryChangeResult:
         pass
 
-    async def set_metadata_post(self, impl_dep: Dict, user: User, client: Client, submission_id: str,
-                                metadata: Union[SetMetadata]):
+    async def set_metadata_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        metadata: Union[SetMetadata],
+        if_match: Optional[str] = None,
+    ):
+        pass
+
+    async def batch_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        operations: List[BatchOperation],
+        if_match: Optional[str] = None,
+    ) -> list:
+        """Make several changes to a submission in one transaction, all of them or none.
+
+        Returns the result of each change in order, what its own endpoint would
+        return."""
         pass
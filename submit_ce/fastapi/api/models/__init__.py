@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Literal, List, Optional
 
 from arxiv.taxonomy.definitions import CATEGORIES_ACTIVE, CATEGORIES
@@ -18,3 +19,59 @@ class CategoryChangeResult(BaseModel):
     old_secondaries: List[ALL_CATEGORIES] = Field(default_factory=list)
     """The secondaries before this change"""
 
+
+class SourceFile(BaseModel):
+    """A file in the source of a submission."""
+
+    path: str
+    """Path of the file in the source. Ex. figures/fig1.jpg"""
+    size: int
+    """Size of the file in bytes."""
+    checksum: str
+    """Checksum of the file, changes whenever its content changes."""
+    modified: Optional[datetime] = None
+    """When the file was last modified, from the package if it had the time."""
+    file_type: Optional[str] = None
+    """Type of the file detected when it was uploaded. Ex. tex, image, pdf"""
+
+
+class SourceFileList(BaseModel):
+    files: List[SourceFile] = Field(default_factory=list)
+    """The files of the source sorted by path."""
+    file_count: int = 0
+    """Number of files in the source."""
+    source_size: int = 0
+    """Total size of the files in bytes."""
+    source_format: Optional[str] = None
+    """Format of the source detected from the files. Ex. tex, pdftex, pdf, html"""
+    main_files: List[str] = Field(default_factory=list)
+    """TeX files that may be the main file, the most likely first."""
+    checksum: Optional[str] = None
+    """Checksum of the listing, changes whenever a file is added, removed or changed."""
+
+
+class FileProcessing(BaseModel):
+    """Processing of the files of a submission after the request that uploaded them, see
+    `submit_ce.jobs`."""
+
+    job_id: int
+    state: Literal["queued", "running", "done", "failed"]
+    """Whether the upload is waiting for a worker, being unpacked, unpacked or could not
+    be unpacked."""
+    error: Optional[str] = None
+    """Why processing failed. Ex. the package is not a valid tar.gz"""
+    enqueued: datetime
+    updated: datetime
+    """When the state last changed."""
+
+
+class Preview(BaseModel):
+    """The preview PDF of a submission, see `submit_ce.preview`."""
+
+    checksum: str
+    """Checksum of the PDF, the ETag of the preview."""
+    source_checksum: str
+    """Checksum of the source the preview was made from."""
+    compiled: bool
+    """Whether a preview was made from the source, false when the preview was already of
+    the current source."""
@@ -3,7 +3,7 @@ from __future__ import annotations
 import pprint
 from typing import Optional, Any, Dict, Literal, List, Union
 
-from pydantic import BaseModel, AwareDatetime
+from pydantic import BaseModel, AwareDatetime, model_validator
 
 from submit_ce.fastapi.api.models import ACTIVE_CATEGORY
 from submit_ce.fastapi.api.models.agent import User, Client
@@ -202,3 +202,43 @@ class StartedAlterExising(BaseModel):
     paperid: str
     """The existing paper that is modified. Only valid for replacement, withdrawal, and jref and cross"""
 
+
+class BatchOperation(BaseModel):
+    """One change of a batch, exactly one of the fields is set.
+
+    Each field takes the body of the endpoint of the same name, ex. `set_license` is the
+    body of setLicense."""
+
+    accept_policy: Optional[AgreedToPolicy] = None
+    set_license: Optional[SetLicense] = None
+    assert_authorship: Optional[Union[AuthorshipDirect, AuthorshipProxy]] = None
+    set_categories: Optional[SetCategories] = None
+    set_metadata: Optional[SetMetadata] = None
+
+    @model_validator(mode="after")
+    def one_change(self) -> BatchOperation:
+        changes = [
+            name for name in self.model_fields if getattr(self, name) is not None
+        ]
+        if len(changes) != 1:
+            raise ValueError(
+                f"An operation must set exactly one of {', '.join(self.model_fields)}"
+            )
+        return self
+
+    @property
+    def change(
+        self,
+    ) -> Union[
+        AgreedToPolicy,
+        SetLicense,
+        AuthorshipDirect,
+        AuthorshipProxy,
+        SetCategories,
+        SetMetadata,
+    ]:
+        return next(
+            getattr(self, name)
+            for name in self.model_fields
+            if getattr(self, name) is not None
+        )
@@ -0,0 +1,83 @@
+"""The submission returned by ``GET /submission/{submission_id}`` and the pages of ``GET
+/submissions``.
+
+The fields are made from the columns of the legacy submissions table so the model and
+the table can't drift apart. Every field is optional since a client can ask for only
+some of them with ``?fields=``.
+"""
+
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from arxiv.db.models import Submission
+from pydantic import BaseModel, create_model
+
+from submit_ce.fastapi.api.models import FileProcessing
+
+PROCESSING_FIELDS = ("file_processing", "preview_processing")
+"""Fields that are not columns, the state of the background jobs of the submission."""
+
+SUBMISSION_COLUMNS: Tuple[str, ...] = tuple(
+    column.name for column in Submission.__table__.columns
+)
+
+
+def _python_type(column) -> Any:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return Any
+
+
+SubmissionData = create_model(
+    "SubmissionData",
+    __doc__="A submission, with the fields asked for if ``fields`` was given.",
+    file_processing=(Optional[FileProcessing], None),
+    preview_processing=(Optional[FileProcessing], None),
+    **{
+        column.name: (Optional[_python_type(column)], None)
+        for column in Submission.__table__.columns
+    },
+)
+
+
+class SubmissionFilter(BaseModel):
+    """Which submissions to list, all of them if nothing is set."""
+
+    submitter_id: Optional[str] = None
+    """Only the submissions of this user, the identifier of a `User`."""
+    stage: Optional[int] = None
+    type: Optional[str] = None
+    """Ex. new, replacement"""
+    updated_since: Optional[datetime] = None
+    """Only submissions updated at or after this time."""
+
+
+class SubmissionPage(BaseModel):
+    submissions: List[SubmissionData]
+    """Most recently updated first."""
+    next_cursor: Optional[str] = None
+    """Cursor of the next page, `None` on the last page."""
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """The fields of a ``fields`` query parameter, comma separated, `None` for all of
+    them.
+
+    Raises
+    ------
+    ValueError
+        If one of them is not a field of `SubmissionData`."""
+    if fields is None:
+        return None
+    names = tuple(
+        dict.fromkeys(name.strip() for name in fields.split(",") if name.strip())
+    )
+    unknown = [
+        name
+        for name in names
+        if name not in SUBMISSION_COLUMNS and name not in PROCESSING_FIELDS
+    ]
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(unknown)}")
+    return names
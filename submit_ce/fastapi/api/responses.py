@@ -0,0 +1,221 @@
+"""Responses for sending stored files with HTTP ranges and conditional requests."""
+
+import os
+import re
+from mimetypes import guess_type
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import Request, Response, status
+from starlette.responses import FileResponse
+from starlette.types import Scope, Receive, Send
+
+from submit_ce.file_store import StoredFile
+
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+"""ASGI extension that lets the server send a file with sendfile(2)."""
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(ValueError):
+    """The requested range is outside of the file."""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """First and last byte, inclusive, of a `Range` header for a file of `size` bytes.
+
+    Returns `None` if the whole file should be sent, that is for no header, a header
+    that is not a single byte range or a header that can't be parsed, as RFC 9110 says
+    to ignore those.
+
+    Raises
+    ------
+    RangeNotSatisfiable
+        If the range is outside of the file."""
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = size - 1 if last == "" else min(int(last), size - 1)
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an `If-None-Match` or `If-Range` header matches `etag`, with weak
+    comparison."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class RangedFileResponse(FileResponse):
+    """`FileResponse` of the bytes `start` to `end`, inclusive, of a file.
+
+    If the server offers the zero-copy send extension the file descriptor is handed to
+    it, otherwise the range is streamed in chunks. Either way the file is never read
+    into memory whole."""
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        start: int,
+        end: int,
+        stat_result: os.stat_result,
+        **kwargs,
+    ):
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.start = start
+        self.end = end
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        count = self.end - self.start + 1
+        if scope["method"].upper() == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send(
+                    {
+                        "type": ZERO_COPY_EXTENSION,
+                        "file": file,
+                        "offset": self.start,
+                        "count": count,
+                        "more_body": False,
+                    }
+                )
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                while count > 0:
+                    chunk = await file.read(min(self.chunk_size, count))
+                    count = count - len(chunk) if chunk else 0
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": chunk,
+                            "more_body": count > 0,
+                        }
+                    )
+        if self.background is not None:
+            await self.background()
+
+
+class RangedStreamResponse(Response):
+    """Response of the bytes `start` to `end`, inclusive, of a stored file that is not
+    on a local disk.
+
+    The range is streamed from the store with `StoredFile.read_range`, so only the
+    requested bytes are fetched."""
+
+    def __init__(
+        self,
+        stored: StoredFile,
+        start: int,
+        end: int,
+        status_code: int,
+        headers: dict,
+        media_type: str,
+        filename: Optional[str] = None,
+    ):
+        super().__init__(
+            status_code=status_code, headers=headers, media_type=media_type
+        )
+        self.stored = stored
+        self.start = start
+        self.end = end
+        self.headers["content-length"] = str(end - start + 1)
+        if filename is not None:
+            self.headers["content-disposition"] = f'attachment; filename="{filename}"'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() != "HEAD" and self.end >= self.start:
+            async for chunk in self.stored.read_range(self.start, self.end):
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def stored_file_response(
+    request: Request,
+    stored: StoredFile,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None,
+) -> Response:
+    """Response for a GET or HEAD of `stored` with `Range`, `If-Range` and
+    `If-None-Match` support.
+
+    The ETag is the stored checksum so a client that polls a file that has not changed
+    gets a 304 without the file being read."""
+    etag = f'"{stored.checksum}"'
+    headers = {"etag": etag, "accept-ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    stat_result = os.stat(stored.path) if stored.path is not None else None
+    size = stat_result.st_size if stat_result is not None else stored.size
+    start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    if_range = request.headers.get("if-range")
+    if if_range is None or etag_matches(if_range, etag):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "content-range": f"bytes */{size}"},
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+    media_type = (
+        media_type
+        or guess_type(filename or stored.name or "")[0]
+        or "application/octet-stream"
+    )
+    if stat_result is None:
+        return RangedStreamResponse(
+            stored, start, end, status_code, headers, media_type, filename
+        )
+    return RangedFileResponse(
+        stored.path,
+        start,
+        end,
+        stat_result,
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+        filename=filename,
+    )
@@ -1,4 +1,6 @@
+import inspect
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from submit_ce.fastapi.api.default_api import router as DefaultApiRouter
@@ -6,10 +8,24 @@ from .config import config, DEV_SQLITE_FILE
 from arxiv.config import settings
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.submission_api_implementation.startup_fn is not None:
+        result = config.submission_api_implementation.startup_fn(config)
+        if inspect.isawaitable(result):
+            await result
+    yield
+    if config.submission_api_implementation.shutdown_fn is not None:
+        result = config.submission_api_implementation.shutdown_fn(config)
+        if inspect.isawaitable(result):
+            await result
+
+
 app = FastAPI(
     title="arxiv submit",
     description="No description provided (generated by Openapi Generator https://github.com/openapitools/openapi-generator)",
     version="0.1",
+    lifespan=lifespan,
 )
 app.state.config = config
 
@@ -9,9 +9,11 @@ DEV_SQLITE_FILE="legacy.db"
 class Settings(BaseSettings):
     """CLASSIC_DB_URI and other configs are from arxiv-base arxiv.config."""
 
-
     submission_api_implementation: ImportString = 'submit_ce.fastapi.implementations.legacy_implementation.implementation'
-    """Class to use for submission API implementation."""
+    """Class to use for submission API implementation.
+
+    Use `submit_ce.fastapi.implementations.legacy_async_implementation.implementation`
+    for the legacy implementation with an async database driver."""
 
 
 config = Settings(_case_sensitive=False)
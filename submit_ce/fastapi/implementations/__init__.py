@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Callable
+from typing import Callable, Optional, Awaitable, Union
 
 from pydantic_settings import BaseSettings
 
@@ -11,3 +11,9 @@ class ImplementationConfig:
     impl: BaseDefaultApi
     depends_fn: Callable
     setup_fn: Callable[[BaseSettings], None]
+    shutdown_fn: Optional[Callable[[BaseSettings], Union[None, Awaitable[None]]]] = None
+    """Called when the app shuts down to release resources acquired in `setup_fn` or
+    `startup_fn`. May be a coroutine function."""
+    startup_fn: Optional[Callable[[BaseSettings], Union[None, Awaitable[None]]]] = None
+    """Called when the app starts serving, for things only a running app needs such as
+    job workers. May be a coroutine function."""
@@ -0,0 +1,132 @@
+"""Legacy implementation that does its database work without blocking the event loop.
+
+This uses the same handlers as `legacy_implementation` but runs their database work on
+an `AsyncSession` with an async driver, aiosqlite for sqlite and asyncmy for MySQL by
+default. While a query is waiting on the database the worker is free to serve other
+requests.
+
+To use it set `SUBMISSION_API_IMPLEMENTATION` to
+`submit_ce.fastapi.implementations.legacy_async_implementation.implementation`.
+"""
+
+import logging
+import os
+from typing import Dict, Callable, Optional, AsyncIterator
+
+from arxiv.config import settings
+from arxiv.db.models import configure_db_engine
+from fastapi import Depends
+from pydantic_settings import BaseSettings
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from submit_ce.fastapi.implementations import ImplementationConfig
+from submit_ce.fastapi.implementations.legacy_implementation import (
+    LegacySubmitImplementation,
+    legacy_specific_settings,
+    _engine_args,
+    T,
+    startup,
+    stop_workers,
+)
+
+logger = logging.getLogger(__name__)
+
+_async_engine: Optional[AsyncEngine] = None
+"""Engine for this worker process, created by `setup()` and disposed of by
+`shutdown()`."""
+
+_async_engine_pid: Optional[int] = None
+"""Process that created `_async_engine`, used to detect an engine inherited across a
+fork."""
+
+_async_session_factory: Optional[async_sessionmaker] = None
+
+
+def async_db_uri(db_uri: str) -> str:
+    """Change the driver of `db_uri` to an async driver."""
+    url = make_url(db_uri)
+    if url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    elif url.get_backend_name() == "mysql":
+        url = url.set(
+            drivername=f"mysql+{legacy_specific_settings.legacy_async_mysql_driver}"
+        )
+    return url.render_as_string(hide_password=False)
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """Dependency for fastapi routes"""
+    if _async_engine is None or _async_engine_pid != os.getpid():
+        setup(None)
+
+    async with _async_session_factory() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+def legacy_async_depends(db=Depends(get_async_session)) -> dict:
+    return {"session": db}
+
+
+class LegacyAsyncSubmitImplementation(LegacySubmitImplementation):
+    """Legacy implementation on an `AsyncSession`.
+
+    The synchronous database methods of `LegacySubmitImplementation` are run with
+    `AsyncSession.run_sync()`. They get a regular `Session` but its IO is done by the
+    async driver on the event loop."""
+
+    async def _in_session(self, impl_data: Dict, fn: Callable[..., T], *args) -> T:
+        session: AsyncSession = impl_data["session"]
+        return await session.run_sync(fn, *args)
+
+
+def setup(config: Optional[BaseSettings]) -> None:
+    """Create the pooled async engine for this worker process, configured for the
+    arxiv.db models as the sync one is."""
+    global _async_engine, _async_engine_pid, _async_session_factory
+    if _async_engine is not None:
+        if _async_engine_pid == os.getpid():
+            return
+        # Inherited from the parent across a fork, the connections belong to the parent.
+        _async_engine.sync_engine.dispose(close=False)
+    _async_engine_pid = os.getpid()
+    _async_engine = create_async_engine(
+        async_db_uri(settings.CLASSIC_DB_URI), **_engine_args(settings.CLASSIC_DB_URI)
+    )
+    _async_session_factory = async_sessionmaker(
+        bind=_async_engine, autoflush=False, expire_on_commit=False
+    )
+    configure_db_engine(_async_engine.sync_engine, None)
+
+
+async def shutdown(config: BaseSettings) -> None:
+    """Close all pooled connections of this worker process, stop its job workers and its
+    preview compiles."""
+    global _async_engine, _async_engine_pid, _async_session_factory
+    stop_workers()
+    implementation.impl.previews.shutdown()
+    if _async_engine is None:
+        return
+    await _async_engine.dispose()
+    _async_engine = None
+    _async_engine_pid = None
+    _async_session_factory = None
+
+
+implementation = ImplementationConfig(
+    impl=LegacyAsyncSubmitImplementation(),
+    depends_fn=legacy_async_depends,
+    setup_fn=setup,
+    shutdown_fn=shutdown,
+    startup_fn=startup,
+)
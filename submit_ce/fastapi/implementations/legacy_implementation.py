@@ -1,27 +1,132 @@
+import asyncio
 import datetime
+import hashlib
+import json
 import logging
-from typing import Dict, Union, Optional
+import os
+import time
+from base64 import urlsafe_b64encode
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import (
+    Dict,
+    Union,
+    Optional,
+    Callable,
+    TypeVar,
+    List,
+    AsyncIterator,
+    Tuple,
+    Literal,
+    Any,
+    Sequence,
+)
 
 import arxiv.db
+import orjson
 from arxiv.config import settings
 from arxiv.db.models import Submission, Document, configure_db_engine, SubmissionCategory
 from fastapi import Depends, HTTPException, status, UploadFile
+from fastapi.encoders import jsonable_encoder
 from pydantic_settings import BaseSettings
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker, Session as SqlalchemySession, Session
+from sqlalchemy import create_engine, select, update, Engine, text
+from sqlalchemy.orm import (
+    sessionmaker,
+    Session as SqlalchemySession,
+    Session,
+    load_only,
+)
 
+from submit_ce.cache import ReadThroughCache, LocalCache
+from submit_ce.cache.redis_backend import RedisBackend
 from submit_ce.fastapi.api.default_api_base import BaseDefaultApi
-from submit_ce.fastapi.api.models import CategoryChangeResult
+from submit_ce.fastapi.api.models import (
+    CategoryChangeResult,
+    SourceFile,
+    SourceFileList,
+    FileProcessing,
+    Preview,
+)
 from submit_ce.fastapi.api.models.agent import User, Client
-from submit_ce.fastapi.api.models.events import AgreedToPolicy, StartedNew, StartedAlterExising, SetLicense, \
-    AuthorshipDirect, AuthorshipProxy, SetCategories, SetMetadata
+from submit_ce.fastapi.api.models.submission import PROCESSING_FIELDS, SubmissionFilter
+from submit_ce.fastapi.api.models.events import (
+    AgreedToPolicy,
+    StartedNew,
+    StartedAlterExising,
+    SetLicense,
+    AuthorshipDirect,
+    AuthorshipProxy,
+    SetCategories,
+    SetMetadata,
+    BatchOperation,
+)
 from submit_ce.fastapi.implementations import ImplementationConfig
-from submit_ce.file_store import SubmissionFileStore
+from submit_ce.fastapi.implementations.submission_listing import (
+    select_submissions,
+    encode_cursor,
+    decode_cursor,
+    Key,
+)
+from submit_ce.file_store import SubmissionFileStore, SecurityError, StoredFile
+from submit_ce.file_store.dedup_file_store import DedupFileStore
+from submit_ce.file_store.extract import ExtractionError, ExtractionLimits
+from submit_ce.file_store.lease import FileLease, LeaseHeld, LeaseLost
 from submit_ce.file_store.legacy_file_store import LegacyFileStore
+from submit_ce.file_store.manifest import manifest_checksum, summarize_source
+from submit_ce.file_store.object_store import ObjectFileStore
+from submit_ce.jobs import Job, JobQueue, JobFailed
+from submit_ce.jobs.sqlite_queue import SqliteJobQueue
+from submit_ce.jobs.worker import LocalWorkers
+from submit_ce.preview import PreviewBuilder, CompileError
+from submit_ce.preview.pdflatex import PdfLatex
+from submit_ce.file_store.upload import (
+    UploadState,
+    UploadError,
+    UploadNotFound,
+    UploadOffsetMismatch,
+    UploadTooLarge,
+    UploadChecksumMismatch,
+    parse_upload_checksum,
+    parse_upload_metadata,
+)
 
 logger = logging.getLogger(__name__)
 
-_setup = False
+T = TypeVar("T")
+
+_engine: Optional[Engine] = None
+"""Engine for this worker process, created by `setup()` and disposed of by
+`shutdown()`."""
+
+_engine_pid: Optional[int] = None
+"""Process that created `_engine`, used to detect an engine inherited across a fork."""
+
+_workers: Optional[LocalWorkers] = None
+"""Job workers started by `startup()`."""
+
+PROCESS_UPLOAD = "process_upload"
+"""Kind of the job that unpacks a package posted to `file_post`."""
+
+BUILD_PREVIEW = "build_preview"
+"""Kind of the job that compiles the preview requested with `preview_post`."""
+
+
+@dataclass
+class FileWrite:
+    """A write of the files of a submission in progress, see
+    `LegacySubmitImplementation._file_write`."""
+
+    submission_id: int
+    lease: Optional[FileLease] = None
+    """Lease held for the write, `None` when the row lock is held instead."""
+    published: bool = False
+    """Whether the write changed the live files."""
+    released: bool = False
+    """Whether the lease was given back."""
+    row_values: Dict[str, Any] = field(default_factory=dict)
+    """Columns of the submission row to update along with the write, in the same
+    transaction that ends it."""
+
 
 class LegacySpecificSettings(BaseSettings):
     legacy_data_new_prefix: str = "/data/new"
@@ -29,33 +134,165 @@ class LegacySpecificSettings(BaseSettings):
 
     legacy_serialize_file_operations: bool = True
     """Whether to lock on submission table row to serialize file write operations.
-    
-    Not serializing will expose the system to race conditions between different clients writing to the files.
-    
-    This will only prevent race conditions between other systems that use the row lock to exclusively write the files.
-    
-    Serializing will increase lock contention. """
+
+    Not serializing will expose the system to race conditions between different clients
+    writing to the files.
+
+    This will only prevent race conditions between other systems that use the row lock
+    to exclusively write the files.
+
+    Readers don't need the lock, uploads are staged and published atomically by
+    `LegacyFileStore`. Without it two concurrent writers can still lose one of their
+    changes.
+
+    Serializing will increase lock contention."""
+
+    legacy_file_lock: Literal["row", "lease"] = "lease"
+    """How file write operations are serialized when `legacy_serialize_file_operations`
+    is on.
+
+    ``row`` holds ``SELECT ... FOR UPDATE`` on the submission row for the whole request,
+    including the upload and extraction, which pins a row lock and a DB connection for
+    as long as the client takes to send the package.
+
+    ``lease`` holds the row lock only to take a lease before the IO and to publish and
+    give the lease back after it, see `submit_ce.file_store.lease`. Other systems that
+    hold the row lock while they write the files are still serialized with those
+    steps."""
+
+    legacy_file_lease_seconds: int = 15 * 60
+    """How long a lease is good for. A lease that was not given back, say after a crash,
+    blocks other writers until it expires. Large packages should use the resumable
+    upload so each request is short."""
+
+    legacy_file_lease_wait_seconds: float = 30.0
+    """How long a write waits for another writer's lease before giving up with 409."""
 
     legacy_root_dir: str = "data/new"
 
+    legacy_object_store_bucket: Optional[str] = None
+    """Bucket of an S3 compatible object store to keep the files in instead of
+    `legacy_root_dir`, see `submit_ce.file_store.object_store`. Needs boto3, which is
+    configured with the usual AWS_* environment."""
+
+    legacy_object_store_endpoint_url: Optional[str] = None
+    """URL of the object store if it is not AWS S3. Ex. http://minio:9000"""
+
+    legacy_object_store_prefix: str = ""
+    """Prefix of the keys of the files in `legacy_object_store_bucket`. Ex.
+    submissions/"""
+
+    legacy_object_store_part_size: int = 8 * 1024**2
+    """Size of the parts of multipart uploads to the object store, at least 5 MB for
+    S3."""
+
+    legacy_dedup_files: bool = False
+    """Whether to store each distinct file content once and hard link it into the source
+    directories, see `submit_ce.file_store.dedup_file_store`. Run
+    `DedupFileStore.collect_garbage` periodically when this is on."""
+
+    legacy_db_pool_size: int = 10
+    """Number of connections to keep open in the pool of each worker process."""
+
+    legacy_db_max_overflow: int = 10
+    """Number of connections allowed beyond `legacy_db_pool_size` during bursts."""
+
+    legacy_db_pool_timeout: int = 30
+    """Seconds to wait for a connection from the pool before giving up."""
+
+    legacy_db_pool_recycle: int = 3600
+    """Seconds after which a pooled connection is replaced.
+
+    This should be less than the MySQL `wait_timeout` so the server does not close
+    connections out from under the pool. Set to -1 to never recycle."""
+
+    legacy_db_pool_pre_ping: bool = True
+    """Whether to test connections for liveness on checkout from the pool."""
+
+    legacy_checksum_algorithms: List[str] = ["md5"]
+    """Checksum algorithms the file store computes for uploads, from
+    `submit_ce.file_store.checksum.ALGORITHMS`.
+
+    All are computed in one pass. The first is the checksum returned by the API, keep
+    md5 first to stay compatible with checksums of the legacy system."""
+
+    legacy_max_package_members: int = 25_000
+    """Maximum number of files and directories in an uploaded source package."""
+
+    legacy_max_unpacked_size: int = 4 * 1024**3
+    """Maximum total size in bytes of the files of an uploaded source package once
+    unpacked."""
+
+    legacy_job_queue_path: Optional[str] = None
+    """SQLite file of the queue of background jobs, see `submit_ce.jobs`. When set, a
+    package posted to ``/files`` is saved and the request returns 202, a worker unpacks
+    it and the submission shows its progress."""
+
+    legacy_job_workers: int = 0
+    """Worker processes each API process starts for `legacy_job_queue_path`, 0 if they
+    are run some other way."""
+
+    legacy_preview_command: str = "pdflatex"
+    """TeX command that compiles previews, see `submit_ce.preview.pdflatex`."""
+
+    legacy_preview_timeout: float = 300.0
+    """Seconds each run of `legacy_preview_command` may take."""
+
+    legacy_preview_workers: int = 2
+    """Processes each API or job worker process compiles previews in."""
+
+    legacy_submission_cache_size: int = 10_000
+    """Submissions kept in the memory of each process for `get_submission`, 0 to not
+    cache them."""
+
+    legacy_submission_cache_seconds: float = 2.0
+    """How long a submission is kept in the memory of a process. Another process's
+    changes to it can take this long to be seen, changes made through this process are
+    seen at once."""
+
+    legacy_submission_cache_redis_url: Optional[str] = None
+    """Redis shared by the processes to cache submissions in, see `submit_ce.cache`.
+    Needs redis. Ex. redis://cache:6379/0"""
+
+    legacy_submission_cache_shared_seconds: float = 30.0
+    """How long a submission is kept in `legacy_submission_cache_redis_url`. Changes
+    made by other systems than this API can take this long to be seen."""
+
+    legacy_async_mysql_driver: str = "asyncmy"
+    """SQLAlchemy driver used for MySQL by `legacy_async_implementation`. Ex. asyncmy or
+    aiomysql"""
 
 
 legacy_specific_settings = LegacySpecificSettings(_case_sensitive=False)
 
 def db_lock_capable(session: SqlalchemySession) -> bool:
-    return "sqlite" not in session.get_bind().url
+    """Whether the database of `session` has row locks, SQLite with any driver does
+    not."""
+    return session.get_bind().dialect.name != "sqlite"
+
+
+def _engine_args(db_uri: str) -> dict:
+    """Arguments for `create_engine` from the pool settings."""
+    args = dict(
+        echo=settings.ECHO_SQL,
+        pool_pre_ping=legacy_specific_settings.legacy_db_pool_pre_ping,
+        pool_recycle=legacy_specific_settings.legacy_db_pool_recycle,
+    )
+    if "sqlite" in db_uri:
+        args["connect_args"] = {"check_same_thread": False}
+    else:
+        args.update(
+            pool_size=legacy_specific_settings.legacy_db_pool_size,
+            max_overflow=legacy_specific_settings.legacy_db_max_overflow,
+            pool_timeout=legacy_specific_settings.legacy_db_pool_timeout,
+        )
+    return args
+
 
 def get_session() -> SqlalchemySession:
     """Dependency for fastapi routes"""
-    global _setup
-    if not _setup:
-        if 'sqlite' in settings.CLASSIC_DB_URI:
-            args = {"check_same_thread": False}
-        else:   # pragma: no cover
-            args = {}
-        engine = create_engine(settings.CLASSIC_DB_URI, echo=settings.ECHO_SQL, connect_args=args)
-        arxiv.db.session_factory = sessionmaker(autoflush=False, bind=engine)
-        configure_db_engine(engine, None)
+    if _engine is None or _engine_pid != os.getpid():
+        setup(settings)
 
     with arxiv.db.session_factory() as session:
         try:
@@ -77,12 +314,47 @@ def check_user_authorized(session: Session, user: User, client: Client, submisio
     # TODO implement is_locked on submission
     pass
 
-def check_submission_exists(session: Session, submission_id: str, lock_row: bool = False) -> Submission:
+
+def upload_http_exception(ex: UploadError) -> HTTPException:
+    """HTTP error for a resumable upload request that can't be applied."""
+    if isinstance(ex, UploadNotFound):
+        code = status.HTTP_404_NOT_FOUND
+    elif isinstance(ex, UploadOffsetMismatch):
+        code = status.HTTP_409_CONFLICT
+    elif isinstance(ex, UploadTooLarge):
+        code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    elif isinstance(ex, UploadChecksumMismatch):
+        code = 460  # Checksum Mismatch, from tus
+    else:
+        code = status.HTTP_400_BAD_REQUEST
+    return HTTPException(status_code=code, detail=str(ex))
+
+
+def check_submission_exists(
+    session: Session,
+    submission_id: str,
+    lock_row: bool = False,
+    columns: Optional[Sequence[str]] = None,
+) -> Submission:
+    """The row of a submission, with only `columns` loaded if given.
+
+    With `lock_row` the row is locked until the transaction ends. SQLite has no row
+    locks, so there the write lock of the database is taken with ``BEGIN IMMEDIATE``,
+    which serializes the same writers and those of other processes."""
     try:
         stmt = select(Submission).where(Submission.submission_id == int(submission_id))
+        if columns is not None:
+            stmt = stmt.options(
+                load_only(*[getattr(Submission, column) for column in columns])
+            )
         if lock_row:  # row will be locked until .commit() use .flush() to get auto inc ids without unlocking
             session.begin()
-            stmt = stmt.with_for_update()
+            if db_lock_capable(session):
+                stmt = stmt.with_for_update()
+            else:
+                # No row locks in SQLite, its write lock is held until .commit()
+                # instead, for all rows.
+                session.execute(text("BEGIN IMMEDIATE"))
 
         submission = session.scalars(stmt).first()
         if not submission:
@@ -97,28 +369,285 @@ def check_submission_exists(session: Session, submission_id: str, lock_row: bool
 
 class LegacySubmitImplementation(BaseDefaultApi):
     """
-    TODO write admin log on all changes
-    TODO success response objects (similar to modapi? {msg: success, updated_fields:[]})
-    TODO failure to validate response objects (which field caused the problem?)
-    TODO Failure response object (general failure message)
-    TODO Later: edit token similar to modapi?
-
+    TODO write admin log on all changes TODO success response objects (similar to
+    modapi? {msg: success, updated_fields:[]}) TODO failure to validate response objects
+    (which field caused the problem?) TODO Failure response object (general failure
+    message) TODO Later: edit token similar to modapi?
 
+    The database work of each handler is in a synchronous method that takes the session
+    as its first argument. The handlers run these with `_in_session()` so subclasses can
+    change how they are run, see `legacy_async_implementation`.
     """
-    def __init__(self, store: Optional[SubmissionFileStore] = None):
+
+    def __init__(
+        self,
+        store: Optional[SubmissionFileStore] = None,
+        jobs: Optional[JobQueue] = None,
+        previews: Optional[PreviewBuilder] = None,
+        submission_cache: Optional[ReadThroughCache] = None,
+    ):
+        self.jobs = (
+            jobs
+            if jobs is not None or not legacy_specific_settings.legacy_job_queue_path
+            else SqliteJobQueue(legacy_specific_settings.legacy_job_queue_path)
+        )
+        """Queue for work done after a request returns, `None` to do it in the
+        request."""
+        self.previews = (
+            previews
+            if previews is not None
+            else PreviewBuilder(
+                PdfLatex(
+                    command=legacy_specific_settings.legacy_preview_command,
+                    timeout=legacy_specific_settings.legacy_preview_timeout,
+                ),
+                max_workers=legacy_specific_settings.legacy_preview_workers,
+            )
+        )
+        self.submission_cache = (
+            submission_cache
+            if submission_cache is not None
+            else make_submission_cache()
+        )
+        """Rows shown by `get_submission`, handlers that change a submission invalidate
+        its entry."""
         if store is None:
             #self.store = LegacyFileStore(root_dir=legacy_specific_settings.legacy_root_dir)
-            self.store = LegacyFileStore(root_dir="data/new") # for testing only
+            limits = ExtractionLimits(
+                max_members=legacy_specific_settings.legacy_max_package_members,
+                max_total_size=legacy_specific_settings.legacy_max_unpacked_size,
+            )
+            if legacy_specific_settings.legacy_object_store_bucket:
+                import boto3
+
+                client = boto3.client(
+                    "s3",
+                    endpoint_url=(
+                        legacy_specific_settings.legacy_object_store_endpoint_url
+                    ),
+                )
+                self.store = ObjectFileStore(
+                    client,
+                    legacy_specific_settings.legacy_object_store_bucket,
+                    prefix=legacy_specific_settings.legacy_object_store_prefix,
+                    part_size=legacy_specific_settings.legacy_object_store_part_size,
+                    checksum_algorithms=(
+                        legacy_specific_settings.legacy_checksum_algorithms
+                    ),
+                    extraction_limits=limits,
+                )
+                return
+            store_class = (
+                DedupFileStore
+                if legacy_specific_settings.legacy_dedup_files
+                else LegacyFileStore
+            )
+            self.store = store_class(
+                root_dir="data/new",  # for testing only
+                checksum_algorithms=legacy_specific_settings.legacy_checksum_algorithms,
+                extraction_limits=limits,
+            )
         else:
             self.store = store
 
-    async def get_submission(self, impl_data: Dict, user: User, client: Client, submission_id: str) -> object:
-        session = impl_data["session"]
-        submission = check_submission_exists(session, submission_id)
-        return {c.name: getattr(submission, c.name) for c in Submission.__table__.columns}
+    async def _in_session(self, impl_data: Dict, fn: Callable[..., T], *args) -> T:
+        """Run `fn` with the session of `impl_data` and `args`."""
+        return fn(impl_data["session"], *args)
+
+    async def get_submission(
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        fields: Optional[Sequence[str]] = None,
+    ) -> object:
+        return (
+            await self.get_submission_version(
+                impl_data, user, client, submission_id, fields
+            )
+        )[1]
+
+    async def get_submission_version(
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[str, dict]:
+        """The version of the submission and its JSON compatible fields, all or
+        `fields`.
+
+        The whole row is read through `submission_cache` and its version is of the row,
+        then a dot and the state of the jobs of the submission if it has any. With
+        `fields` only their columns are selected, the cache is not used, and the version
+        is of the fields returned. It changes only when they do and is not the version
+        of the row, so it can't be used as If-Match."""
+        columns = (
+            None
+            if fields is None
+            else [name for name in fields if name not in PROCESSING_FIELDS]
+        )
+        if columns is not None:
+            submission = await self._in_session(
+                impl_data, self._get_submission_columns, submission_id, columns
+            )
+        else:
+            try:
+                key = submission_cache_key(submission_id)
+            except ValueError:  # not found, let the query say so
+                cached = await self._in_session(
+                    impl_data, self._get_submission, submission_id
+                )
+            else:
+                cached = await self.submission_cache.get(
+                    key,
+                    lambda: self._in_session(
+                        impl_data, self._get_submission, submission_id
+                    ),
+                )
+            version, submission = cached["version"], dict(cached["submission"])
+
+        jobs = []
+        if self.jobs is not None:
+            for field_name, kind in (
+                ("file_processing", PROCESS_UPLOAD),
+                ("preview_processing", BUILD_PREVIEW),
+            ):
+                if fields is None or field_name in fields:
+                    job = await asyncio.to_thread(
+                        self.jobs.latest, submission["submission_id"], kind
+                    )
+                    submission[field_name] = (
+                        file_processing(job).model_dump(mode="json")
+                        if job is not None
+                        else None
+                    )
+                    if job is not None:
+                        jobs.append((job.job_id, job.state, job.updated))
+        if columns is not None:
+            version = content_version(submission)
+        elif jobs:
+            version = f"{version}.{content_version(jobs)[:8]}"
+        return version, submission
+
+    def _get_submission_columns(
+        self, session: Session, submission_id: str, columns: Sequence[str]
+    ) -> dict:
+        """Only `columns` of the row of the submission, the others are not selected."""
+        submission = check_submission_exists(session, submission_id, columns=columns)
+        return jsonable_encoder(
+            {name: getattr(submission, name) for name in ["submission_id", *columns]}
+        )
+
+    def _get_submission(self, session: Session, submission_id: str) -> dict:
+        """The row of the submission and its version, as cached in
+        `submission_cache`."""
+        row = submission_row(check_submission_exists(session, submission_id))
+        return {"version": content_version(row), "submission": row}
+
+    async def list_submissions(
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        filters: SubmissionFilter,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        fields: Optional[Sequence[str]] = None,
+    ) -> dict:
+        try:
+            after = decode_cursor(cursor) if cursor is not None else None
+        except ValueError as ex:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex))
+        return await self._in_session(
+            impl_data, self._list_submissions, filters, after, limit, fields
+        )
+
+    def _list_submissions(
+        self,
+        session: Session,
+        filters: SubmissionFilter,
+        after: Optional[Key],
+        limit: int,
+        fields: Optional[Sequence[str]],
+    ) -> dict:
+        """The rows of a page, the state of their jobs is not listed. One more row than
+        the page is read to know whether there is a next page."""
+        columns = (
+            None
+            if fields is None
+            else [name for name in fields if name not in PROCESSING_FIELDS]
+        )
+        names = (
+            [c.name for c in Submission.__table__.columns]
+            if columns is None
+            else ["submission_id", *columns]
+        )
+        load = (
+            None
+            if columns is None
+            else list(dict.fromkeys(["submission_id", "updated", *columns]))
+        )
+        rows = session.scalars(
+            select_submissions(filters, after, limit + 1, load)
+        ).all()
+        last = rows[limit - 1] if len(rows) > limit else None
+        return {
+            "submissions": jsonable_encoder(
+                [{name: getattr(row, name) for name in names} for row in rows[:limit]]
+            ),
+            "next_cursor": (
+                encode_cursor((last.updated, last.submission_id))
+                if last is not None
+                else None
+            ),
+        }
+
+    def _load_for_change(
+        self, session: Session, submission_id: str, if_match: Optional[str]
+    ) -> Submission:
+        """The row of a submission a handler is about to change.
+
+        With `if_match`, the ETags from an If-Match header, the row is locked for the
+        rest of the transaction so no other writer can change it between the check and
+        the commit, the lock is held only as long as the handler. On SQLite the whole
+        database is locked for writes instead, see `check_submission_exists`.
+
+        Raises
+        ------
+        HTTPException
+            412 if the version of the row is not one of `if_match`."""
+        lock_row = if_match is not None
+        submission = check_submission_exists(session, submission_id, lock_row=lock_row)
+        if if_match is not None and not version_matches(
+            if_match, content_version(submission_row(submission))
+        ):
+            if lock_row:
+                session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail=f"Submission {submission_id} was changed since the version of "
+                "If-Match",
+            )
+        return submission
+
+    async def _changed(self, submission_id: Union[str, int]) -> None:
+        """Drop the cached row of a submission, call once a change to it is
+        committed."""
+        await self.submission_cache.invalidate(submission_cache_key(submission_id))
 
     async def start(self, impl_data: Dict, user: User, client: Client, started: Union[StartedNew, StartedAlterExising]) -> str:
-        session = impl_data["session"]
+        return await self._in_session(impl_data, self._start, user, client, started)
+
+    def _start(
+        self,
+        session: Session,
+        user: User,
+        client: Client,
+        started: Union[StartedNew, StartedAlterExising],
+    ) -> str:
         now = datetime.datetime.utcnow()
         submission = Submission(submitter_id=user.identifier,
                                 submitter_name=user.get_name(),
@@ -154,14 +683,37 @@ class LegacySubmitImplementation(BaseDefaultApi):
         session.commit()
         return str(submission.submission_id)
 
-
     # TODO need to do "userinfo" attestation
 
-    async def accept_policy_post(self, impl_data: Dict, user: User, client: Client,
-                                 submission_id: str,
-                                 agreement: AgreedToPolicy) -> object:
-        session = impl_data["session"]
-        submission = check_submission_exists(session, submission_id)
+    async def accept_policy_post(
+        self,
+        impl_data: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        agreement: AgreedToPolicy,
+        if_match: Optional[str] = None,
+    ) -> object:
+        result = await self._in_session(
+            impl_data, self._accept_policy, submission_id, agreement, if_match
+        )
+        await self._changed(submission_id)
+        return result
+
+    def _accept_policy(
+        self,
+        session: Session,
+        submission_id: str,
+        agreement: AgreedToPolicy,
+        if_match: Optional[str] = None,
+    ) -> None:
+        submission = self._load_for_change(session, submission_id, if_match)
+        self._apply_accept_policy(session, submission, agreement)
+        session.commit()
+
+    def _apply_accept_policy(
+        self, session: Session, submission: Submission, agreement: AgreedToPolicy
+    ) -> None:
         if agreement.accepted_policy_id != 3:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                                 detail=f"policy {agreement.accepted_policy_id} is not the currently accepted policy.")
@@ -169,54 +721,652 @@ class LegacySubmitImplementation(BaseDefaultApi):
             return
         submission.agreement_id = agreement.accepted_policy_id
         submission.agree_policy = 1
-        session.commit()
+        submission.updated = datetime.datetime.utcnow()
 
-    async def set_license_post(self, impl_dep: dict, user: User, client: Client,
-                               submission_id: str, set_license: SetLicense) -> None:
-        session = impl_dep["session"]
+    async def set_license_post(
+        self,
+        impl_dep: dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        set_license: SetLicense,
+        if_match: Optional[str] = None,
+    ) -> None:
+        result = await self._in_session(
+            impl_dep,
+            self._set_license,
+            user,
+            client,
+            submission_id,
+            set_license,
+            if_match,
+        )
+        await self._changed(submission_id)
+        return result
+
+    def _set_license(
+        self,
+        session: Session,
+        user: User,
+        client: Client,
+        submission_id: str,
+        set_license: SetLicense,
+        if_match: Optional[str] = None,
+    ) -> None:
         check_user_authorized(session, user, client, submission_id)
-        submission = check_submission_exists(session, submission_id)
-        submission.license = set_license.license_uri
+        submission = self._load_for_change(session, submission_id, if_match)
+        self._apply_set_license(session, submission, set_license)
         session.commit()
 
-    async def assert_authorship_post(self, impl_dep: Dict, user: User, client: Client,
-                                     submission_id: str, authorship: Union[AuthorshipDirect, AuthorshipProxy]) -> str:
-        session = impl_dep["session"]
+    def _apply_set_license(
+        self, session: Session, submission: Submission, set_license: SetLicense
+    ) -> None:
+        submission.license = set_license.license_uri
+        submission.updated = datetime.datetime.utcnow()
+
+    async def assert_authorship_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        authorship: Union[AuthorshipDirect, AuthorshipProxy],
+        if_match: Optional[str] = None,
+    ) -> str:
+        result = await self._in_session(
+            impl_dep,
+            self._assert_authorship,
+            user,
+            client,
+            submission_id,
+            authorship,
+            if_match,
+        )
+        await self._changed(submission_id)
+        return result
+
+    def _assert_authorship(
+        self,
+        session: Session,
+        user: User,
+        client: Client,
+        submission_id: str,
+        authorship: Union[AuthorshipDirect, AuthorshipProxy],
+        if_match: Optional[str] = None,
+    ) -> str:
         check_user_authorized(session, user, client, submission_id)
-        submission = check_submission_exists(session, submission_id)
+        submission = self._load_for_change(session, submission_id, if_match)
+        result = self._apply_assert_authorship(session, submission, authorship)
+        session.commit()
+        return result
+
+    def _apply_assert_authorship(
+        self,
+        session: Session,
+        submission: Submission,
+        authorship: Union[AuthorshipDirect, AuthorshipProxy],
+    ) -> str:
         if isinstance(authorship, AuthorshipDirect):
             submission.is_author=1
         else:
             submission.is_author=0
             submission.proxy=authorship.proxy
-        session.commit()
+        submission.updated = datetime.datetime.utcnow()
         return "success"
 
-    async def file_post(self, impl_dep: Dict, user: User, client: Client, submission_id: str, uploadFile: UploadFile):
-        session: SqlalchemySession = impl_dep["session"]
-        check_user_authorized(session, user, client, submission_id)
-        submission = check_submission_exists(session, submission_id,
-                                             lock_row=legacy_specific_settings.legacy_serialize_file_operations)
-        acceptable_types = ["application/gzip", "application/tar", "application/tar+gzip"]
-        if uploadFile.content_type in acceptable_types:
-            checksum = await self.store.store_source_package(submission.submission_id, uploadFile)
+    async def file_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        uploadFile: UploadFile,
+    ) -> Union[str, FileProcessing]:
+        if self.jobs is not None:
+            return await self._enqueue_file_post(
+                impl_dep, user, client, submission_id, uploadFile
+            )
+        async with self._file_write(impl_dep, user, client, submission_id) as write:
+            try:
+                staged = await self.store.stage_source_package(
+                    write.submission_id, uploadFile
+                )
+            except (ExtractionError, SecurityError) as ex:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex)
+                )
+            return await self._publish_staged(impl_dep, write, staged)
+
+    async def _enqueue_file_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        uploadFile: UploadFile,
+    ) -> FileProcessing:
+        """Save the package as the resumable upload of the submission and enqueue a job
+        to unpack it, see `process_upload`. An upload in progress is discarded, as a new
+        one would discard it."""
+        size = (
+            uploadFile.size
+            if uploadFile.size is not None
+            else await asyncio.to_thread(uploadFile.file.seek, 0, os.SEEK_END)
+        )
+        await uploadFile.seek(0)
+        async with self._file_write(impl_dep, user, client, submission_id) as write:
+            await self.store.create_upload(
+                write.submission_id, size, uploadFile.filename
+            )
+            await self.store.append_upload(
+                write.submission_id, 0, upload_chunks(uploadFile, self.store.read_size)
+            )
+            job = await asyncio.to_thread(
+                self.jobs.enqueue, PROCESS_UPLOAD, write.submission_id
+            )
+        return file_processing(job)
+
+    async def process_upload(self, impl_dep: Dict, submission_id: int) -> dict:
+        """Unpack and publish the package `file_post` saved as the upload of the
+        submission, in a job worker.
+
+        Raises
+        ------
+        JobFailed
+            If the package can't be unpacked or the submission is gone, trying again
+            would not help."""
+        try:
+            async with self._file_write(
+                impl_dep, None, None, str(submission_id)
+            ) as write:
+                try:
+                    staged = await self.store.stage_upload(write.submission_id)
+                except (ExtractionError, SecurityError, UploadError) as ex:
+                    raise JobFailed(str(ex)) from ex
+                checksum = await self._publish_staged(impl_dep, write, staged)
+        except HTTPException as ex:
+            if ex.status_code == status.HTTP_404_NOT_FOUND:
+                raise JobFailed(ex.detail) from ex
+            raise
+        return {
+            "checksum": checksum,
+            "file_count": staged.summary.file_count,
+            "source_size": staged.summary.source_size,
+            "source_format": staged.summary.source_format,
+        }
+
+    @asynccontextmanager
+    async def _file_write(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> AsyncIterator[FileWrite]:
+        """Serialize a write of the files of a submission with other writers, see
+        `legacy_file_lock`.
+
+        With a lease the row lock is not held while the body runs. Set
+        `FileWrite.published` if the body changed the live files, or use
+        `_publish_staged`. `FileWrite.row_values` are written to the submission row when
+        the write ends, in the transaction that holds the row lock, and the cached row
+        is dropped."""
+        if (
+            not legacy_specific_settings.legacy_serialize_file_operations
+            or legacy_specific_settings.legacy_file_lock == "row"
+        ):
+            submission = await self._in_session(
+                impl_dep, self._check_file_post, user, client, submission_id
+            )
+            write = FileWrite(submission_id=submission.submission_id)
+            yield write
+            if write.row_values:
+                await self._in_session(impl_dep, self._end_row_write, write)
+                await self._changed(write.submission_id)
+            return
+
+        write = await self._take_file_lease(impl_dep, user, client, submission_id)
+        try:
+            yield write
+        finally:
+            if not write.released:
+                try:
+                    await self._in_session(impl_dep, self._give_back_file_lease, write)
+                except Exception:  # the lease expires on its own
+                    logger.exception(
+                        "Could not give back the file lease of submission %s",
+                        write.submission_id,
+                    )
+            if write.row_values:
+                await self._changed(write.submission_id)
 
-        # TODO db changes for upload: source_format
-        # TODO db changes for upload: source_size
-        # TODO db changes for upload: package?
+    async def _take_file_lease(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> FileWrite:
+        """Take the file lease of the submission, waiting with backoff while another
+        writer holds it."""
+        deadline = (
+            time.monotonic() + legacy_specific_settings.legacy_file_lease_wait_seconds
+        )
+        delay = 0.05
+        while True:
+            try:
+                return await self._in_session(
+                    impl_dep, self._acquire_file_lease, user, client, submission_id
+                )
+            except LeaseHeld as ex:
+                if time.monotonic() + delay > deadline:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT, detail=str(ex)
+                    )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
 
+    def _acquire_file_lease(
+        self, session: Session, user: User, client: Client, submission_id: str
+    ) -> FileWrite:
+        check_user_authorized(session, user, client, submission_id)
+        submission = check_submission_exists(session, submission_id, lock_row=True)
+        write = FileWrite(submission_id=submission.submission_id)
+        try:
+            write.lease = self.store.lease_file(write.submission_id).acquire(
+                legacy_specific_settings.legacy_file_lease_seconds
+            )
+        except LeaseHeld:
+            session.rollback()
+            raise
+        session.commit()
+        return write
+
+    def _give_back_file_lease(self, session: Session, write: FileWrite) -> None:
+        check_submission_exists(session, str(write.submission_id), lock_row=True)
+        try:
+            self.store.lease_file(write.submission_id).release(
+                write.lease, write.published
+            )
+        except LeaseLost:
+            logger.warning(
+                "File lease of submission %s was lost before it was given back",
+                write.submission_id,
+            )
         else:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail="File content type must be one of {acceptable_types}"\
-                                " but it was {uploadFile.content_type}."
-                                )
+            self._update_source_row(session, write)
+        write.released = True
+        session.commit()
+
+    async def _publish_staged(self, impl_dep: Dict, write: FileWrite, staged) -> str:
+        """Publish a staged package. With a lease this takes the row lock, checks the
+        lease is still held, publishes and gives the lease back, so the row lock is held
+        only for the renames of the publish.
+
+        The size, format and package name of the source, known from the extraction, are
+        written to the submission row in the same transaction."""
+        write.row_values = {
+            "source_size": staged.summary.source_size,
+            "source_format": staged.summary.source_format,
+            "package": staged.package,
+        }
+        if write.lease is None:
+            write.published = True
+            return await self.store.publish_staged(staged)
+        try:
+            await self._in_session(impl_dep, self._lock_for_publish, write)
+        except HTTPException:
+            self.store.discard_staged(staged)
+            raise
+        checksum = await self.store.publish_staged(staged)
+        write.published = True
+        await self._in_session(impl_dep, self._release_after_publish, write)
+        return checksum
+
+    def _lock_for_publish(self, session: Session, write: FileWrite) -> None:
+        check_submission_exists(session, str(write.submission_id), lock_row=True)
+        try:
+            self.store.lease_file(write.submission_id).check(write.lease)
+        except LeaseLost as ex:
+            write.released = True
+            session.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(ex))
+
+    def _release_after_publish(self, session: Session, write: FileWrite) -> None:
+        self.store.lease_file(write.submission_id).release(write.lease, published=True)
+        self._update_source_row(session, write)
+        write.released = True
+        session.commit()
+
+    def _end_row_write(self, session: Session, write: FileWrite) -> None:
+        """Update the row of a write made under the row lock, committing the transaction
+        that holds it."""
+        self._update_source_row(session, write)
+        session.commit()
+
+    def _update_source_row(self, session: Session, write: FileWrite) -> None:
+        """Write `FileWrite.row_values` to the submission row in one UPDATE."""
+        if write.row_values:
+            session.execute(
+                update(Submission)
+                .where(Submission.submission_id == write.submission_id)
+                .values(**write.row_values, updated=datetime.datetime.utcnow())
+            )
+
+    async def _set_source_summary(self, write: FileWrite) -> None:
+        """Set the size and format of the source for the row after a single file
+        changed. The manifest has them, so no file is read. The package on the row is
+        left as the last one uploaded."""
+        summary = summarize_source(
+            await self.store.list_source_files(write.submission_id) or []
+        )
+        write.row_values = {
+            "source_size": summary.source_size,
+            "source_format": summary.source_format,
+        }
+
+    def _check_file_post(
+        self, session: Session, user: User, client: Client, submission_id: str
+    ) -> Submission:
+        check_user_authorized(session, user, client, submission_id)
+        return check_submission_exists(
+            session,
+            submission_id,
+            lock_row=legacy_specific_settings.legacy_serialize_file_operations,
+        )
+
+    def _check_file_get(
+        self, session: Session, user: User, client: Client, submission_id: str
+    ) -> Submission:
+        check_user_authorized(session, user, client, submission_id)
+        return check_submission_exists(session, submission_id)
+
+    async def upload_create(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        length: int,
+        metadata: Optional[str],
+    ) -> UploadState:
+        try:
+            filename = parse_upload_metadata(metadata).get("filename")
+        except UploadError as ex:
+            raise upload_http_exception(ex)
+        async with self._file_write(impl_dep, user, client, submission_id) as write:
+            return await self.store.create_upload(write.submission_id, length, filename)
+
+    async def upload_head(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> UploadState:
+        submission = await self._in_session(
+            impl_dep, self._check_file_get, user, client, submission_id
+        )
+        state = await self.store.get_upload(submission.submission_id)
+        if state is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No upload in progress for submission {submission_id}",
+            )
+        return state
+
+    async def upload_patch(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        offset: int,
+        checksum: Optional[str],
+        content: AsyncIterator[bytes],
+    ) -> Tuple[UploadState, Optional[str]]:
+        async with self._file_write(impl_dep, user, client, submission_id) as write:
+            try:
+                state = await self.store.append_upload(
+                    write.submission_id,
+                    offset,
+                    content,
+                    parse_upload_checksum(checksum),
+                )
+            except UploadError as ex:
+                raise upload_http_exception(ex)
+            if not state.complete:
+                return state, None
+            try:
+                staged = await self.store.stage_upload(write.submission_id)
+            except (ExtractionError, SecurityError) as ex:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex)
+                )
+            return state, await self._publish_staged(impl_dep, write, staged)
+
+    async def upload_delete(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> None:
+        async with self._file_write(impl_dep, user, client, submission_id) as write:
+            if not await self.store.delete_upload(write.submission_id):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"No upload in progress for submission {submission_id}",
+                )
+
+    async def source_file_put(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        path: str,
+        content: AsyncIterator[bytes],
+    ) -> str:
+        async with self._file_write(impl_dep, user, client, submission_id) as write:
+            try:
+                entry = await self.store.store_source_file(
+                    write.submission_id, path, content
+                )
+            except (ExtractionError, SecurityError) as ex:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex)
+                )
+            write.published = True
+            await self._set_source_summary(write)
+        return entry.checksum
+
+    async def source_files_list(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> SourceFileList:
+        submission = await self._in_session(
+            impl_dep, self._check_file_get, user, client, submission_id
+        )
+        entries = await self.store.list_source_files(submission.submission_id) or []
+        files = [
+            SourceFile(
+                path=entry.name,
+                size=entry.size,
+                checksum=entry.checksum,
+                file_type=entry.file_type,
+                modified=(
+                    datetime.datetime.fromtimestamp(entry.mtime, datetime.timezone.utc)
+                    if entry.mtime is not None
+                    else None
+                ),
+            )
+            for entry in entries
+        ]
+        checksum = manifest_checksum(
+            entries, legacy_specific_settings.legacy_checksum_algorithms[0]
+        )
+        summary = summarize_source(entries)
+        return SourceFileList(
+            files=files,
+            file_count=summary.file_count,
+            source_size=summary.source_size,
+            source_format=summary.source_format,
+            main_files=list(summary.main_files),
+            checksum=checksum,
+        )
+
+    async def source_file_get(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str, path: str
+    ) -> StoredFile:
+        submission = await self._in_session(
+            impl_dep, self._check_file_get, user, client, submission_id
+        )
+        try:
+            stored = await self.store.get_source_file(submission.submission_id, path)
+        except SecurityError as ex:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex))
+        if stored is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"File {path} does not exist",
+            )
+        return stored
+
+    async def source_package_get(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> StoredFile:
+        submission = await self._in_session(
+            impl_dep, self._check_file_get, user, client, submission_id
+        )
+        stored = await self.store.get_source_package(submission.submission_id)
+        if stored is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No source for submission {submission_id}",
+            )
+        return stored
+
+    async def preview_get(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> StoredFile:
+        submission = await self._in_session(
+            impl_dep, self._check_file_get, user, client, submission_id
+        )
+        stored = await self.store.get_preview(submission.submission_id)
+        if stored is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No preview for submission {submission_id}",
+            )
+        return stored
+
+    async def preview_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        force: bool = False,
+    ) -> Union[Preview, FileProcessing]:
+        submission = await self._in_session(
+            impl_dep, self._check_file_get, user, client, submission_id
+        )
+        if self.jobs is None:
+            return await self.build_preview(impl_dep, submission.submission_id, force)
+        if not force:
+            preview = await self._current_preview(submission.submission_id)
+            if preview is not None:
+                return preview
+        job = await asyncio.to_thread(
+            self.jobs.enqueue, BUILD_PREVIEW, submission.submission_id
+        )
+        return file_processing(job)
 
-    async def set_categories_post(self, impl_dep: Dict, user: User, client: Client, submission_id: str,
-                                  data: SetCategories):
-        session: SqlalchemySession = impl_dep["session"]
+    async def _current_preview(self, submission_id: int) -> Optional[Preview]:
+        """The stored preview if it is of the current source, so a request for it needs
+        no job."""
+        if not await asyncio.to_thread(self.store.does_source_exist, submission_id):
+            return None
+        source_checksum = await asyncio.to_thread(
+            self.store.get_source_pacakge_checksum, submission_id
+        )
+        stored = await self.previews.current_preview(
+            self.store, submission_id, source_checksum
+        )
+        if stored is None:
+            return None
+        return Preview(
+            checksum=stored.checksum, source_checksum=source_checksum, compiled=False
+        )
+
+    async def build_preview(
+        self, impl_dep: Dict, submission_id: int, force: bool = False
+    ) -> Preview:
+        """Build the preview of the submission, in the request or in a job worker.
+
+        Raises
+        ------
+        HTTPException
+            400 if the source can't be compiled, see
+            `submit_ce.preview.CompileError`."""
+        try:
+            built = await self.previews.build(self.store, submission_id, force)
+        except CompileError as ex:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex))
+        return Preview(
+            checksum=built.checksum,
+            source_checksum=built.source_checksum,
+            compiled=built.compiled,
+        )
+
+    async def preview_delete(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str
+    ) -> None:
+        submission = await self._in_session(
+            impl_dep, self._check_file_get, user, client, submission_id
+        )
+        if not await self.store.delete_preview(submission.submission_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No preview for submission {submission_id}",
+            )
+
+    async def source_file_delete(
+        self, impl_dep: Dict, user: User, client: Client, submission_id: str, path: str
+    ) -> None:
+        async with self._file_write(impl_dep, user, client, submission_id) as write:
+            try:
+                deleted = await self.store.delete_source_file(write.submission_id, path)
+            except SecurityError as ex:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=str(ex)
+                )
+            write.published = deleted
+            if deleted:
+                await self._set_source_summary(write)
+        if not deleted:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"File {path} does not exist",
+            )
+
+    async def set_categories_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        data: SetCategories,
+        if_match: Optional[str] = None,
+    ):
+        result = await self._in_session(
+            impl_dep, self._set_categories, user, client, submission_id, data, if_match
+        )
+        await self._changed(submission_id)
+        return result
+
+    def _set_categories(
+        self,
+        session: Session,
+        user: User,
+        client: Client,
+        submission_id: str,
+        data: SetCategories,
+        if_match: Optional[str] = None,
+    ) -> CategoryChangeResult:
         check_user_authorized(session, user, client, submission_id)
-        submission = check_submission_exists(session, submission_id)
+        submission = self._load_for_change(session, submission_id, if_match)
+        result = self._apply_set_categories(session, submission, data)
+        session.commit()
+        return result
 
+    def _apply_set_categories(
+        self, session: Session, submission: Submission, data: SetCategories
+    ) -> CategoryChangeResult:
         # similar to code in modapi routes.py
         stmt = select(SubmissionCategory).where(SubmissionCategory.submission_id == submission.submission_id)
         early_rows = session.scalars(stmt).all()
@@ -255,6 +1405,9 @@ class LegacySubmitImplementation(BaseDefaultApi):
 
         # if updates:
         #       self.admin_log(session, user, f"Edited: {','.join(updates)}", command="edit metadata")
+        if updates:
+            submission.updated = datetime.datetime.utcnow()
+        session.flush()  # so a later change in the same transaction reads these rows
 
         result = CategoryChangeResult()
         eps = set() if not early_primary else set([early_primary])
@@ -266,11 +1419,45 @@ class LegacySubmitImplementation(BaseDefaultApi):
             result.new_secondaries = list(new_categories)
         return result
 
-    async def set_metadata_post(self, impl_dep: Dict, user: User, client: Client, submission_id: str,
-                                metadata: Union[SetMetadata]):
-        session: SqlalchemySession = impl_dep["session"]
+    async def set_metadata_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        metadata: Union[SetMetadata],
+        if_match: Optional[str] = None,
+    ):
+        result = await self._in_session(
+            impl_dep,
+            self._set_metadata,
+            user,
+            client,
+            submission_id,
+            metadata,
+            if_match,
+        )
+        await self._changed(submission_id)
+        return result
+
+    def _set_metadata(
+        self,
+        session: Session,
+        user: User,
+        client: Client,
+        submission_id: str,
+        metadata: Union[SetMetadata],
+        if_match: Optional[str] = None,
+    ) -> str:
         check_user_authorized(session, user, client, submission_id)
-        submission = check_submission_exists(session, submission_id)
+        submission = self._load_for_change(session, submission_id, if_match)
+        result = self._apply_set_metadata(session, submission, metadata)
+        session.commit()
+        return result
+
+    def _apply_set_metadata(
+        self, session: Session, submission: Submission, metadata: Union[SetMetadata]
+    ) -> str:
         update = []
         # TODO add checks
         if metadata.abstract != submission.abstract:
@@ -307,10 +1494,72 @@ class LegacySubmitImplementation(BaseDefaultApi):
 
         if update:
             # TODO Write admin_log
-            session.commit()
+            submission.updated = datetime.datetime.utcnow()
 
         return ",".join(update)
 
+    async def batch_post(
+        self,
+        impl_dep: Dict,
+        user: User,
+        client: Client,
+        submission_id: str,
+        operations: List[BatchOperation],
+        if_match: Optional[str] = None,
+    ) -> list:
+        result = await self._in_session(
+            impl_dep, self._batch, user, client, submission_id, operations, if_match
+        )
+        await self._changed(submission_id)
+        return result
+
+    def _batch(
+        self,
+        session: Session,
+        user: User,
+        client: Client,
+        submission_id: str,
+        operations: List[BatchOperation],
+        if_match: Optional[str] = None,
+    ) -> list:
+        """Apply the changes in order to the row loaded once and commit them together,
+        or none of them if one fails.
+
+        Raises
+        ------
+        HTTPException
+            The error of the change that failed, with its position in the detail."""
+        check_user_authorized(session, user, client, submission_id)
+        submission = self._load_for_change(session, submission_id, if_match)
+        results = []
+        for number, operation in enumerate(operations):
+            change = operation.change
+            try:
+                results.append(
+                    getattr(self, self._apply_change[type(change)])(
+                        session, submission, change
+                    )
+                )
+            except HTTPException as ex:
+                session.rollback()
+                raise HTTPException(
+                    status_code=ex.status_code,
+                    detail=f"Operation {number}: {ex.detail}",
+                ) from ex
+        session.commit()
+        return results
+
+    _apply_change = {
+        AgreedToPolicy: "_apply_accept_policy",
+        SetLicense: "_apply_set_license",
+        AuthorshipDirect: "_apply_assert_authorship",
+        AuthorshipProxy: "_apply_assert_authorship",
+        SetCategories: "_apply_set_categories",
+        SetMetadata: "_apply_set_metadata",
+    }
+    """Method `_batch` applies each type of change with, by name so subclasses can
+    override them."""
+
     async def mark_deposited_post(self, impl_data: Dict, user: User, client: Client, submission_id: str) -> None:
         pass
 
@@ -320,18 +1569,193 @@ class LegacySubmitImplementation(BaseDefaultApi):
     async def unmark_processing_for_deposit_post(self, impl_data: Dict, user: User, client: Client, submission_id: str) -> None:
         pass
 
-
     async def get_service_status(self, impl_data: dict):
-        return f"{self.__class__.__name__}  impl_data: {impl_data}"
+        return (
+            f"{self.__class__.__name__}  impl_data: {impl_data}  "
+            f"submission_cache: {self.submission_cache.metrics_dict()}"
+        )
 
 
-def setup(settings: BaseSettings) -> None:
-    pass
+def submission_row(submission: Submission) -> dict:
+    """The columns of a submission as JSON compatible values."""
+    return jsonable_encoder(
+        {c.name: getattr(submission, c.name) for c in Submission.__table__.columns}
+    )
+
+
+def content_version(value: Any) -> str:
+    """Version of a JSON compatible value, changes whenever the value does."""
+    return (
+        urlsafe_b64encode(
+            hashlib.md5(orjson.dumps(value, option=orjson.OPT_SORT_KEYS)).digest()
+        )
+        .decode()
+        .rstrip("=")
+    )
+
+
+def version_matches(if_match: str, version: str) -> bool:
+    """Whether an If-Match header has `version`, the version of the row of a submission.
+
+    The ETag of `get_submission` is the version of the row, then a dot and the state of
+    the jobs of the submission if it has any. Only the version of the row is compared, a
+    job that moved on does not make a change fail. The comparison is strong, a weak
+    ETag, as got with `fields`, never matches."""
+    if if_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().strip('"').partition(".")[0] == version
+        for tag in if_match.split(",")
+    )
+
+
+def submission_cache_key(submission_id: Union[str, int]) -> str:
+    """Key of a submission in `submission_cache`, the same for any spelling of its id.
+
+    Raises
+    ------
+    ValueError
+        If `submission_id` is not an int."""
+    return str(int(submission_id))
+
+
+def make_submission_cache() -> ReadThroughCache:
+    """The submission cache of `legacy_submission_cache_size` and
+    `legacy_submission_cache_redis_url`."""
+    local = (
+        LocalCache(
+            legacy_specific_settings.legacy_submission_cache_size,
+            legacy_specific_settings.legacy_submission_cache_seconds,
+        )
+        if legacy_specific_settings.legacy_submission_cache_size > 0
+        else None
+    )
+    shared = None
+    if legacy_specific_settings.legacy_submission_cache_redis_url:
+        import redis
+
+        shared = RedisBackend(
+            redis.Redis.from_url(
+                legacy_specific_settings.legacy_submission_cache_redis_url
+            )
+        )
+    return ReadThroughCache(
+        local,
+        shared,
+        shared_ttl=legacy_specific_settings.legacy_submission_cache_shared_seconds,
+        prefix="submit-ce:submission:",
+    )
+
+
+def upload_chunks(uploadFile: UploadFile, chunk_size: int) -> AsyncIterator[bytes]:
+    """The content of `uploadFile` in chunks."""
+
+    async def chunks():
+        while chunk := await uploadFile.read(chunk_size):
+            yield chunk
+
+    return chunks()
+
+
+def file_processing(job: Job) -> FileProcessing:
+    return FileProcessing(
+        job_id=job.job_id,
+        state=job.state,
+        error=job.error,
+        enqueued=datetime.datetime.fromtimestamp(job.created, datetime.timezone.utc),
+        updated=datetime.datetime.fromtimestamp(job.updated, datetime.timezone.utc),
+    )
+
+
+def process_upload_job(job: Job) -> str:
+    """Handler for `PROCESS_UPLOAD` jobs, run in a job worker process."""
+    setup(settings)
+    with arxiv.db.session_factory() as session:
+        try:
+            result = asyncio.run(
+                implementation.impl.process_upload(
+                    {"session": session}, job.submission_id
+                )
+            )
+        except BaseException:
+            session.rollback()
+            raise
+        session.commit()
+    return json.dumps(result)
+
+
+def build_preview_job(job: Job) -> str:
+    """Handler for `BUILD_PREVIEW` jobs, run in a job worker process. The build only
+    reads the store."""
+    try:
+        preview = asyncio.run(implementation.impl.build_preview({}, job.submission_id))
+    except HTTPException as ex:
+        raise JobFailed(ex.detail) from ex
+    return preview.model_dump_json()
+
+
+JOB_HANDLERS = {PROCESS_UPLOAD: process_upload_job, BUILD_PREVIEW: build_preview_job}
+
+
+def setup(config: BaseSettings) -> None:
+    """Create the pooled engine for this worker process.
+
+    This is done once per process, each request then only does a checkout from the pool.
+    Call `shutdown()` to dispose of the pool."""
+    global _engine, _engine_pid
+    if _engine is not None:
+        if _engine_pid == os.getpid():
+            return
+        # Inherited from the parent across a fork, the connections belong to the parent.
+        _engine.dispose(close=False)
+    _engine_pid = os.getpid()
+    _engine = create_engine(
+        settings.CLASSIC_DB_URI, **_engine_args(settings.CLASSIC_DB_URI)
+    )
+    arxiv.db.session_factory = sessionmaker(autoflush=False, bind=_engine)
+    configure_db_engine(_engine, None)
+
+
+def startup(config: BaseSettings) -> None:
+    """Start the job workers of `legacy_job_workers`."""
+    global _workers
+    jobs = config.submission_api_implementation.impl.jobs
+    if (
+        _workers is None
+        and jobs is not None
+        and legacy_specific_settings.legacy_job_workers > 0
+    ):
+        _workers = LocalWorkers(
+            jobs, JOB_HANDLERS, legacy_specific_settings.legacy_job_workers
+        )
+        _workers.start()
+
+
+def stop_workers() -> None:
+    """Stop the job workers started by `startup()`."""
+    global _workers
+    if _workers is not None:
+        _workers.stop()
+        _workers = None
+
+
+def shutdown(config: BaseSettings) -> None:
+    """Close all pooled connections of this worker process, stop its job workers and its
+    preview compiles."""
+    global _engine, _engine_pid
+    stop_workers()
+    implementation.impl.previews.shutdown()
+    if _engine is None:
+        return
+    _engine.dispose()
+    _engine = None
+    _engine_pid = None
 
 
 implementation = ImplementationConfig(
     impl=LegacySubmitImplementation(),
     depends_fn=legacy_depends,
     setup_fn=setup,
+    shutdown_fn=shutdown,
+    startup_fn=startup,
 )
-
@@ -0,0 +1,129 @@
+"""Listing of submissions, a page at a time, for ``GET /v1/submissions``.
+
+Submissions are listed most recently updated first and paged with a keyset on
+``(updated, submission_id)``. The cursor of the next page is the key of the last
+submission of a page, and the next page is the submissions before it. Each page is a
+range scan that starts where the last one ended, so a deep page costs the same as the
+first, where an OFFSET reads and throws away every row before it. A submission that is
+updated while it is being paged through moves to the front, it is not listed twice and
+later pages don't skip any.
+
+`LISTING_INDEXES` are the indexes the filters need, each ends with ``(updated,
+submission_id)`` so the rows come out of the index in the order of the page. They are
+part of the metadata of the submissions table, so ``create_all`` makes them,
+`create_listing_indexes` adds them to an existing database.
+"""
+
+import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Optional, Sequence, Tuple
+
+import orjson
+from arxiv.db.models import Submission
+from sqlalchemy import Engine, Index, Select, and_, or_, select
+from sqlalchemy.orm import load_only
+
+from submit_ce.fastapi.api.models.submission import SubmissionFilter
+
+LISTING_INDEXES = (
+    Index(
+        "ix_submission_listing_updated", Submission.updated, Submission.submission_id
+    ),
+    Index(
+        "ix_submission_listing_submitter",
+        Submission.submitter_id,
+        Submission.updated,
+        Submission.submission_id,
+    ),
+    Index(
+        "ix_submission_listing_stage",
+        Submission.stage,
+        Submission.updated,
+        Submission.submission_id,
+    ),
+)
+"""Indexes of the listing. Listings by type alone scan
+``ix_submission_listing_updated``, there are few types and most listings by type are
+also by submitter or stage."""
+
+Key = Tuple[datetime.datetime, int]
+"""Where a submission is in the listing, its ``(updated, submission_id)``."""
+
+
+def create_listing_indexes(engine: Engine) -> None:
+    """Create the `LISTING_INDEXES` that the database doesn't have yet."""
+    for index in LISTING_INDEXES:
+        index.create(engine, checkfirst=True)
+
+
+def encode_cursor(key: Key) -> str:
+    return (
+        urlsafe_b64encode(orjson.dumps([key[0].isoformat(), key[1]]))
+        .decode()
+        .rstrip("=")
+    )
+
+
+def decode_cursor(cursor: str) -> Key:
+    """The key of the submission a cursor from `encode_cursor` is after.
+
+    Raises
+    ------
+    ValueError
+        If it is not a cursor."""
+    try:
+        updated, submission_id = orjson.loads(
+            urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+        return datetime.datetime.fromisoformat(updated), int(submission_id)
+    except (TypeError, ValueError, orjson.JSONDecodeError) as ex:
+        raise ValueError(f"{cursor} is not a cursor of the listing") from ex
+
+
+def utc_naive(value: datetime.datetime) -> datetime.datetime:
+    """`value` as the naive UTC the legacy tables hold."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def select_submissions(
+    filters: SubmissionFilter,
+    after: Optional[Key] = None,
+    limit: int = 100,
+    columns: Optional[Sequence[str]] = None,
+) -> Select:
+    """Select the `limit` submissions that match `filters` and come after `after`,
+    loading only `columns` if given.
+
+    Submissions without an updated time are not listed, they have no place in the
+    order."""
+    stmt = select(Submission).where(Submission.updated.is_not(None))
+    if filters.submitter_id is not None:
+        stmt = stmt.where(Submission.submitter_id == filters.submitter_id)
+    if filters.stage is not None:
+        stmt = stmt.where(Submission.stage == filters.stage)
+    if filters.type is not None:
+        stmt = stmt.where(Submission.type == filters.type)
+    if filters.updated_since is not None:
+        stmt = stmt.where(Submission.updated >= utc_naive(filters.updated_since))
+    if after is not None:
+        # Spelled out rather than as a row value comparison, which not every MySQL uses
+        # an index for.
+        updated, submission_id = after
+        stmt = stmt.where(
+            or_(
+                Submission.updated < updated,
+                and_(
+                    Submission.updated == updated,
+                    Submission.submission_id < submission_id,
+                ),
+            )
+        )
+    if columns is not None:
+        stmt = stmt.options(
+            load_only(*[getattr(Submission, column) for column in columns])
+        )
+    return stmt.order_by(
+        Submission.updated.desc(), Submission.submission_id.desc()
+    ).limit(limit)
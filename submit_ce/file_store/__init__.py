@@ -1,21 +1,84 @@
 import os
 from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass
 from pathlib import Path
-from typing import IO
+from typing import IO, Optional, AsyncIterator, Callable
+
+
+class SecurityError(RuntimeError):
+    """Something suspicious happened."""
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    """A file in a store that can be sent to a client."""
+
+    path: Optional[Path]
+    """Where the file is on disk, `None` for a store that is not on a local disk."""
+
+    size: int
+    """Size of the file in bytes."""
+
+    checksum: str
+    """Checksum of the file in the primary algorithm of the store, changes whenever the
+    content changes."""
+
+    read_range: Optional[Callable[[int, int], AsyncIterator[bytes]]] = None
+    """Streams the bytes from a first to a last byte, inclusive, when there is no
+    `path`."""
+
+    name: Optional[str] = None
+    """File name to send the file as, the name of `path` by default."""
+
+    def __post_init__(self):
+        if self.name is None and self.path is not None:
+            object.__setattr__(self, "name", self.path.name)
 
 
 class SubmissionFileStore(metaclass=ABCMeta):
 
     @abstractmethod
-    def get_source_file(self, submission_id: str, path: Path) :
+    async def get_source_file(
+        self, submission_id: str, path: str
+    ) -> Optional[StoredFile]:
         """Retrieve a file from the filesystem.
 
         path should be one of:
          - a pathless file: main.tex
          - a file inside src: figures/fig1.jpg
-         """
+
+        Returns `None` if there is no such file.
+        """
         ...
 
+    @abstractmethod
+    async def list_source_files(self, submission_id: str):
+        """The `ManifestEntry` of each file of the source of a submission sorted by
+        name, `None` if no source has been deposited. This does not read the files or
+        walk the source."""
+        ...
+
+    @abstractmethod
+    async def get_source_package(self, submission_id: str) -> Optional[StoredFile]:
+        """Retrieve the source package of a submission, `None` if no source has been
+        deposited."""
+        ...
+
+    @abstractmethod
+    async def store_source_file(
+        self, submission_id: str, path: str, content: AsyncIterator[bytes]
+    ):
+        """Add or replace a single file in the source of a submission.
+
+        Returns the manifest entry of the file."""
+        pass
+
+    @abstractmethod
+    async def delete_source_file(self, submission_id: str, path: str) -> bool:
+        """Remove a single file from the source of a submission.
+
+        Returns whether there was such a file."""
+        pass
 
     @abstractmethod
     def store_source_package(self, submission_id: str, content, chunk_size) -> str:
@@ -25,37 +88,131 @@ class SubmissionFileStore(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def get_source_pacakge_checksum(self, submission_id: str) -> str:
-        """Get the checksum of the source package for a submission."""
+    async def create_upload(
+        self, submission_id: str, length: int, filename: Optional[str] = None
+    ):
+        """Start a resumable upload of a source package, see
+        `submit_ce.file_store.upload`.
+
+        Returns the `UploadState`."""
         pass
 
     @abstractmethod
-    def does_source_exist(self, submission_id: str) -> bool:
-        """Determine whether source has been deposited for a submission."""
+    async def get_upload(self, submission_id: str):
+        """The `UploadState` of the upload in progress, `None` if there is none."""
+        pass
+
+    @abstractmethod
+    async def append_upload(
+        self,
+        submission_id: str,
+        offset: int,
+        content: AsyncIterator[bytes],
+        checksum=None,
+    ):
+        """Append a chunk at `offset` to the upload in progress.
+
+        Returns the `UploadState`."""
         pass
 
+    @abstractmethod
+    async def finish_upload(self, submission_id: str) -> str:
+        """Store the completed upload as the source package.
+
+        Returns checksum"""
+        pass
+
+    @abstractmethod
+    async def delete_upload(self, submission_id: str) -> bool:
+        """Discard the upload in progress, returns whether there was one."""
+        pass
 
+    @abstractmethod
+    async def stage_source_package(self, submission_id: str, content, chunk_size=None):
+        """Write and unpack a source package without making it the live source.
+
+        Returns a staged package for `publish_staged` or `discard_staged`."""
+        pass
 
     @abstractmethod
-    def store_preview(self, submission_id: str, content: IO[bytes]) -> str:
+    async def stage_upload(self, submission_id: str):
+        """Unpack the completed resumable upload without making it the live source, see
+        `stage_source_package`."""
+        pass
+
+    @abstractmethod
+    async def publish_staged(self, staged) -> str:
+        """Make a staged package the live source. This must be quick, it may be done
+        while holding a lock.
+
+        Returns checksum"""
+        pass
+
+    @abstractmethod
+    def discard_staged(self, staged) -> None:
+        """Drop a staged package without publishing it."""
+        pass
+
+    @abstractmethod
+    def lease_file(self, submission_id: str):
+        """The `submit_ce.file_store.lease.LeaseFile` of the submission."""
+        pass
+
+    @abstractmethod
+    def get_source_pacakge_checksum(
+        self, submission_id: str, algorithm: Optional[str] = None
+    ) -> str:
+        """Get the checksum of the source package for a submission.
+
+        `algorithm` is one of `submit_ce.file_store.checksum.ALGORITHMS`, if `None` the
+        store's primary algorithm is used."""
+        pass
+
+    @abstractmethod
+    def does_source_exist(self, submission_id: str) -> bool:
+        """Determine whether source has been deposited for a submission."""
+        pass
+
+    @abstractmethod
+    def store_preview(
+        self,
+        submission_id: str,
+        content: IO[bytes],
+        chunk_size: Optional[int] = None,
+        source_checksum: Optional[str] = None,
+    ) -> str:
         """Store a preview PDF for a submission.
 
+        `source_checksum` is the checksum of the source the preview was made from, see
+        `get_preview_source_checksum`.
+
         Returns checksum"""
         pass
 
     @abstractmethod
-    def get_preview(self, submission_id: str, path: Path):
-        """Retrieve a file from the filesystem.
+    def get_preview_source_checksum(self, submission_id: str) -> Optional[str]:
+        """Checksum of the source the preview was made from, `None` if there is no
+        preview or it is not known."""
+        pass
 
-        path should be one of:
-         - a pathless file: main.tex
-         - a file inside src: figures/fig1.jpg
-         """
+    @abstractmethod
+    async def delete_preview(self, submission_id: str) -> bool:
+        """Delete the preview PDF of a submission, returns whether there was one."""
         ...
 
     @abstractmethod
-    def get_preview_checksum(self, submission_id: str) -> str:
-        """Get the checksum of the preview PDF for a submission."""
+    async def get_preview(self, submission_id: str) -> Optional[StoredFile]:
+        """Retrieve the preview PDF of a submission, `None` if there is no preview."""
+        ...
+
+    @abstractmethod
+    def get_preview_checksum(
+        self, submission_id: str, algorithm: Optional[str] = None
+    ) -> str:
+        """Get the checksum of the preview PDF for a submission.
+
+        `algorithm` is one of `submit_ce.file_store.checksum.ALGORITHMS`, if `None` the
+        store's primary algorithm is used."""
         pass
 
     @abstractmethod
@@ -90,14 +247,6 @@ class SubmissionFileStore(metaclass=ABCMeta):
     #     pass
     #
     # @abstractmethod
-    # def _get_checksum(self, path) -> str:
-    #     pass
-    #
-    # @abstractmethod
-    # def _unpack_tarfile(self, tar_path, unpack_to) -> None:
-    #     pass
-    #
-    # @abstractmethod
     # def _chmod_recurse(self, parent, dir_mode, file_mode, uid, gid) -> None:
     #     """
     #     Recursively chmod and chown all directories and files.
@@ -0,0 +1,88 @@
+"""Atomic publishing of staged files and directories.
+
+Writes are done in a staging directory on the same filesystem as the live files and then
+renamed into place, so a reader sees either the old or the new files and a crash leaves
+at worst a staging directory to clean up.
+
+A directory can't be replaced by rename(2) if the target is not empty. On Linux
+``renameat2`` with ``RENAME_EXCHANGE`` swaps the staged and live directories in one
+step. Elsewhere the live directory is first moved aside, which leaves a short window
+where it is missing.
+"""
+
+import ctypes
+import errno
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+STAGING_PREFIX = ".staging-"
+"""Prefix of staging directories, these are never read from."""
+
+_AT_FDCWD = -100
+_RENAME_EXCHANGE = 2
+_renameat2 = None
+
+
+def _load_renameat2():
+    global _renameat2
+    if _renameat2 is None:
+        try:
+            _renameat2 = getattr(ctypes.CDLL(None, use_errno=True), "renameat2")
+            _renameat2.argtypes = [
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_uint,
+            ]
+        except (OSError, AttributeError):
+            _renameat2 = False
+    return _renameat2
+
+
+def exchange_paths(a: Path, b: Path) -> bool:
+    """Atomically swap the paths `a` and `b`, both of which must exist.
+
+    Returns `False` without changing anything if the platform or filesystem can't do
+    it."""
+    renameat2 = _load_renameat2()
+    if not renameat2:
+        return False
+    if (
+        renameat2(
+            _AT_FDCWD, os.fsencode(a), _AT_FDCWD, os.fsencode(b), _RENAME_EXCHANGE
+        )
+        == 0
+    ):
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.EINVAL, errno.ENOSYS, errno.ENOTSUP):
+        return False
+    raise OSError(err, os.strerror(err), str(a))
+
+
+def publish_dir(staged: Path, live: Path) -> Optional[Path]:
+    """Make the directory `staged` the directory `live`.
+
+    Returns where the previous `live` directory is now, to be removed by the caller, or
+    `None` if there was none."""
+    if not os.path.lexists(live):
+        os.rename(staged, live)
+        return None
+    if exchange_paths(staged, live):
+        return staged
+    old = live.with_name(f"{STAGING_PREFIX}{uuid.uuid4().hex}")
+    os.rename(live, old)
+    os.rename(staged, live)
+    return old
+
+
+def fsync_dir(path: Path) -> None:
+    """Flush the entries of the directory `path`, so renames into it survive a crash."""
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,98 @@
+"""Checksum algorithms for the file stores.
+
+Several digests can be computed in one pass over the data with `MultiHasher`. The first
+algorithm of a store is its primary one, that is the checksum returned from the store
+methods.
+
+The legacy ``md5`` checksum is the base64url encoded digest, as it has always been for
+the legacy system. Other algorithms are formatted as ``{name}:{hex digest}`` so they
+can't be mistaken for a legacy checksum.
+"""
+
+import hashlib
+from base64 import urlsafe_b64encode
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Sequence
+
+DEFAULT_READ_SIZE = 1024 * 1024
+"""Size of reads when hashing a file.
+
+Large reads keep the per call overhead low, hashlib releases the GIL for updates larger
+than 2 KB."""
+
+
+@dataclass(frozen=True)
+class ChecksumAlgorithm:
+    name: str
+    new: Callable[[], "hashlib._Hash"]
+    """Makes a new hash object."""
+    encode: Callable[[bytes], str]
+    """Formats a digest as a checksum string."""
+
+
+def _legacy_encode(digest: bytes) -> str:
+    return urlsafe_b64encode(digest).decode("utf-8")
+
+
+def _prefixed_hex(name: str) -> Callable[[bytes], str]:
+    return lambda digest: f"{name}:{digest.hex()}"
+
+
+ALGORITHMS: Dict[str, ChecksumAlgorithm] = {
+    "md5": ChecksumAlgorithm("md5", hashlib.md5, _legacy_encode),
+    "sha256": ChecksumAlgorithm("sha256", hashlib.sha256, _prefixed_hex("sha256")),
+    "blake2b": ChecksumAlgorithm("blake2b", hashlib.blake2b, _prefixed_hex("blake2b")),
+}
+"""Supported algorithms by name."""
+
+
+def validate_algorithms(names: Iterable[str]) -> Sequence[str]:
+    """Check that `names` is a non-empty list of supported algorithms."""
+    names = tuple(names)
+    if not names:
+        raise ValueError("At least one checksum algorithm is required")
+    unknown = [name for name in names if name not in ALGORITHMS]
+    if unknown:
+        raise ValueError(
+            f"Unsupported checksum algorithms {unknown}, must be some of "
+            f"{list(ALGORITHMS)}"
+        )
+    return names
+
+
+class MultiHasher:
+    """Computes the checksums of several algorithms in one pass over the data."""
+
+    def __init__(self, algorithms: Iterable[str] = ("md5",)):
+        self.algorithms = validate_algorithms(algorithms)
+        self._hashes = [
+            (ALGORITHMS[name], ALGORITHMS[name].new()) for name in self.algorithms
+        ]
+
+    def update(self, data: bytes) -> None:
+        for _, hash_ in self._hashes:
+            hash_.update(data)
+
+    def checksums(self) -> Dict[str, str]:
+        """Checksums by algorithm name."""
+        return {
+            algorithm.name: algorithm.encode(hash_.digest())
+            for algorithm, hash_ in self._hashes
+        }
+
+    @property
+    def checksum(self) -> str:
+        """Checksum of the primary algorithm."""
+        algorithm, hash_ = self._hashes[0]
+        return algorithm.encode(hash_.digest())
+
+
+def checksum_file(
+    path, algorithms: Iterable[str] = ("md5",), read_size: int = DEFAULT_READ_SIZE
+) -> Dict[str, str]:
+    """Checksums of the file at `path` by algorithm name."""
+    hasher = MultiHasher(algorithms)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(read_size), b""):
+            hasher.update(chunk)
+    return hasher.checksums()
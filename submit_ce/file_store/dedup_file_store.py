@@ -0,0 +1,184 @@
+"""Legacy file store that keeps one copy of each distinct file content.
+
+Replacements mostly re-upload the figures, style files and bibliographies of the
+previous version. With `DedupFileStore` each extracted file is hashed with sha256 in the
+same pass that writes it, and the file in the ``src`` directory is then made a hard link
+to a blob named by that hash. Every submission that has the same content shares one
+inode, so the ``src`` directories keep the layout the legacy system reads while the
+content is on disk once. A file that is written and at once replaced by a link to an
+existing blob is normally dropped from the page cache before it is written back, so its
+write IO is mostly avoided too.
+
+The link count of a blob is its reference count: one for the blob itself and one for
+each ``src`` file, staged or live, that uses it. It is kept by the filesystem, so it
+stays right when the legacy system or `shutil.rmtree` removes source directories without
+going through the store. `DedupFileStore.collect_garbage` removes the blobs with no
+other links.
+
+Hard links are used rather than reflinks since a reflink is a separate inode with no
+count of its sharers, and not all filesystems the legacy volume has been on support
+them. Sharing an inode has two consequences:
+
+- A file has the mode, owner and times of its blob, so its mtime is that of the first
+  upload of the content, not the one in the package. The manifest records the mtime the
+  file has on disk.
+- A file written in place would change the file of every submission that shares it. The
+  store only ever replaces files, see `PackageExtractor.write_file`, and the files are
+  stored without write permission, so a tool that opens one for writing fails rather
+  than changing other submissions. Replacing or removing a file needs only the
+  permissions of its directory.
+"""
+
+import dataclasses
+import errno
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Callable, Tuple
+
+from submit_ce.file_store.extract import PackageExtractor, ExtractionLimits, FileModes
+from submit_ce.file_store.legacy_file_store import LegacyFileStore
+from submit_ce.file_store.manifest import ManifestEntry
+
+logger = logging.getLogger(__name__)
+
+BLOB_ALGORITHM = "sha256"
+"""Hash that names the blobs. md5, the legacy checksum, is not used as collisions can be
+made on purpose."""
+
+_NO_LINK_ERRORS = (errno.EXDEV, errno.EMLINK, errno.EPERM, errno.ENOTSUP)
+"""Errors from link(2) that mean the file is kept as it is, not deduplicated."""
+
+
+class DedupFileStore(LegacyFileStore):
+    """`LegacyFileStore` with the files of the ``src`` directories as hard links to
+    shared content blobs.
+
+    The blobs are in `blob_dir`, which must be on the same filesystem as `root_dir`, at
+    ``{blob_dir}/{first 2 hex digits}/{sha256 hex}``. See
+    `submit_ce.file_store.dedup_file_store`."""
+
+    def __init__(self, root_dir: Path, blob_dir: Optional[Path] = None, **kwargs):
+        super().__init__(root_dir, **kwargs)
+        self.blob_dir = (
+            Path(blob_dir) if blob_dir is not None else Path(root_dir) / "blobs"
+        )
+        """Directory of the content blobs. The default is next to the shard directories,
+        which are all digits."""
+
+    def blob_path(self, digest: str) -> Path:
+        """Path of the blob with the sha256 hex `digest`."""
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Not a sha256 hex digest: {digest!r}")
+        return self.blob_dir / digest[:2] / digest
+
+    def blob_references(self, digest: str) -> int:
+        """Number of source files that share the blob with `digest`, 0 if there is no
+        such blob."""
+        try:
+            return os.stat(self.blob_path(digest)).st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def collect_garbage(self, min_age: float = 60 * 60) -> Tuple[int, int]:
+        """Remove blobs no source file links to any more. Returns the number of blobs
+        and bytes freed.
+
+        Blobs changed in the last `min_age` seconds are kept. A blob is only ever linked
+        to from a file that has just been written, and if it is removed in between
+        `_link_blob` stores that file as a new blob, so this is safe to run while
+        uploads are in progress."""
+        cutoff = time.time() - min_age
+        blobs = freed = 0
+        if not os.path.isdir(self.blob_dir):
+            return blobs, freed
+        with os.scandir(self.blob_dir) as prefixes:
+            for prefix in prefixes:
+                if not prefix.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(prefix.path) as entries:
+                    for entry in entries:
+                        stat = entry.stat(follow_symlinks=False)
+                        if stat.st_nlink == 1 and stat.st_ctime < cutoff:
+                            try:
+                                os.unlink(entry.path)
+                            except FileNotFoundError:
+                                continue
+                            blobs += 1
+                            freed += stat.st_size
+        logger.info("Removed %d unreferenced blobs, %d bytes", blobs, freed)
+        return blobs, freed
+
+    def _file_modes(self) -> FileModes:
+        """The modes of `LegacyFileStore` without write permission on files, as they may
+        be shared."""
+        modes = super()._file_modes()
+        return dataclasses.replace(modes, file_mode=modes.file_mode & ~0o222)
+
+    def _new_extractor(
+        self,
+        dest: Path,
+        limits: ExtractionLimits,
+        read_size: int,
+        on_file: Optional[Callable[[Path, ManifestEntry], None]] = None,
+    ) -> PackageExtractor:
+        return PackageExtractor(
+            dest,
+            self._file_modes(),
+            limits,
+            self.checksum_algorithms[0],
+            read_size,
+            on_file=on_file,
+            on_content=self._link_blob,
+            content_algorithm=BLOB_ALGORITHM,
+        )
+
+    def _link_blob(self, path: Path, checksum: str) -> None:
+        """Make the just written file at `path` a link to the blob of its content,
+        adding the blob if it is new."""
+        blob = self.blob_path(checksum.removeprefix(f"{BLOB_ALGORITHM}:"))
+        try:
+            for _ in range(3):
+                try:
+                    self._replace_with_link(blob, path)
+                    return
+                except FileNotFoundError:
+                    pass
+                os.makedirs(blob.parent, exist_ok=True)
+                try:
+                    os.link(path, blob)
+                    return
+                except FileExistsError:
+                    pass
+            logger.warning(
+                "Could not link %s to blob %s, it changed too often", path, blob
+            )
+        except OSError as ex:
+            if ex.errno not in _NO_LINK_ERRORS:
+                raise
+            logger.warning(
+                "Keeping %s as it is, it could not be linked to blob %s: %s",
+                path,
+                blob,
+                ex,
+            )
+
+    @staticmethod
+    def _replace_with_link(blob: Path, path: Path) -> None:
+        """Replace `path` with a hard link to `blob`.
+
+        Raises
+        ------
+        FileNotFoundError
+            If there is no `blob`."""
+        if os.path.getsize(blob) != os.path.getsize(path):
+            raise OSError(
+                errno.EPERM,
+                "Blob has a different size than the file, it is corrupt",
+                str(blob),
+            )
+        tmp_path = path.with_name(f".{uuid.uuid4().hex}.tmp")
+        os.link(blob, tmp_path)
+        os.replace(tmp_path, path)
@@ -0,0 +1,643 @@
+"""In-process streaming extraction of source packages.
+
+The package is read once, straight from the upload. As it is read it can be copied to
+the stored package and hashed with `TeeReader`, while `PackageExtractor` writes the
+members into the source directory. Each member is checked for path traversal and against
+the `ExtractionLimits` as it is reached, hashed for the manifest while it is written,
+and gets its mode and owner set on the open file so no walk of the tree is needed
+afterwards.
+
+The format of the package is detected from its first bytes, see `detect_package_format`.
+Tar files, plain or compressed with gzip, bzip2 or xz, are read with `tarfile` in stream
+mode. Zip files are read member by member from their local headers, so they do not need
+to be seekable. Anything else is a single file.
+"""
+
+import asyncio
+import logging
+import os
+import posixpath
+import struct
+import tarfile
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, List, Optional, Set, Callable, AsyncIterator
+
+from submit_ce.file_store import SecurityError
+from submit_ce.file_store.checksum import MultiHasher, DEFAULT_READ_SIZE
+from submit_ce.file_store.manifest import ManifestEntry, HEAD_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+TAR_GZ = "tar.gz"
+TAR_BZ2 = "tar.bz2"
+TAR_XZ = "tar.xz"
+TAR = "tar"
+ZIP = "zip"
+SINGLE_FILE = "file"
+
+TAR_FORMATS = (TAR_GZ, TAR_BZ2, TAR_XZ, TAR)
+
+ARCHIVE_SUFFIXES = (
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+    ".tar",
+    ".zip",
+)
+"""File names a single file is not allowed to have, it would be an archive that is not
+valid."""
+
+DETECT_SIZE = 512
+"""Bytes needed by `detect_package_format`."""
+
+
+class ExtractionError(ValueError):
+    """The package is not valid or is over the limits, it could not be extracted."""
+
+
+@dataclass(frozen=True)
+class ExtractionLimits:
+    max_members: int = 25_000
+    """Maximum number of files and directories in a package."""
+
+    max_total_size: int = 4 * 1024**3
+    """Maximum total size in bytes of the unpacked files."""
+
+
+@dataclass(frozen=True)
+class FileModes:
+    """Permissions and owner for extracted files and directories."""
+
+    file_mode: int
+    dir_mode: int
+    uid: int
+    gid: int
+
+
+def detect_package_format(head: bytes) -> str:
+    """Format of a package from its first `DETECT_SIZE` bytes."""
+    if head.startswith(b"\x1f\x8b"):
+        return TAR_GZ
+    if head.startswith(b"BZh"):
+        return TAR_BZ2
+    if head.startswith(b"\xfd7zXZ\x00"):
+        return TAR_XZ
+    if head.startswith(b"PK\x03\x04") or head.startswith(b"PK\x05\x06"):
+        return ZIP
+    if head[257:262] == b"ustar":
+        return TAR
+    return SINGLE_FILE
+
+
+class PushbackReader:
+    """Reader that can return data to the front of `source`, for peeking and for data
+    read past the end of a member."""
+
+    def __init__(self, source: IO[bytes]):
+        self.source = source
+        self._buffer = b""
+        self._position = 0
+        """Start of the unread data in `_buffer`, so small reads don't copy the rest of
+        a large buffer."""
+
+    def read(self, size: int = -1) -> bytes:
+        if self._position < len(self._buffer):
+            if size is None or size < 0:
+                data = self._buffer[self._position :] + self.source.read()
+                self._position = len(self._buffer)
+            else:
+                data = self._buffer[self._position : self._position + size]
+                self._position += len(data)
+            return data
+        return self.source.read(size)
+
+    def read_exact(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.read(size - len(data))
+            if not chunk:
+                raise ExtractionError("Package is truncated")
+            data += chunk
+        return data
+
+    def unread(self, data: bytes) -> None:
+        self._buffer = data + self._buffer[self._position :]
+        self._position = 0
+
+    def peek(self, size: int) -> bytes:
+        """Up to `size` bytes from the front of `source` without consuming them."""
+        data = b""
+        while len(data) < size:
+            chunk = self.read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        self.unread(data)
+        return data
+
+
+class AsyncIteratorReader:
+    """Blocking reader for a worker thread that pulls chunks from an async iterator
+    running on `loop`.
+
+    The worker waits for each chunk while the event loop stays free, so a request body
+    can be streamed into code that needs a file-like object without buffering it."""
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self._buffer = b""
+        self._eof = False
+
+    def _next_chunk(self) -> bytes:
+        try:
+            return asyncio.run_coroutine_threadsafe(
+                self._chunks.__anext__(), self._loop
+            ).result()
+        except StopAsyncIteration:
+            self._eof = True
+            return b""
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._buffer and not self._eof:
+            self._buffer = self._next_chunk()
+        if size is None or size < 0:
+            data = self._buffer
+            while not self._eof:
+                data += self._next_chunk()
+            self._buffer = b""
+            return data
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class TeeReader:
+    """Reader that writes everything read from `source` to `sink` and hashes it."""
+
+    def __init__(
+        self,
+        source: IO[bytes],
+        sink: Optional[IO[bytes]],
+        hasher: Optional[MultiHasher],
+    ):
+        self.source = source
+        self.sink = sink
+        self.hasher = hasher
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.source.read(size)
+        if data:
+            if self.sink is not None:
+                self.sink.write(data)
+            if self.hasher is not None:
+                self.hasher.update(data)
+            self.bytes_read += len(data)
+        return data
+
+    def drain(self, read_size: int = DEFAULT_READ_SIZE) -> None:
+        """Read the rest of `source`.
+
+        A tar reader stops at the end-of-archive marker, there may be padding after it
+        that still belongs in `sink` and the checksum."""
+        while self.read(read_size):
+            pass
+
+
+class TeeWriter:
+    """Writer that hashes everything written to `sink`."""
+
+    def __init__(self, sink: IO[bytes], hasher: MultiHasher):
+        self.sink = sink
+        self.hasher = hasher
+
+    def write(self, data: bytes) -> int:
+        self.hasher.update(data)
+        return self.sink.write(data)
+
+    def flush(self) -> None:
+        self.sink.flush()
+
+
+def safe_member_path(name: str) -> str:
+    """Normalized path for the package member `name`, relative to the source directory.
+
+    Leading slashes are removed, as tar does. Returns an empty string for the source
+    directory itself.
+
+    Raises
+    ------
+    SecurityError
+        If `name` would be outside of the source directory.
+    """
+    if "\x00" in name:
+        raise SecurityError(f"Package member name contains a NUL: {name!r}")
+    normalized = posixpath.normpath(name.lstrip("/"))
+    if normalized == ".." or normalized.startswith("../"):
+        raise SecurityError(
+            f"Package member is outside of the source directory: {name!r}"
+        )
+    return "" if normalized == "." else normalized
+
+
+class PackageExtractor:
+    """Writes the members of a package into `dest` and records the manifest.
+
+    `on_file` is called with the path and manifest entry of each file once it is
+    written.
+
+    `on_content` is called with the path of each file and its checksum in
+    `content_algorithm`, computed in the same pass, before `on_file`. It may replace the
+    file with a link to the same content, see `submit_ce.file_store.dedup_file_store`.
+    The manifest then has the mtime of the file it was replaced with."""
+
+    def __init__(
+        self,
+        dest: Path,
+        modes: FileModes,
+        limits: ExtractionLimits = ExtractionLimits(),
+        checksum_algorithm: str = "md5",
+        read_size: int = DEFAULT_READ_SIZE,
+        on_file: Optional[Callable[[Path, ManifestEntry], None]] = None,
+        on_content: Optional[Callable[[Path, str], None]] = None,
+        content_algorithm: str = "sha256",
+    ):
+        self.dest = Path(dest)
+        self.modes = modes
+        self.limits = limits
+        self.checksum_algorithm = checksum_algorithm
+        self.read_size = read_size
+        self.on_file = on_file
+        self.on_content = on_content
+        self.content_algorithm = content_algorithm
+        self.manifest: List[ManifestEntry] = []
+        """Files written so far."""
+        self.member_count = 0
+        self.total_size = 0
+        """Total size of the files written so far."""
+        self._dirs: Set[str] = set()
+        """Directories known to exist with the right modes."""
+        self._owned = (modes.uid, modes.gid) == (os.geteuid(), os.getegid())
+        """Whether new files and directories get the owner of `modes` when they are
+        created, so need no chown. They get the group of their directory if it is
+        setgid, which is that of `modes` once `make_dir` has set it."""
+
+    def extract(
+        self, fileobj: IO[bytes], package_format: str, filename: Optional[str] = None
+    ) -> List[ManifestEntry]:
+        """Extract a package of `package_format` read from `fileobj` in a single forward
+        pass.
+
+        `filename` is the name for a `SINGLE_FILE` package."""
+        if package_format in TAR_FORMATS:
+            return self.extract_tar(fileobj)
+        elif package_format == ZIP:
+            return self.extract_zip(fileobj)
+        else:
+            return self.extract_single_file(fileobj, filename)
+
+    def extract_tar(self, fileobj: IO[bytes]) -> List[ManifestEntry]:
+        """Extract a plain or compressed tar read from `fileobj` in a single forward
+        pass."""
+        self.make_dir("")
+        try:
+            with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+                for member in tar:
+                    self._count_member()
+                    name = safe_member_path(member.name)
+                    if not name:
+                        continue
+                    if member.isdir():
+                        self.make_dir(name)
+                    elif member.isreg():
+                        self.write_file(name, tar.extractfile(member), member.mtime)
+                    else:
+                        logger.info(
+                            "Skipping package member %s that is not a file or "
+                            "directory",
+                            member.name,
+                        )
+        except tarfile.TarError as ex:
+            raise ExtractionError(f"Package is not a valid tar file: {ex}") from ex
+        return self.manifest
+
+    def extract_zip(self, fileobj: IO[bytes]) -> List[ManifestEntry]:
+        """Extract a zip file read from `fileobj` in a single forward pass.
+
+        The members are read from their local headers, the central directory at the end
+        is not needed. Members compressed with deflate, or stored with their sizes in
+        the local header, are supported. That is what zip tools write unless writing to
+        a pipe."""
+        self.make_dir("")
+        stream = (
+            fileobj if isinstance(fileobj, PushbackReader) else PushbackReader(fileobj)
+        )
+        while True:
+            signature = stream.read_exact(4)
+            if signature in (_ZIP_CENTRAL_DIRECTORY, _ZIP_END_OF_CENTRAL_DIRECTORY):
+                break
+            if signature != _ZIP_LOCAL_HEADER:
+                raise ExtractionError("Package is not a valid zip file")
+            self._count_member()
+            header = _ZipLocalHeader.read(stream)
+            name = safe_member_path(header.name)
+            reader = _ZipMemberReader(stream, header, self.read_size)
+            if name and not header.name.endswith("/"):
+                self.write_file(name, reader, header.mtime)
+            elif name:
+                self.make_dir(name)
+            reader.finish()
+        return self.manifest
+
+    def extract_single_file(
+        self, fileobj: IO[bytes], filename: Optional[str]
+    ) -> List[ManifestEntry]:
+        """Write `fileobj` as a single file named after the last part of `filename`."""
+        self.make_dir("")
+        name = safe_member_path(posixpath.basename((filename or "").replace("\\", "/")))
+        if not name:
+            raise ExtractionError(
+                "A file name is needed for an upload of a single file"
+            )
+        if name.lower().endswith(ARCHIVE_SUFFIXES):
+            raise ExtractionError(f"{name} is not a valid tar or zip file")
+        self._count_member()
+        self.write_file(name, fileobj)
+        return self.manifest
+
+    def write_file(
+        self,
+        name: str,
+        reader: IO[bytes],
+        mtime: Optional[float] = None,
+        write_as: Optional[str] = None,
+    ) -> ManifestEntry:
+        """Write the file `name` from `reader`, hashing it, detecting its type and
+        setting its mode and owner on the open file.
+
+        The file is written to `write_as` if given, for a file the caller renames to
+        `name` once it is complete. An existing file is unlinked rather than truncated,
+        so a file hard linked from a published tree is left as it was."""
+        path = self.dest / (write_as or name)
+        self.make_dir(posixpath.dirname(write_as or name))
+        algorithms = [self.checksum_algorithm]
+        if (
+            self.on_content is not None
+            and self.content_algorithm != self.checksum_algorithm
+        ):
+            algorithms.append(self.content_algorithm)
+        hasher = MultiHasher(algorithms)
+        size = 0
+        head = b""
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except IsADirectoryError as ex:
+            raise SecurityError(
+                f"Package member file {name!r} exists and is a directory"
+            ) from ex
+        fd = os.open(
+            path,
+            os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW | os.O_CLOEXEC,
+            0o600,
+        )
+        with open(fd, "wb") as f:
+            for chunk in iter(lambda: reader.read(self.read_size), b""):
+                size += len(chunk)
+                self._add_size(len(chunk))
+                hasher.update(chunk)
+                if len(head) < HEAD_SIZE:
+                    head += chunk[: HEAD_SIZE - len(head)]
+                f.write(chunk)
+            f.flush()
+            if not self._owned:
+                os.fchown(fd, self.modes.uid, self.modes.gid)
+            os.fchmod(fd, self.modes.file_mode)
+            if mtime is not None:
+                os.utime(fd, (mtime, mtime))
+            else:
+                mtime = os.fstat(fd).st_mtime
+        if self.on_content is not None:
+            self.on_content(path, hasher.checksums()[self.content_algorithm])
+            mtime = os.stat(path).st_mtime
+        entry = ManifestEntry.from_head(name, size, hasher.checksum, mtime, head)
+        self.manifest.append(entry)
+        if self.on_file is not None:
+            self.on_file(path, entry)
+        return entry
+
+    def make_dir(self, name: str) -> None:
+        """Make directory `name` and its parents with the directory mode and owner."""
+        if name in self._dirs:
+            return
+        if name:
+            self.make_dir(posixpath.dirname(name))
+        path = self.dest / name
+        created = True
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            if os.path.islink(path) or not os.path.isdir(path):
+                raise SecurityError(
+                    f"Package member directory {name!r} exists and is not a directory"
+                )
+            created = False
+        if not (created and self._owned):
+            os.chown(path, self.modes.uid, self.modes.gid)
+        os.chmod(path, self.modes.dir_mode)
+        self._dirs.add(name)
+
+    def _count_member(self) -> None:
+        self.member_count += 1
+        if self.member_count > self.limits.max_members:
+            raise ExtractionError(
+                f"Package has more than {self.limits.max_members} files and directories"
+            )
+
+    def _add_size(self, size: int) -> None:
+        self.total_size += size
+        if self.total_size > self.limits.max_total_size:
+            raise ExtractionError(
+                f"Package is larger than {self.limits.max_total_size} bytes unpacked"
+            )
+
+
+_ZIP_LOCAL_HEADER = b"PK\x03\x04"
+_ZIP_CENTRAL_DIRECTORY = b"PK\x01\x02"
+_ZIP_END_OF_CENTRAL_DIRECTORY = b"PK\x05\x06"
+_ZIP_DATA_DESCRIPTOR = b"PK\x07\x08"
+_ZIP_STORED = 0
+_ZIP_DEFLATED = 8
+_ZIP_ENCRYPTED = 0x1
+_ZIP_HAS_DATA_DESCRIPTOR = 0x8
+_ZIP_UTF8_NAME = 0x800
+_ZIP64_EXTRA = 0x0001
+
+
+@dataclass
+class _ZipLocalHeader:
+    name: str
+    flags: int
+    method: int
+    crc: int
+    compressed_size: Optional[int]
+    """`None` if the size is only in the data descriptor after the data."""
+    mtime: float
+    zip64: bool
+
+    @classmethod
+    def read(cls, stream: PushbackReader) -> "_ZipLocalHeader":
+        (
+            _version,
+            flags,
+            method,
+            dos_time,
+            dos_date,
+            crc,
+            compressed_size,
+            size,
+            name_length,
+            extra_length,
+        ) = struct.unpack("<HHHHHIIIHH", stream.read_exact(26))
+        raw_name = stream.read_exact(name_length)
+        extra = stream.read_exact(extra_length)
+        name = raw_name.decode("utf-8" if flags & _ZIP_UTF8_NAME else "cp437")
+        if flags & _ZIP_ENCRYPTED:
+            raise ExtractionError(f"Encrypted zip members are not supported: {name}")
+        if method not in (_ZIP_STORED, _ZIP_DEFLATED):
+            raise ExtractionError(
+                f"Zip compression method {method} of {name} is not supported, use "
+                "deflate"
+            )
+
+        zip64 = False
+        offset = 0
+        while offset + 4 <= len(extra):
+            field_id, field_length = struct.unpack_from("<HH", extra, offset)
+            if field_id == _ZIP64_EXTRA:
+                zip64 = True
+                values = list(
+                    struct.unpack_from(f"<{field_length // 8}Q", extra, offset + 4)
+                )
+                if size == 0xFFFFFFFF and values:
+                    size = values.pop(0)
+                if compressed_size == 0xFFFFFFFF and values:
+                    compressed_size = values.pop(0)
+            offset += 4 + field_length
+
+        if flags & _ZIP_HAS_DATA_DESCRIPTOR:
+            if method == _ZIP_STORED:
+                raise ExtractionError(
+                    f"Zip member {name} is stored without its size, it can't be "
+                    "streamed"
+                )
+            compressed_size = None
+        try:
+            mtime = time.mktime(
+                (
+                    (dos_date >> 9) + 1980,
+                    (dos_date >> 5) & 0xF,
+                    dos_date & 0x1F,
+                    dos_time >> 11,
+                    (dos_time >> 5) & 0x3F,
+                    (dos_time & 0x1F) * 2,
+                    0,
+                    0,
+                    -1,
+                )
+            )
+        except (OverflowError, ValueError):
+            mtime = time.time()
+        return cls(name, flags, method, crc, compressed_size, mtime, zip64)
+
+
+class _ZipMemberReader:
+    """Reads the uncompressed data of one zip member from the stream, then checks its
+    CRC."""
+
+    def __init__(self, stream: PushbackReader, header: _ZipLocalHeader, read_size: int):
+        self.stream = stream
+        self.header = header
+        self.read_size = read_size
+        self.remaining = header.compressed_size
+        """Compressed bytes left to read, `None` if unknown."""
+        self.decompressor = (
+            zlib.decompressobj(-zlib.MAX_WBITS)
+            if header.method == _ZIP_DEFLATED
+            else None
+        )
+        self.crc = 0
+        self.done = False
+
+    def read(self, size: int = -1) -> bytes:
+        size = size if size and size > 0 else self.read_size
+        while not self.done:
+            data = (
+                self._read_stored(size)
+                if self.decompressor is None
+                else self._read_deflated(size)
+            )
+            if data:
+                self.crc = zlib.crc32(data, self.crc)
+                return data
+        return b""
+
+    def _read_stored(self, size: int) -> bytes:
+        if self.remaining == 0:
+            self.done = True
+            return b""
+        data = self.stream.read(min(size, self.remaining))
+        if not data:
+            raise ExtractionError(f"Package is truncated in {self.header.name}")
+        self.remaining -= len(data)
+        return data
+
+    def _read_deflated(self, size: int) -> bytes:
+        if self.decompressor.unconsumed_tail:
+            data = self.decompressor.decompress(self.decompressor.unconsumed_tail, size)
+        else:
+            want = (
+                self.read_size
+                if self.remaining is None
+                else min(self.read_size, self.remaining)
+            )
+            compressed = self.stream.read(want) if want else b""
+            if not compressed:
+                raise ExtractionError(f"Package is truncated in {self.header.name}")
+            if self.remaining is not None:
+                self.remaining -= len(compressed)
+            try:
+                data = self.decompressor.decompress(compressed, size)
+            except zlib.error as ex:
+                raise ExtractionError(
+                    f"Zip member {self.header.name} is corrupt: {ex}"
+                ) from ex
+        if self.decompressor.eof:
+            self.done = True
+            if self.decompressor.unused_data:
+                self.stream.unread(self.decompressor.unused_data)
+        return data
+
+    def finish(self) -> None:
+        """Read to the end of the member, including its data descriptor, and check the
+        CRC."""
+        while self.read():
+            pass
+        if self.remaining:
+            self.stream.read_exact(self.remaining)
+        crc = self.header.crc
+        if self.header.flags & _ZIP_HAS_DATA_DESCRIPTOR:
+            crc = struct.unpack("<I", self.stream.read_exact(4))[0]
+            if crc == struct.unpack("<I", _ZIP_DATA_DESCRIPTOR)[0]:
+                crc = struct.unpack("<I", self.stream.read_exact(4))[0]
+            self.stream.read_exact(16 if self.header.zip64 else 8)
+        if crc != self.crc:
+            raise ExtractionError(f"Zip member {self.header.name} failed its CRC check")
@@ -0,0 +1,187 @@
+"""Types of the files of a source, detected from the name and the first bytes of each
+file.
+
+The type is detected as the file is written, from the first chunk, so it is known
+without reading the file again.
+"""
+
+import posixpath
+from typing import Iterable, Optional
+
+TEX = "tex"
+"""A TeX or LaTeX document or input file."""
+TEX_AUX = "tex_aux"
+"""A TeX package, class or other support file. Ex. .sty, .cls, .bst"""
+BIBTEX = "bibtex"
+"""A BibTeX database, .bib"""
+BBL = "bbl"
+"""A processed bibliography, .bbl"""
+PDF = "pdf"
+POSTSCRIPT = "postscript"
+IMAGE = "image"
+HTML = "html"
+README = "readme"
+"""The arXiv ``00README`` with instructions for processing the source."""
+ARCHIVE = "archive"
+"""A tar, zip or compressed file that was not unpacked."""
+TEXT = "text"
+"""Any other text file."""
+BINARY = "binary"
+"""Any other file."""
+
+SOURCE_TEX = "tex"
+"""Source format of a submission that is compiled with TeX to DVI and PostScript."""
+SOURCE_PDFTEX = "pdftex"
+"""Source format of a submission that is compiled with pdfTeX, one with PDF or bitmap
+figures."""
+SOURCE_PDF = "pdf"
+"""Source format of a submission that is only a PDF."""
+SOURCE_POSTSCRIPT = "ps"
+SOURCE_HTML = "html"
+SOURCE_INVALID = "invalid"
+"""Source format of a submission with files but none that arXiv can process."""
+
+DETECT_SIZE = 1024
+"""Bytes of the start of a file looked at to detect its type."""
+
+_TEX_SUFFIXES = (".tex", ".ltx", ".latex")
+_TEX_AUX_SUFFIXES = (
+    ".sty",
+    ".cls",
+    ".bst",
+    ".clo",
+    ".def",
+    ".cfg",
+    ".fd",
+    ".dtx",
+    ".ins",
+    ".bbx",
+    ".cbx",
+    ".lbx",
+    ".mf",
+    ".pfb",
+    ".tfm",
+    ".map",
+    ".enc",
+)
+_IMAGE_SUFFIXES = (
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".tif",
+    ".tiff",
+    ".svg",
+    ".bmp",
+    ".webp",
+)
+_HTML_SUFFIXES = (".html", ".htm")
+_TEX_STARTS = (
+    b"\\documentclass",
+    b"\\documentstyle",
+    b"\\begin{document}",
+    b"\\input",
+    b"\\relax",
+    b"\\def",
+    b"\\newcommand",
+)
+_IMAGE_MAGIC = (
+    b"\x89PNG\r\n\x1a\n",
+    b"\xff\xd8\xff",
+    b"GIF87a",
+    b"GIF89a",
+    b"II*\x00",
+    b"MM\x00*",
+    b"BM",
+)
+_ARCHIVE_MAGIC = (b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00", b"PK\x03\x04", b"PK\x05\x06")
+_CONTROL_BYTES = bytes(byte for byte in range(256) if byte < 9 or 13 < byte < 27)
+
+
+def detect_file_type(name: str, head: bytes) -> str:
+    """Type of the file `name` of a source from the first `DETECT_SIZE` bytes of it,
+    `head`.
+
+    The content decides where it is unambiguous, so a PDF named ``fig1.eps`` is a PDF.
+    Otherwise the suffix does."""
+    base = posixpath.basename(name).lower()
+    if head.startswith(b"%PDF-"):
+        return PDF
+    if head.startswith(b"%!PS") or head.startswith(b"\xc5\xd0\xd3\xc6"):
+        return POSTSCRIPT
+    if head.startswith(_IMAGE_MAGIC) or (
+        len(head) > 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+    ):
+        return IMAGE
+    if head.startswith(_ARCHIVE_MAGIC) or head[257:262] == b"ustar":
+        return ARCHIVE
+    if base.startswith("00readme"):
+        return README
+    if base.endswith(_TEX_SUFFIXES):
+        return TEX
+    if base.endswith(_TEX_AUX_SUFFIXES):
+        return TEX_AUX
+    if base.endswith(".bib"):
+        return BIBTEX
+    if base.endswith(".bbl"):
+        return BBL
+    if base.endswith(_IMAGE_SUFFIXES):
+        return IMAGE
+    if base.endswith((".ps", ".eps")):
+        return POSTSCRIPT
+    text = _leading_text(head)
+    if text is None:
+        return BINARY
+    lowered = text.lower()
+    if base.endswith(_HTML_SUFFIXES) or lowered.startswith(
+        (b"<!doctype html", b"<html")
+    ):
+        return HTML
+    if text.startswith(_TEX_STARTS) or b"\\documentclass" in text:
+        return TEX
+    return TEXT
+
+
+def _leading_text(head: bytes) -> Optional[bytes]:
+    """`head` from its first line that is not blank or a TeX comment if it looks like
+    text, else `None`."""
+    if (
+        b"\x00" in head
+        or len(head) - len(head.translate(None, _CONTROL_BYTES)) > len(head) // 20
+    ):
+        return None
+    start = 0
+    while start < len(head):
+        end = head.find(b"\n", start)
+        end = len(head) if end == -1 else end + 1
+        line = head[start:end].strip()
+        if line and not line.startswith(b"%"):
+            return head[start:].lstrip()
+        start = end
+    return b""
+
+
+def source_format(file_types: Iterable[Optional[str]]) -> Optional[str]:
+    """Format of a whole source from the types of its files, as recorded on the
+    submission.
+
+    Any TeX file makes it a TeX source. It is compiled with pdfTeX if it has PDF or
+    bitmap figures and no PostScript ones, which only TeX can include. Otherwise a PDF,
+    an HTML or a PostScript submission is one with such a file. `None` for an empty
+    source or one whose file types were not recorded."""
+    types = set(file_types) - {None}
+    if not types:
+        return None
+    if TEX in types:
+        return (
+            SOURCE_PDFTEX
+            if (PDF in types or IMAGE in types) and POSTSCRIPT not in types
+            else SOURCE_TEX
+        )
+    if PDF in types:
+        return SOURCE_PDF
+    if HTML in types:
+        return SOURCE_HTML
+    if POSTSCRIPT in types:
+        return SOURCE_POSTSCRIPT
+    return SOURCE_INVALID
@@ -0,0 +1,124 @@
+"""Leases that serialize file operations on a submission without holding a database lock
+during IO.
+
+A writer takes the lease, does its slow IO with no lock held, and then publishes and
+gives the lease back. Each of those two steps reads and writes a small lease file in the
+submission directory. The caller makes the steps atomic by doing them under the legacy
+``SELECT ... FOR UPDATE`` on the submission row, which is then held for only a few file
+system metadata operations. Writers that use the row lock the legacy way, for the whole
+operation, are thereby serialized with taking and giving back leases.
+SQLite has no row locks, there the write lock of the database is held instead, see
+`check_submission_exists`.
+
+The lease file also holds a version that goes up each time a lease holder publishes. A
+writer checks at publish that it still holds the lease, so a writer whose lease expired
+and was taken over can't publish over newer files.
+"""
+
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional
+
+
+class LeaseHeld(RuntimeError):
+    """Another writer holds the lease."""
+
+    def __init__(self, expires: float):
+        super().__init__(
+            f"Files are being written by another request until {time.ctime(expires)}"
+        )
+        self.expires = expires
+
+
+class LeaseLost(RuntimeError):
+    """The lease expired and another writer took it, or it was given back already."""
+
+
+@dataclass(frozen=True)
+class FileLease:
+    """A lease held on the files of a submission."""
+
+    token: str
+    """Identifies the holder."""
+
+    expires: float
+    """When the lease can be taken by another writer, as a `time.time` timestamp."""
+
+    version: int
+    """Version of the files when the lease was taken."""
+
+
+class LeaseFile:
+    """The lease and version of the files of a submission, stored as JSON in `path`.
+
+    Not safe for concurrent use by itself, call under the submission row lock."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"token": None, "expires": 0.0, "version": 0}
+
+    def _write(self, state: dict) -> None:
+        os.makedirs(self.path.parent, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def version(self) -> int:
+        """Version of the files, goes up each time a lease holder publishes."""
+        return self.read()["version"]
+
+    def acquire(self, ttl: float, now: Optional[float] = None) -> FileLease:
+        """Take the lease for `ttl` seconds.
+
+        Raises
+        ------
+        LeaseHeld
+            If another writer holds a lease that has not expired."""
+        now = time.time() if now is None else now
+        state = self.read()
+        if state["token"] is not None and state["expires"] > now:
+            raise LeaseHeld(state["expires"])
+        lease = FileLease(
+            token=uuid.uuid4().hex, expires=now + ttl, version=state["version"]
+        )
+        self._write(asdict(lease))
+        return lease
+
+    def check(self, lease: FileLease) -> None:
+        """Check that `lease` is still held, an expired lease is still held until
+        another writer takes it.
+
+        Raises
+        ------
+        LeaseLost
+            If `lease` is not held."""
+        state = self.read()
+        if state["token"] != lease.token or state["version"] != lease.version:
+            raise LeaseLost(
+                "The lease on the files was lost, another request took it after it "
+                "expired"
+            )
+
+    def release(self, lease: FileLease, published: bool) -> int:
+        """Give back `lease`, raising the version if the holder `published`. Returns the
+        version.
+
+        Raises
+        ------
+        LeaseLost
+            If `lease` is not held."""
+        self.check(lease)
+        version = lease.version + 1 if published else lease.version
+        self._write({"token": None, "expires": 0.0, "version": version})
+        return version
@@ -1,15 +1,124 @@
+import asyncio
+import functools
+import gzip
+import json
 import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import time
+import uuid
+from concurrent import futures
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import IO
-from subprocess import Popen
-from hashlib import md5
-from base64 import urlsafe_b64encode
+from typing import (
+    IO,
+    Callable,
+    TypeVar,
+    Optional,
+    Sequence,
+    Dict,
+    Tuple,
+    List,
+    AsyncIterator,
+)
 
-from submit_ce.file_store import SubmissionFileStore
+from submit_ce.file_store import SubmissionFileStore, SecurityError, StoredFile
+from submit_ce.file_store.atomic import STAGING_PREFIX, publish_dir, fsync_dir
+from submit_ce.file_store.lease import LeaseFile
+from submit_ce.file_store.permissions import ModeChanges, set_tree_modes
+from submit_ce.file_store.checksum import (
+    MultiHasher,
+    checksum_file,
+    validate_algorithms,
+    DEFAULT_READ_SIZE,
+)
+from submit_ce.file_store.extract import (
+    PackageExtractor,
+    ExtractionLimits,
+    FileModes,
+    TeeReader,
+    TeeWriter,
+    PushbackReader,
+    AsyncIteratorReader,
+    ExtractionError,
+    detect_package_format,
+    safe_member_path,
+    DETECT_SIZE,
+    TAR_GZ,
+    TAR_BZ2,
+    TAR_XZ,
+    TAR,
+    ZIP,
+    SINGLE_FILE,
+)
+from submit_ce.file_store.manifest import (
+    ManifestEntry,
+    Manifest,
+    read_manifest,
+    write_manifest,
+    manifest_checksum,
+    SourceSummary,
+    summarize_source,
+    HEAD_SIZE,
+)
+from submit_ce.file_store.upload import (
+    UploadState,
+    UploadError,
+    UploadNotFound,
+    UploadOffsetMismatch,
+    UploadTooLarge,
+    UploadChecksumMismatch,
+    new_chunk_hash,
+)
 
 
-class SecurityError(RuntimeError):
-    """Something suspicious happened."""
+T = TypeVar("T")
+
+PACKAGE_SUFFIXES = {
+    TAR_GZ: ".tar.gz",
+    TAR_BZ2: ".tar.bz2",
+    TAR_XZ: ".tar.xz",
+    TAR: ".tar",
+    ZIP: ".zip",
+}
+"""Suffix of the stored package by format. The legacy tar.gz is first as it is the most
+common."""
+
+
+@dataclass
+class StagedPackage:
+    """A source package that is written and extracted in a staging directory but not yet
+    published."""
+
+    submission_id: int
+    checksum: str
+    """Checksum of the package in the primary algorithm."""
+    manifest: List[ManifestEntry]
+    """Files extracted from the package."""
+    checksums: Dict[str, str]
+    """Checksums of the package by algorithm."""
+    staging: Path
+    """Staging directory with the package, the source and the manifest."""
+    package_path: Path
+    """Where the package will be published."""
+    summary: SourceSummary
+    """Size, file count and format of the source as it will be once published."""
+
+    @property
+    def package(self) -> str:
+        """Name of the package file, as recorded on the submission."""
+        return self.package_path.name
+
+
+PACKAGE_BUILD_ATTEMPTS = 3
+"""Times the package of a changed source is made before giving up because the source
+keeps changing."""
+
+STALE_STAGING_AGE = 60 * 60
+"""Seconds after which a staging directory is taken to be left over from a crash."""
 
 class LegacyFileStore(SubmissionFileStore):
     """
@@ -43,14 +152,20 @@ class LegacyFileStore(SubmissionFileStore):
     Adapted from NG arxiv-submission-core 2024-09-19. Changed to a class, use of Pathlib.
     """
 
-    def __init__(self,
-                 root_dir: Path,
-                 source_file_mode = 0o42775,
-                 source_dir_mode = 0o42775,
-                 source_uid = os.geteuid(),
-                 source_gid = os.getegid(),
-                 source_prefix = "src"
-                 ):
+    def __init__(
+        self,
+        root_dir: Path,
+        source_file_mode=0o42775,
+        source_dir_mode=0o42775,
+        source_uid=os.geteuid(),
+        source_gid=os.getegid(),
+        source_prefix="src",
+        io_pool: Optional[Executor] = None,
+        max_io_workers: int = 4,
+        checksum_algorithms: Sequence[str] = ("md5",),
+        read_size: int = DEFAULT_READ_SIZE,
+        extraction_limits: ExtractionLimits = ExtractionLimits(),
+    ):
         self.root_dir = root_dir
         """Path to the root directory of the file store shards."""
         self.source_file_mode = source_file_mode
@@ -63,71 +178,306 @@ class LegacyFileStore(SubmissionFileStore):
         """gid for owner group (must exist)."""
         self.source_prefix = source_prefix
         """Prefix in the {root}/{shard}/{id} directory to store the source."""
+        self.max_io_workers = max_io_workers
+        """Threads for `io_pool` if it is not given, and for setting the modes of a
+        tree, see `fix_source_modes`."""
+        self.io_pool = (
+            io_pool
+            if io_pool is not None
+            else ThreadPoolExecutor(
+                max_workers=max_io_workers, thread_name_prefix="file-store-io"
+            )
+        )
+        """Bounded pool the async methods use for blocking disk IO so it is not done on
+        the event loop."""
+        self.checksum_algorithms = validate_algorithms(checksum_algorithms)
+        """Algorithms to compute checksums with, see `submit_ce.file_store.checksum`.
+
+        All are computed in the same pass and stored. The first is the one returned when
+        no algorithm is asked for, keep ``md5`` first for checksums compatible with the
+        legacy system."""
+        self.read_size = read_size
+        """Size of reads when copying or hashing files."""
+        self.extraction_limits = extraction_limits
+        """Limits on the number of members and unpacked size of source packages."""
+        self._background = set()
+        """Removals running in `io_pool`."""
+
+    async def create_upload(
+        self, submission_id: int, length: int, filename: Optional[str] = None
+    ) -> UploadState:
+        """Start a resumable upload of a source package of `length` bytes, see
+        `submit_ce.file_store.upload`.
+
+        The package is staged next to the package path so it can be renamed into place.
+        An upload already in progress for the submission is discarded."""
+        return await self._run_io(self._create_upload, submission_id, length, filename)
+
+    async def get_upload(self, submission_id: int) -> Optional[UploadState]:
+        """The upload in progress for the submission, `None` if there is none."""
+        return await self._run_io(self._get_upload, submission_id)
+
+    async def append_upload(
+        self,
+        submission_id: int,
+        offset: int,
+        content: AsyncIterator[bytes],
+        checksum: Optional[Tuple[str, bytes]] = None,
+    ) -> UploadState:
+        """Append a chunk to the upload in progress, `offset` must be the offset of the
+        upload.
+
+        If `checksum`, an algorithm and digest, is given the chunk is only kept if its
+        digest matches. Without a checksum the bytes received before a dropped
+        connection are kept and the client can continue from there.
+
+        Raises
+        ------
+        UploadError
+            See the subclasses in `submit_ce.file_store.upload`."""
+        reader = AsyncIteratorReader(content, asyncio.get_running_loop())
+        return await self._run_io(
+            self._append_upload, submission_id, offset, reader, checksum
+        )
+
+    async def finish_upload(self, submission_id: int) -> str:
+        """Extract the completed upload and rename it to the package path.
+
+        The staged upload is removed whether or not it is a valid package. Returns
+        checksum.
+
+        Raises
+        ------
+        ExtractionError
+            If the package is not a valid tar or is over `extraction_limits`.
+        SecurityError
+            If a member of the package would be outside of the source directory."""
+        staged = await self.stage_upload(submission_id)
+        return await self.publish_staged(staged)
+
+    async def stage_upload(self, submission_id: int) -> StagedPackage:
+        """Extract the completed upload like `finish_upload` but don't publish it, see
+        `stage_source_package`."""
+        return await self._run_io(self._finish_upload, submission_id)
+
+    async def delete_upload(self, submission_id: int) -> bool:
+        """Discard the upload in progress, returns whether there was one."""
+        return await self._run_io(self._delete_upload, submission_id)
+
+    async def get_source_file(
+        self, submission_id: int, path: str
+    ) -> Optional[StoredFile]:
+        """The file `path` in the source of the submission, `None` if there is no such
+        file.
+
+        The checksum comes from the manifest, the file is only read if it is not in the
+        manifest."""
+        return await self._run_io(self._get_source_file, submission_id, path)
+
+    async def list_source_files(
+        self, submission_id: int
+    ) -> Optional[List[ManifestEntry]]:
+        """The files of the source of the submission by name, `None` if no source has
+        been deposited.
+
+        Read from the manifest, a source written before there were manifests is
+        scanned."""
+        return await self._run_io(self._list_source_files, submission_id)
+
+    async def fix_source_modes(self, submission_id: int) -> ModeChanges:
+        """Give the source of the submission the modes and owner of the store, changing
+        only the paths that differ.
+
+        Files the store writes get them as they are written. This is for sources written
+        some other way, a source from before there were manifests is fixed when it is
+        next uploaded to."""
+        return await self._run_io(self._fix_source_modes, submission_id)
 
-    def get_source_file(self, submission_id: str, path: Path):
-        pass
+    def _fix_source_modes(self, submission_id: int) -> ModeChanges:
+        source_path = self._source_path(submission_id)
+        if not os.path.isdir(source_path):
+            return ModeChanges()
+        return set_tree_modes(source_path, self._file_modes(), self.max_io_workers)
+
+    async def get_source_package(self, submission_id: int) -> Optional[StoredFile]:
+        """The source package of the submission, `None` if no source has been deposited.
+
+        After single files have been changed there is no package, then a tar.gz of the
+        source is made and stored."""
+        return await self._run_io(self._get_source_package, submission_id)
+
+    async def store_source_file(
+        self, submission_id: int, path: str, content: AsyncIterator[bytes]
+    ) -> ManifestEntry:
+        """Add or replace the single file `path` in the source of the submission.
+
+        The file is written next to its final path and renamed into place, so readers
+        never see part of it. The manifest is updated for just this file and the stored
+        package is removed since it no longer matches the source. Takes time in the size
+        of the file, not of the source.
+
+        Raises
+        ------
+        ExtractionError
+            If the file would put the source over `extraction_limits`.
+        SecurityError
+            If `path` is outside of the source directory."""
+        reader = AsyncIteratorReader(content, asyncio.get_running_loop())
+        return await self._run_io(self._store_source_file, submission_id, path, reader)
+
+    async def delete_source_file(self, submission_id: int, path: str) -> bool:
+        """Remove the single file `path` from the source of the submission.
 
-    def get_source_pacakge_checksum(self, submission_id: str) -> str:
-        pass
+        Returns whether there was such a file. The manifest is updated for just this
+        file and the stored package is removed since it no longer matches the source."""
+        return await self._run_io(self._delete_source_file, submission_id, path)
 
-    def get_preview(self, submission_id: str, path: Path):
-        pass
+    def get_source_pacakge_checksum(
+        self, submission_id: int, algorithm: Optional[str] = None
+    ) -> str:
+        return self.get_source_checksum(submission_id, algorithm)
+
+    async def get_preview(self, submission_id: int) -> Optional[StoredFile]:
+        """The preview PDF of the submission, `None` if there is no preview."""
+        return await self._run_io(self._get_preview, submission_id)
 
     def is_available(self) -> bool:
         """Determine whether the filesystem is available."""
         return os.path.exists(self.root_dir)
 
-    async def store_source_package(self,
-                     submission_id: int,
-                     content: IO[bytes],
-                     chunk_size: int = 4096) -> str:
-        """Store a source package for a submission."""
-        # Make sure that we have a place to put the source files.
-        package_path = self._source_package_path(submission_id)
-        source_path = self._source_path(submission_id)
-        if not os.path.exists(package_path):
-            os.makedirs(os.path.split(package_path)[0])
-        if not os.path.exists(source_path):
-            os.makedirs(source_path)
-
-        with open(package_path, 'wb') as f:
-            while True:
-                chunk = await content.read(chunk_size)
-                if not chunk:
-                    break
-                f.write(chunk)
-
-        self._unpack_tarfile(package_path, source_path)
-        self._set_modes(package_path)
-        self._set_modes(source_path)
-        return self.get_source_checksum(submission_id)
-
-    def store_preview(self, submission_id: int, content: IO[bytes],
-                      chunk_size: int = 4096) -> str:
-        """Store a preview PDF for a submission."""
+    async def store_source_package(
+        self, submission_id: int, content: IO[bytes], chunk_size: Optional[int] = None
+    ) -> str:
+        """Store a source package for a submission.
+
+        `content` is read once in `io_pool`. As it is read it is written to the package
+        file, hashed and unpacked into the source directory, see
+        `submit_ce.file_store.extract`.
+
+        `content` may be a tar, compressed or not, a zip or a single file. Archives are
+        stored as they were uploaded, as ``{id}.tar.gz``, ``{id}.zip`` and so on, so
+        they take no longer to store than a tar.gz. A single file is packed into a
+        ``{id}.tar.gz`` as it is written.
+
+        Raises
+        ------
+        ExtractionError
+            If the package is not a valid tar or is over `extraction_limits`.
+        SecurityError
+            If a member of the package would be outside of the source directory."""
+        staged = await self.stage_source_package(submission_id, content, chunk_size)
+        return await self.publish_staged(staged)
+
+    async def publish_staged(self, staged: StagedPackage) -> str:
+        """Make a package from `stage_source_package` or `stage_upload` the live one,
+        returns checksum.
+
+        This only renames, so it is quick enough to do while holding a lock."""
+        return await self._run_io(self._publish_staged, staged)
+
+    async def stage_source_package(
+        self, submission_id: int, content: IO[bytes], chunk_size: Optional[int] = None
+    ) -> StagedPackage:
+        """Write and extract a source package like `store_source_package` but don't
+        publish it.
+
+        This is the slow part of storing a package. Pass the result to `publish_staged`,
+        which only renames, or to `discard_staged`."""
+        return await self._run_io(
+            self._stage_package,
+            self._sync_reader(content),
+            submission_id,
+            chunk_size or self.read_size,
+            getattr(content, "filename", None),
+        )
+
+    def store_preview(
+        self,
+        submission_id: int,
+        content: IO[bytes],
+        chunk_size: Optional[int] = None,
+        source_checksum: Optional[str] = None,
+    ) -> str:
+        """Store a preview PDF for a submission.
+
+        `source_checksum` is kept in the checksum sidecar of the preview."""
+        chunk_size = chunk_size or self.read_size
         preview_path = self._preview_path(submission_id)
-        if not os.path.exists(preview_path):
-            os.makedirs(os.path.split(preview_path)[0])
-        with open(preview_path, 'wb') as f:
-            while True:
-                chunk = content.read(chunk_size)
-                if not chunk:
-                    break
-                f.write(chunk)
-        self._set_modes(preview_path)
-        return self.get_preview_checksum(submission_id)
-
-    def get_source_checksum(self, submission_id: int) -> str:
-        """Get the checksum of the source package for a submission."""
-        return self._get_checksum(self._source_package_path(submission_id))
+        os.makedirs(os.path.split(preview_path)[0], exist_ok=True)
+        hasher = MultiHasher(self.checksum_algorithms)
+        tmp_path = preview_path.with_name(f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = content.read(chunk_size)
+                    if not chunk:
+                        break
+                    self._write_and_hash(f, hasher, chunk)
+                os.fchown(f.fileno(), self.source_uid, self.source_gid)
+                os.fchmod(f.fileno(), self.source_file_mode)
+            os.replace(tmp_path, preview_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self._write_checksums(
+            preview_path, hasher.checksums(), source_checksum=source_checksum
+        )
+        return hasher.checksum
+
+    def get_preview_source_checksum(self, submission_id: int) -> Optional[str]:
+        """Checksum of the source the preview was made from, `None` if there is no
+        preview or it is not known."""
+        stored = self._read_sidecar(self._preview_path(submission_id))
+        return stored.get("source_checksum") if stored is not None else None
+
+    async def delete_preview(self, submission_id: int) -> bool:
+        """Delete the preview PDF of a submission, returns whether there was one."""
+        return await self._run_io(self._delete_preview, submission_id)
+
+    def _delete_preview(self, submission_id: int) -> bool:
+        preview_path = self._preview_path(submission_id)
+        try:
+            os.unlink(preview_path)
+        except FileNotFoundError:
+            return False
+        try:
+            os.unlink(self._checksum_path(preview_path))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def get_source_checksum(
+        self, submission_id: int, algorithm: Optional[str] = None
+    ) -> str:
+        """Get the checksum of the source package for a submission.
+
+        After single files have been changed there is no package, then this is the
+        checksum of the manifest, see
+        `submit_ce.file_store.manifest.manifest_checksum`."""
+        package_path = self._existing_source_package_path(submission_id)
+        if package_path is not None:
+            return self._get_stored_checksum(package_path, algorithm)
+        manifest = read_manifest(self._manifest_path(submission_id))
+        if manifest is None:
+            raise FileNotFoundError(f"No source package for submission {submission_id}")
+        return manifest_checksum(
+            manifest.values(), algorithm or self.checksum_algorithms[0]
+        )
 
     def does_source_exist(self, submission_id: int) -> bool:
         """Determine whether source has been deposited for a submission."""
-        return os.path.exists(self._source_package_path(submission_id))
+        return self._existing_source_package_path(
+            submission_id
+        ) is not None or os.path.exists(self._manifest_path(submission_id))
 
-    def get_preview_checksum(self, submission_id: int) -> str:
+    def get_preview_checksum(
+        self, submission_id: int, algorithm: Optional[str] = None
+    ) -> str:
         """Get the checksum of the preview PDF for a submission."""
-        return self._get_checksum(self._preview_path(submission_id))
+        return self._get_stored_checksum(self._preview_path(submission_id), algorithm)
 
     def does_preview_exist(self, submission_id: int) -> bool:
         """Determine whether a preview has been deposited for a submission."""
@@ -151,61 +501,645 @@ class LegacyFileStore(SubmissionFileStore):
         """Get the source path for the submission_id"""
         return self._submission_path(submission_id) / self.source_prefix
 
-    def _source_package_path(self, submission_id: int) -> Path:
-        return self._submission_path(submission_id) / f'{submission_id}.tar.gz'
+    def _source_package_path(
+        self, submission_id: int, package_format: str = TAR_GZ
+    ) -> Path:
+        return (
+            self._submission_path(submission_id)
+            / f"{submission_id}{PACKAGE_SUFFIXES[package_format]}"
+        )
+
+    def _existing_source_package_path(self, submission_id: int) -> Optional[Path]:
+        """Path of the source package of the submission in whatever format it was
+        uploaded, if any."""
+        for package_format in PACKAGE_SUFFIXES:
+            path = self._source_package_path(submission_id, package_format)
+            if os.path.exists(path):
+                return path
+        return None
 
     def _preview_path(self, submission_id: int) -> Path:
         return self._submission_path(submission_id) / f'{submission_id}.pdf'
 
-    def _get_checksum(self, path: str) -> str:
-        hash_md5 = md5()
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return urlsafe_b64encode(hash_md5.digest()).decode('utf-8')
-
-    def _unpack_tarfile(self, tar_path: str, unpack_to: str) -> None:
-        result = Popen(['tar', '-xzf', tar_path, '-C', unpack_to]).wait()
-        if result != 0:
-            raise RuntimeError(f'tar exited with {result}')
-
-    def _chmod_recurse(self, parent: Path, dir_mode: int, file_mode: int,
-                      uid: int, gid: int) -> None:
-        """
-        Recursively chmod and chown all directories and files.
-
-        Parameters
-        ----------
-        parent : str
-            Root directory for the operation (included).
-        dir_mode : int
-            Mode to set directories.
-        file_mode : int
-            Mode to set files.
-        uid : int
-            UID for chown.
-        gid : int
-            GID for chown.
-
-        """
-        if not os.path.isdir(parent):
-            os.chown(parent, uid, gid)
-            os.chmod(parent, file_mode)
-            return
+    def _manifest_path(self, submission_id: int) -> Path:
+        return self._submission_path(submission_id) / f"{submission_id}.manifest.jsonl"
 
-        for path, directories, files in os.walk(parent):
+    def _upload_path(self, submission_id: int) -> Path:
+        return self._submission_path(submission_id) / f"{submission_id}.upload"
+
+    def _upload_state_path(self, submission_id: int) -> Path:
+        return self._submission_path(submission_id) / f"{submission_id}.upload.json"
+
+    def _source_file_name(self, path: str) -> str:
+        """Normalized name of a file in the source directory."""
+        name = safe_member_path(path)
+        if not name:
+            raise SecurityError("Path of a source file must not be empty")
+        return name
+
+    def _checksum_path(self, path: Path) -> Path:
+        """Sidecar file next to `path` with its checksum."""
+        return path.with_name(path.name + ".checksum")
+
+    def _write_checksums(
+        self,
+        path: Path,
+        checksums: Dict[str, str],
+        source_checksum: Optional[str] = None,
+    ) -> None:
+        """Persist the checksums of `path`, computed while writing it, in its sidecar.
+
+        The size and mtime of `path` are recorded so a sidecar left stale by some other
+        writer of `path` is detected."""
+        stat = os.stat(path)
+        checksum_path = self._checksum_path(path)
+        tmp_path = checksum_path.with_name(checksum_path.name + ".tmp")
+        stored = {
+            "checksums": checksums,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        if source_checksum is not None:
+            stored["source_checksum"] = source_checksum
+        with open(tmp_path, "w") as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, checksum_path)
+
+    def _read_sidecar(self, path: Path) -> Optional[dict]:
+        """The sidecar of `path`, `None` if there is none or it is stale."""
+        try:
+            stat = os.stat(path)
+            with open(self._checksum_path(path)) as f:
+                stored = json.load(f)
+            if (
+                stored["size"] == stat.st_size
+                and stored["mtime_ns"] == stat.st_mtime_ns
+            ):
+                return stored
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _get_stored_checksum(self, path: Path, algorithm: Optional[str] = None) -> str:
+        """Get the checksum of `path` from its sidecar without reading `path`.
+
+        Falls back to reading `path` if the sidecar is missing, stale or lacks
+        `algorithm`, and then writes the sidecar."""
+        algorithm = algorithm or self.checksum_algorithms[0]
+        os.stat(path)
+        stored = self._read_sidecar(path)
+        if stored is not None and algorithm in stored["checksums"]:
+            return stored["checksums"][algorithm]
+        algorithms = validate_algorithms(
+            dict.fromkeys([*self.checksum_algorithms, algorithm])
+        )
+        checksums = checksum_file(path, algorithms, self.read_size)
+        self._write_checksums(path, checksums)
+        return checksums[algorithm]
+
+    def _store_and_extract(
+        self,
+        reader: IO[bytes],
+        submission_id: int,
+        read_size: int,
+        filename: Optional[str] = None,
+    ) -> Tuple[str, List[ManifestEntry]]:
+        """Write `reader` to the package and extract it to the source directory in one
+        pass.
+
+        Returns the checksum of the package and the manifest of the extracted files."""
+        staged = self._stage_package(reader, submission_id, read_size, filename)
+        self._publish_staged(staged)
+        return staged.checksum, staged.manifest
+
+    def _stage_package(
+        self,
+        reader: IO[bytes],
+        submission_id: int,
+        read_size: int,
+        filename: Optional[str] = None,
+        staged_path: Optional[Path] = None,
+    ) -> StagedPackage:
+        """Write `reader` to a package and extract it in one pass, all in a staging
+        directory.
+
+        The staging directory is next to the source and starts as a hard linked copy of
+        the current source, so an upload adds to the files already there. Nothing live
+        is changed until `publish_staged`.
+
+        If `reader` is the already written file at `staged_path` it is not copied, the
+        file is moved into the staging directory."""
+        source_path = self._source_path(submission_id)
+        submission_path = self._submission_path(submission_id)
+        os.makedirs(submission_path, exist_ok=True)
+        self._remove_stale_staging(submission_id)
+        staging = Path(tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=submission_path))
+        try:
+            staged_source = staging / self.source_prefix
+            self._link_tree(source_path, staged_source)
+            if not self._manifest_path(submission_id).exists():
+                # a source from before manifests was not written by the store, its files
+                # share inodes with the staged links so this fixes the live source too
+                set_tree_modes(staged_source, self._file_modes(), self.max_io_workers)
+            reader = PushbackReader(reader)
+            package_format = detect_package_format(reader.peek(DETECT_SIZE))
+            package_path = self._source_package_path(
+                submission_id,
+                TAR_GZ if package_format == SINGLE_FILE else package_format,
+            )
+            source_manifest = self._load_manifest(submission_id)
+            hasher = MultiHasher(self.checksum_algorithms)
+            copy = staged_path is None or package_format == SINGLE_FILE
+            staged_package = staging / package_path.name
+            if not copy:
+                os.replace(staged_path, staged_package)
+            with (
+                open(staged_package, "wb") if copy else open(staged_package, "rb")
+            ) as package:
+                if package_format != SINGLE_FILE:
+                    extractor = self._new_extractor(
+                        staged_source, self.extraction_limits, read_size
+                    )
+                    tee = TeeReader(reader, package if copy else None, hasher)
+                    manifest = extractor.extract(tee, package_format)
+                    tee.drain(read_size)
+                else:
+                    with (
+                        gzip.GzipFile(
+                            filename="",
+                            mode="wb",
+                            fileobj=TeeWriter(package, hasher),
+                            compresslevel=6,
+                        ) as compressed,
+                        tarfile.open(fileobj=compressed, mode="w|") as repack,
+                    ):
+                        extractor = self._new_extractor(
+                            staged_source,
+                            self.extraction_limits,
+                            read_size,
+                            on_file=lambda path, entry: repack.add(path, entry.name),
+                        )
+                        manifest = extractor.extract(reader, package_format, filename)
+                os.fchown(package.fileno(), self.source_uid, self.source_gid)
+                os.fchmod(package.fileno(), self.source_file_mode)
+                os.fsync(package.fileno())
+            source_manifest.update((entry.name, entry) for entry in manifest)
+            staged_manifest = staging / self._manifest_path(submission_id).name
+            write_manifest(staged_manifest, source_manifest)
+        except BaseException:
+            self._remove_in_background(staging)
+            raise
+        return StagedPackage(
+            submission_id=submission_id,
+            checksum=hasher.checksum,
+            manifest=manifest,
+            checksums=hasher.checksums(),
+            staging=staging,
+            package_path=package_path,
+            summary=summarize_source(source_manifest.values()),
+        )
+
+    def _publish_staged(self, staged: StagedPackage) -> str:
+        """Make a staged package and its source the live ones.
+
+        The staged source is swapped with the live one and the package and manifest are
+        renamed into place, see `submit_ce.file_store.atomic`. This only renames, so it
+        is quick enough to do while holding a lock. Readers never see a partly extracted
+        source and a failed or interrupted upload leaves the live files as they were.
+        The old source is removed in the background.
+
+        Returns the checksum of the package."""
+        submission_id = staged.submission_id
+        submission_path = self._submission_path(submission_id)
+        try:
+            old_source = publish_dir(
+                staged.staging / self.source_prefix, self._source_path(submission_id)
+            )
+            if old_source is not None and old_source.parent != staged.staging:
+                self._remove_in_background(old_source)
+            os.replace(staged.staging / staged.package_path.name, staged.package_path)
+            self._write_checksums(staged.package_path, staged.checksums)
+            os.replace(
+                staged.staging / self._manifest_path(submission_id).name,
+                self._manifest_path(submission_id),
+            )
+            self._remove_other_packages(submission_id, staged.package_path)
+            fsync_dir(submission_path)
+        finally:
+            self._remove_in_background(staged.staging)
+        return staged.checksum
+
+    def discard_staged(self, staged: StagedPackage) -> None:
+        """Drop a staged package without publishing it."""
+        self._remove_in_background(staged.staging)
+
+    def lease_file(self, submission_id: int) -> LeaseFile:
+        """Lease and version of the files of the submission, see
+        `submit_ce.file_store.lease`."""
+        return LeaseFile(
+            self._submission_path(submission_id) / f"{submission_id}.lease.json"
+        )
+
+    def _store_source_file(
+        self, submission_id: int, path: str, reader: IO[bytes]
+    ) -> ManifestEntry:
+        name = self._source_file_name(path)
+        source_path = self._source_path(submission_id)
+        os.makedirs(self._submission_path(submission_id), exist_ok=True)
+        if os.path.isdir(source_path / name):
+            raise SecurityError(f"Source file {name} is a directory")
+        manifest = self._load_manifest(submission_id)
+        others = [entry for entry in manifest.values() if entry.name != name]
+        if len(others) >= self.extraction_limits.max_members:
+            raise ExtractionError(
+                f"Source has more than {self.extraction_limits.max_members} files"
+            )
+        limits = ExtractionLimits(
+            max_total_size=self.extraction_limits.max_total_size
+            - sum(entry.size for entry in others)
+        )
+        extractor = self._new_extractor(source_path, limits, self.read_size)
+        tmp_name = posixpath.join(posixpath.dirname(name), f".{uuid.uuid4().hex}.tmp")
+        try:
+            entry = extractor.write_file(name, reader, write_as=tmp_name)
+            os.replace(source_path / tmp_name, source_path / name)
+        except BaseException:
+            try:
+                os.unlink(source_path / tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+        manifest[name] = entry
+        self._save_changed_manifest(submission_id, manifest)
+        return entry
+
+    def _delete_source_file(self, submission_id: int, path: str) -> bool:
+        file_path = self._source_file_path(submission_id, path)
+        if file_path is None:
+            return False
+        manifest = self._load_manifest(submission_id)
+        os.unlink(file_path)
+        manifest.pop(self._source_file_name(path), None)
+        self._save_changed_manifest(submission_id, manifest)
+        return True
+
+    def _source_file_path(self, submission_id: int, path: str) -> Optional[Path]:
+        """Path of the regular file `path` in the source directory, `None` if there is
+        no such file."""
+        source_path = self._source_path(submission_id)
+        file_path = source_path / self._source_file_name(path)
+        if not os.path.isfile(file_path) or os.path.commonpath(
+            [os.path.realpath(file_path), os.path.realpath(source_path)]
+        ) != os.path.realpath(source_path):
+            return None
+        return file_path
+
+    def _get_source_file(self, submission_id: int, path: str) -> Optional[StoredFile]:
+        file_path = self._source_file_path(submission_id, path)
+        if file_path is None:
+            return None
+        manifest = read_manifest(self._manifest_path(submission_id)) or {}
+        entry = manifest.get(self._source_file_name(path))
+        size = os.path.getsize(file_path)
+        if entry is None or entry.size != size:
+            checksum = checksum_file(
+                file_path, self.checksum_algorithms[:1], self.read_size
+            )
+            return StoredFile(
+                path=file_path,
+                size=size,
+                checksum=checksum[self.checksum_algorithms[0]],
+            )
+        return StoredFile(path=file_path, size=size, checksum=entry.checksum)
+
+    def _list_source_files(self, submission_id: int) -> Optional[List[ManifestEntry]]:
+        if not os.path.exists(self._manifest_path(submission_id)) and not os.path.isdir(
+            self._source_path(submission_id)
+        ):
+            return None
+        manifest = self._load_manifest(submission_id)
+        return [manifest[name] for name in sorted(manifest)]
+
+    def _get_source_package(self, submission_id: int) -> Optional[StoredFile]:
+        for _ in range(PACKAGE_BUILD_ATTEMPTS):
+            package_path = self._existing_source_package_path(submission_id)
+            if package_path is None:
+                manifest = read_manifest(self._manifest_path(submission_id))
+                if manifest is None:
+                    return None
+                package_path = self._build_source_package(submission_id, manifest)
+                if package_path is None:
+                    continue
+            try:
+                return StoredFile(
+                    path=package_path,
+                    size=os.path.getsize(package_path),
+                    checksum=self._get_stored_checksum(package_path),
+                )
+            except FileNotFoundError:  # removed by a change to a file since
+                continue
+        raise RuntimeError(
+            f"The source of submission {submission_id} kept changing while its package "
+            "was made"
+        )
+
+    def _build_source_package(
+        self, submission_id: int, manifest: Manifest
+    ) -> Optional[Path]:
+        """Make a tar.gz of the files of `manifest` as the source package, `None` if the
+        source changed meanwhile.
+
+        No lock is held, so a file can change while the package is made. Writers save
+        the manifest and then remove the package, so once the package is published the
+        manifest is read again. If it changed, the package that was published may be
+        older than the source and is removed again, unless another build replaced it."""
+        source_path = self._source_path(submission_id)
+        package_path = self._source_package_path(submission_id, TAR_GZ)
+        tmp_path = package_path.with_name(f".{uuid.uuid4().hex}.tmp")
+        hasher = MultiHasher(self.checksum_algorithms)
+        try:
+            with open(tmp_path, "wb") as package:
+                with (
+                    gzip.GzipFile(
+                        filename="",
+                        mode="wb",
+                        fileobj=TeeWriter(package, hasher),
+                        compresslevel=6,
+                    ) as compressed,
+                    tarfile.open(fileobj=compressed, mode="w|") as tar,
+                ):
+                    for name in sorted(manifest):
+                        tar.add(source_path / name, name)
+                os.fchown(package.fileno(), self.source_uid, self.source_gid)
+                os.fchmod(package.fileno(), self.source_file_mode)
+            built = os.stat(tmp_path)
+            os.replace(tmp_path, package_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        try:
+            self._write_checksums(package_path, hasher.checksums())
+        except FileNotFoundError:  # removed by a change to a file
+            return None
+        if read_manifest(self._manifest_path(submission_id)) != manifest:
+            try:
+                if os.path.samestat(os.stat(package_path), built):
+                    os.unlink(package_path)
+            except FileNotFoundError:
+                pass
+            return None
+        return package_path
+
+    def _get_preview(self, submission_id: int) -> Optional[StoredFile]:
+        preview_path = self._preview_path(submission_id)
+        if not os.path.isfile(preview_path):
+            return None
+        return StoredFile(
+            path=preview_path,
+            size=os.path.getsize(preview_path),
+            checksum=self._get_stored_checksum(preview_path),
+        )
+
+    def _load_manifest(self, submission_id: int) -> Manifest:
+        """Manifest of the source of the submission.
+
+        A source written before there were manifests is scanned once to make one."""
+        manifest = read_manifest(self._manifest_path(submission_id))
+        if manifest is not None:
+            return manifest
+        source_path = self._source_path(submission_id)
+        manifest = {}
+        for dir_path, _, files in os.walk(source_path):
+            for file_name in files:
+                file_path = os.path.join(dir_path, file_name)
+                if os.path.islink(file_path):
+                    continue
+                name = os.path.relpath(file_path, source_path)
+                checksum = checksum_file(
+                    file_path, self.checksum_algorithms[:1], self.read_size
+                )
+                with open(file_path, "rb") as f:
+                    head = f.read(HEAD_SIZE)
+                stat = os.stat(file_path)
+                manifest[name] = ManifestEntry.from_head(
+                    name,
+                    stat.st_size,
+                    checksum[self.checksum_algorithms[0]],
+                    stat.st_mtime,
+                    head,
+                )
+        return manifest
+
+    def _save_changed_manifest(self, submission_id: int, manifest: Manifest) -> None:
+        """Save the manifest after single files were changed, the package no longer
+        matches the source."""
+        write_manifest(self._manifest_path(submission_id), manifest)
+        self._remove_other_packages(submission_id, None)
+
+    def _create_upload(
+        self, submission_id: int, length: int, filename: Optional[str]
+    ) -> UploadState:
+        os.makedirs(self._submission_path(submission_id), exist_ok=True)
+        with open(self._upload_path(submission_id), "wb"):
+            pass
+        state_path = self._upload_state_path(submission_id)
+        tmp_path = state_path.with_name(state_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"length": length, "filename": filename}, f)
+        os.replace(tmp_path, state_path)
+        return UploadState(offset=0, length=length, filename=filename)
+
+    def _get_upload(self, submission_id: int) -> Optional[UploadState]:
+        try:
+            with open(self._upload_state_path(submission_id)) as f:
+                state = json.load(f)
+            offset = os.path.getsize(self._upload_path(submission_id))
+        except FileNotFoundError:
+            return None
+        return UploadState(
+            offset=offset, length=state["length"], filename=state.get("filename")
+        )
+
+    def _append_upload(
+        self,
+        submission_id: int,
+        offset: int,
+        reader: IO[bytes],
+        checksum: Optional[Tuple[str, bytes]],
+    ) -> UploadState:
+        state = self._get_upload(submission_id)
+        if state is None:
+            raise UploadNotFound(
+                f"No upload in progress for submission {submission_id}"
+            )
+        if offset != state.offset:
+            raise UploadOffsetMismatch(
+                f"Upload is at offset {state.offset}, not {offset}"
+            )
+        chunk_hash = new_chunk_hash(checksum)
+        with open(self._upload_path(submission_id), "r+b") as f:
+            f.seek(offset)
+            try:
+                for chunk in iter(lambda: reader.read(self.read_size), b""):
+                    if offset + len(chunk) > state.length:
+                        raise UploadTooLarge(
+                            f"Upload is longer than its length of {state.length} bytes"
+                        )
+                    f.write(chunk)
+                    offset += len(chunk)
+                    if chunk_hash is not None:
+                        chunk_hash.update(chunk)
+                if chunk_hash is not None and chunk_hash.digest() != checksum[1]:
+                    raise UploadChecksumMismatch(
+                        f"{checksum[0]} digest of the chunk does not match "
+                        "Upload-Checksum"
+                    )
+            except BaseException as ex:
+                if checksum is not None or isinstance(ex, UploadError):
+                    f.truncate(state.offset)
+                raise
+        return UploadState(offset=offset, length=state.length, filename=state.filename)
+
+    def _finish_upload(self, submission_id: int) -> StagedPackage:
+        state = self._get_upload(submission_id)
+        if state is None:
+            raise UploadNotFound(
+                f"No upload in progress for submission {submission_id}"
+            )
+        if not state.complete:
+            raise UploadError(f"Upload has {state.offset} of {state.length} bytes")
+        upload_path = self._upload_path(submission_id)
+        try:
+            with open(upload_path, "rb") as staged:
+                return self._stage_package(
+                    staged,
+                    submission_id,
+                    self.read_size,
+                    state.filename,
+                    staged_path=upload_path,
+                )
+        finally:
+            self._delete_upload(submission_id)
+
+    def _delete_upload(self, submission_id: int) -> bool:
+        existed = False
+        for path in (
+            self._upload_state_path(submission_id),
+            self._upload_path(submission_id),
+        ):
+            try:
+                os.unlink(path)
+                existed = True
+            except FileNotFoundError:
+                pass
+        return existed
+
+    def _link_tree(self, source: Path, dest: Path) -> None:
+        """Make `dest` a copy of the directory `source` with hard links to its files,
+        `dest` is empty if there is no `source`."""
+        os.mkdir(dest)
+        os.chown(dest, self.source_uid, self.source_gid)
+        os.chmod(dest, self.source_dir_mode)
+        if not os.path.isdir(source):
+            return
+        for dir_path, directories, files in os.walk(source):
+            target = os.path.join(dest, os.path.relpath(dir_path, source))
             for directory in directories:
-                os.chown(os.path.join(path, directory), uid, gid)
-                os.chmod(os.path.join(path, directory), dir_mode)
+                path = os.path.join(dir_path, directory)
+                if os.path.islink(path):
+                    os.symlink(os.readlink(path), os.path.join(target, directory))
+                else:
+                    os.mkdir(os.path.join(target, directory))
+                    os.chown(
+                        os.path.join(target, directory),
+                        self.source_uid,
+                        self.source_gid,
+                    )
+                    os.chmod(os.path.join(target, directory), self.source_dir_mode)
             for fname in files:
-                os.chown(os.path.join(path, fname), uid, gid)
-                os.chmod(os.path.join(path, fname), file_mode)
-        os.chown(parent, uid, gid)
-        os.chmod(parent, dir_mode)
-
-    def _set_modes(self, path: str) -> None:
-        dir_mode = self.source_dir_mode
-        file_mode = self.source_file_mode
-        source_uid = self.source_uid
-        source_gid = self.source_gid
-        self._chmod_recurse(path, dir_mode, file_mode, source_uid, source_gid)
+                os.link(
+                    os.path.join(dir_path, fname),
+                    os.path.join(target, fname),
+                    follow_symlinks=False,
+                )
+
+    def _remove_in_background(self, path: Path) -> None:
+        """Remove the directory tree at `path` without waiting for it."""
+        future = self.io_pool.submit(shutil.rmtree, path, True)
+        self._background.add(future)
+        future.add_done_callback(self._background.discard)
+
+    def wait_for_background(self) -> None:
+        """Wait for removals started in the background to finish."""
+        futures.wait(list(self._background))
+
+    def _remove_stale_staging(self, submission_id: int) -> None:
+        """Remove staging directories left by a crash or by a failed removal."""
+        submission_path = self._submission_path(submission_id)
+        cutoff = time.time() - STALE_STAGING_AGE
+        with os.scandir(submission_path) as entries:
+            for entry in entries:
+                if (
+                    entry.name.startswith(STAGING_PREFIX)
+                    and entry.is_dir(follow_symlinks=False)
+                    and entry.stat(follow_symlinks=False).st_mtime < cutoff
+                ):
+                    self._remove_in_background(Path(entry.path))
+
+    def _remove_other_packages(self, submission_id: int, keep: Optional[Path]) -> None:
+        """Remove packages of a previous upload in a different format, or all packages
+        if `keep` is `None`."""
+        for package_format in PACKAGE_SUFFIXES:
+            path = self._source_package_path(submission_id, package_format)
+            if path != keep:
+                for stale in (path, self._checksum_path(path)):
+                    try:
+                        os.unlink(stale)
+                    except FileNotFoundError:
+                        pass
+
+    @staticmethod
+    def _sync_reader(content) -> IO[bytes]:
+        """Blocking reader for `content`, which may be an `UploadFile` or a binary
+        file."""
+        return getattr(content, "file", content)
+
+    def _new_extractor(
+        self,
+        dest: Path,
+        limits: ExtractionLimits,
+        read_size: int,
+        on_file: Optional[Callable[[Path, ManifestEntry], None]] = None,
+    ) -> PackageExtractor:
+        """Extractor that writes files into `dest` with the modes and primary checksum
+        of the store."""
+        return PackageExtractor(
+            dest,
+            self._file_modes(),
+            limits,
+            self.checksum_algorithms[0],
+            read_size,
+            on_file=on_file,
+        )
+
+    def _file_modes(self) -> FileModes:
+        return FileModes(
+            file_mode=self.source_file_mode,
+            dir_mode=self.source_dir_mode,
+            uid=self.source_uid,
+            gid=self.source_gid,
+        )
+
+    async def _run_io(self, fn: Callable[..., T], *args) -> T:
+        """Run blocking `fn` in `io_pool`."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.io_pool, functools.partial(fn, *args)
+        )
+
+    @staticmethod
+    def _write_and_hash(f: IO[bytes], hasher: MultiHasher, chunk: bytes) -> None:
+        f.write(chunk)
+        hasher.update(chunk)
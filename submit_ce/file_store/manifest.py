@@ -0,0 +1,133 @@
+"""Manifest of the files of a source package.
+
+The manifest is stored as JSON lines, one `ManifestEntry` per line, next to the package.
+It is updated as files are added and removed, so the files of a submission, their sizes,
+checksums and types are known without reading the files or walking the source directory.
+"""
+
+import json
+import os
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from submit_ce.file_store.checksum import MultiHasher
+from submit_ce.file_store import file_types, tex_detect
+from submit_ce.file_store.file_types import detect_file_type, source_format
+from submit_ce.file_store.tex_detect import main_file_score, rank_main_files
+
+HEAD_SIZE = max(file_types.DETECT_SIZE, tex_detect.HEAD_SIZE)
+"""Bytes of the start of a file needed by `ManifestEntry.from_head`."""
+
+
+@dataclass
+class ManifestEntry:
+    """A file in the source of a submission."""
+
+    name: str
+    """Path of the file relative to the source directory. Ex. figures/fig1.jpg"""
+
+    size: int
+    """Size of the file in bytes."""
+
+    checksum: str
+    """Checksum of the file in the primary algorithm of the store."""
+
+    mtime: Optional[float] = None
+    """Modification time of the file as a Unix timestamp, from the package if it had
+    one. `None` in manifests written before it was recorded."""
+
+    file_type: Optional[str] = None
+    """Type of the file detected when it was written, see
+    `submit_ce.file_store.file_types`. `None` in manifests written before it was
+    recorded."""
+
+    main_score: Optional[int] = None
+    """How likely a TeX file is the main file of the source, see
+    `submit_ce.file_store.tex_detect`. `None` for other files and in manifests written
+    before it was recorded."""
+
+    @classmethod
+    def from_head(
+        cls, name: str, size: int, checksum: str, mtime: Optional[float], head: bytes
+    ) -> "ManifestEntry":
+        """Entry for a file with its type and main file score detected from the first
+        `HEAD_SIZE` bytes, `head`."""
+        file_type = detect_file_type(name, head[: file_types.DETECT_SIZE])
+        return cls(
+            name=name,
+            size=size,
+            checksum=checksum,
+            mtime=mtime,
+            file_type=file_type,
+            main_score=main_file_score(name, file_type, head),
+        )
+
+
+Manifest = Dict[str, ManifestEntry]
+"""Manifest entries by name."""
+
+
+@dataclass(frozen=True)
+class SourceSummary:
+    """What is recorded on the submission about its source, see `summarize_source`."""
+
+    file_count: int
+    """Number of files in the source."""
+
+    source_size: int
+    """Total size in bytes of the unpacked source."""
+
+    source_format: Optional[str]
+    """Format of the source, see `submit_ce.file_store.file_types.source_format`."""
+
+    main_files: Tuple[str, ...] = ()
+    """Files that may be the main TeX file, the most likely first."""
+
+
+def read_manifest(path: Path) -> Optional[Manifest]:
+    """Read the manifest at `path`, `None` if there is none."""
+    try:
+        with open(path) as f:
+            entries = [ManifestEntry(**json.loads(line)) for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    return {entry.name: entry for entry in entries}
+
+
+def write_manifest(path: Path, manifest: Manifest) -> None:
+    """Write `manifest` to `path`, replacing any manifest there atomically."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        for name in sorted(manifest):
+            f.write(json.dumps(asdict(manifest[name]), separators=(",", ":")))
+            f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def manifest_size(entries: Iterable[ManifestEntry]) -> int:
+    """Total size in bytes of the files of a manifest."""
+    return sum(entry.size for entry in entries)
+
+
+def manifest_checksum(entries: Iterable[ManifestEntry], algorithm: str) -> str:
+    """Checksum of a source tree from the names, sizes and checksums of its files.
+
+    Changes whenever a file is added, removed or changed, and is computed without
+    reading the files."""
+    hasher = MultiHasher([algorithm])
+    for entry in sorted(entries, key=lambda entry: entry.name):
+        hasher.update(f"{entry.name}\0{entry.size}\0{entry.checksum}\n".encode("utf-8"))
+    return hasher.checksum
+
+
+def summarize_source(entries: Iterable[ManifestEntry]) -> SourceSummary:
+    """Size, file count, format and main files of a source from its manifest, without
+    reading the files."""
+    entries = list(entries)
+    return SourceSummary(
+        file_count=len(entries),
+        source_size=manifest_size(entries),
+        source_format=source_format(entry.file_type for entry in entries),
+        main_files=tuple(rank_main_files(entries)),
+    )
@@ -0,0 +1,1240 @@
+"""Submission files in an S3 compatible object store.
+
+`ObjectFileStore` keeps the files in a bucket so any number of nodes can serve them
+without a shared volume. It is written against the few methods of a boto3 S3 client it
+needs, see `ObjectStoreClient`, so it works with S3, MinIO and Ceph, and tests can use a
+fake.
+
+The objects of a submission are under ``{prefix}{shard}/{id}/``:
+
+- ``source.json``, the source of the submission: the package and, for each file, its
+  size, checksum and the key of the object with its content. Only this object says what
+  the live source is.
+- ``objects/{uuid}``, the content of each file of the source. A changed file gets a new
+  key, so content objects are never overwritten.
+- ``package/{uuid}.tar.gz`` and so on, the package as it was uploaded, and
+  ``package/built-{checksum}.tar.gz``, a package made from the files after single files
+  were changed.
+- ``{id}.pdf``, the preview.
+- ``upload.json`` and ``upload/{offset}``, a resumable upload in progress, one object
+  per chunk.
+- ``lease.json``, see `submit_ce.file_store.lease`.
+
+An upload streams the package into a multipart upload with several parts in flight at
+once while the package is extracted, through a small local scratch directory, into
+content objects. Publishing writes ``source.json``, which is a single atomic PUT, and
+the objects it no longer refers to are deleted in the background.
+
+Checksums are stored as object metadata, ``checksum-{algorithm}``, and in
+``source.json``. Files are served with ranged GETs so a Range request only fetches the
+bytes asked for.
+"""
+
+import asyncio
+import functools
+import gzip
+import json
+import logging
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+from concurrent import futures
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+from typing import (
+    IO,
+    Optional,
+    Sequence,
+    Dict,
+    List,
+    Tuple,
+    AsyncIterator,
+    Protocol,
+    Callable,
+    TypeVar,
+)
+
+from submit_ce.file_store import SubmissionFileStore, SecurityError, StoredFile
+from submit_ce.file_store.checksum import (
+    MultiHasher,
+    validate_algorithms,
+    DEFAULT_READ_SIZE,
+)
+from submit_ce.file_store.extract import (
+    PackageExtractor,
+    ExtractionLimits,
+    ExtractionError,
+    FileModes,
+    TeeReader,
+    TeeWriter,
+    PushbackReader,
+    AsyncIteratorReader,
+    detect_package_format,
+    safe_member_path,
+    DETECT_SIZE,
+    TAR_GZ,
+    SINGLE_FILE,
+)
+from submit_ce.file_store.lease import LeaseFile
+from submit_ce.file_store.legacy_file_store import PACKAGE_SUFFIXES
+from submit_ce.file_store.manifest import (
+    ManifestEntry,
+    manifest_checksum,
+    SourceSummary,
+    summarize_source,
+    HEAD_SIZE,
+)
+from submit_ce.file_store.upload import (
+    UploadState,
+    UploadError,
+    UploadNotFound,
+    UploadOffsetMismatch,
+    UploadTooLarge,
+    UploadChecksumMismatch,
+    new_chunk_hash,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MIN_PART_SIZE = 5 * 1024**2
+"""Smallest part S3 accepts in a multipart upload, other than the last part."""
+
+_NOT_FOUND = ("404", "NoSuchKey", "NotFound", "NoSuchUpload")
+
+
+class ObjectStoreClient(Protocol):
+    """The methods of a boto3 S3 client that `ObjectFileStore` uses."""
+
+    def head_bucket(self, *, Bucket: str) -> dict: ...
+    def head_object(self, *, Bucket: str, Key: str) -> dict: ...
+    def get_object(self, *, Bucket: str, Key: str, **kwargs) -> dict: ...
+    def put_object(self, *, Bucket: str, Key: str, Body: bytes, **kwargs) -> dict: ...
+    def copy_object(
+        self, *, Bucket: str, Key: str, CopySource: dict, **kwargs
+    ) -> dict: ...
+    def delete_objects(self, *, Bucket: str, Delete: dict) -> dict: ...
+    def list_objects_v2(self, *, Bucket: str, Prefix: str, **kwargs) -> dict: ...
+    def create_multipart_upload(self, *, Bucket: str, Key: str, **kwargs) -> dict: ...
+    def upload_part(
+        self, *, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes
+    ) -> dict: ...
+    def complete_multipart_upload(
+        self, *, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict
+    ) -> dict: ...
+    def abort_multipart_upload(
+        self, *, Bucket: str, Key: str, UploadId: str
+    ) -> dict: ...
+
+
+def is_not_found(ex: Exception) -> bool:
+    """Whether `ex`, a botocore ``ClientError`` or the like, is for a missing object."""
+    return getattr(ex, "response", {}).get("Error", {}).get("Code") in _NOT_FOUND
+
+
+SOURCE_CHECKSUM_METADATA = "source-checksum"
+"""Metadata of the preview with the checksum of the source it was made from."""
+
+
+def checksum_metadata(checksums: Dict[str, str]) -> Dict[str, str]:
+    """Object metadata for checksums by algorithm."""
+    return {
+        f"checksum-{algorithm}": checksum for algorithm, checksum in checksums.items()
+    }
+
+
+class MultipartWriter:
+    """Binary writer that uploads what is written to it to `key`, in parts of
+    `part_size`.
+
+    Up to `max_in_flight` parts are uploaded at once in `pool`, a write waits when that
+    many are in flight, so memory stays under ``part_size * (max_in_flight + 1)``. An
+    object no larger than one part is sent with a single PUT when the writer is closed.
+
+    `pool` must not be the pool the writer is used from, or the writer could wait on
+    parts that never run."""
+
+    def __init__(
+        self,
+        client: ObjectStoreClient,
+        bucket: str,
+        key: str,
+        pool: Executor,
+        part_size: int = 8 * 1024**2,
+        max_in_flight: int = 4,
+        content_type: Optional[str] = None,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.pool = pool
+        self.part_size = part_size
+        self.content_type = content_type or "application/octet-stream"
+        self.size = 0
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[futures.Future] = []
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+            self._send_part(part)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def _send_part(self, part: bytes) -> None:
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type
+            )["UploadId"]
+        for done in [f for f in self._parts if f.done()]:
+            done.result()
+        self._slots.acquire()
+        number = len(self._parts) + 1
+        future = self.pool.submit(
+            self.client.upload_part,
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=number,
+            Body=part,
+        )
+        future.add_done_callback(lambda _: self._slots.release())
+        self._parts.append(future)
+
+    def close(self, metadata: Optional[Dict[str, str]] = None) -> None:
+        """Finish the object, with `metadata` known only now that all of it was written.
+
+        Metadata can't be changed on a multipart upload once it is started, so a
+        multipart object is copied onto itself with the metadata, which is done within
+        the object store."""
+        if self._upload_id is None:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self._buffer),
+                ContentType=self.content_type,
+                Metadata=metadata or {},
+            )
+            return
+        if self._buffer:
+            self._send_part(bytes(self._buffer))
+            self._buffer.clear()
+        parts = [
+            {"ETag": future.result()["ETag"], "PartNumber": number}
+            for number, future in enumerate(self._parts, start=1)
+        ]
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+        if metadata:
+            self.client.copy_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                CopySource={"Bucket": self.bucket, "Key": self.key},
+                Metadata=metadata,
+                MetadataDirective="REPLACE",
+                ContentType=self.content_type,
+            )
+
+    def abort(self) -> None:
+        """Drop the parts uploaded so far."""
+        if self._upload_id is None:
+            return
+        futures.wait(self._parts)
+        try:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+        except Exception as ex:
+            logger.warning("Could not abort multipart upload of %s: %s", self.key, ex)
+
+
+class ObjectReader:
+    """Blocking reader of the objects `keys` one after the other, as if they were one
+    file."""
+
+    def __init__(self, client: ObjectStoreClient, bucket: str, keys: Sequence[str]):
+        self.client = client
+        self.bucket = bucket
+        self._keys = list(keys)
+        self._body = None
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._body is None:
+                if not self._keys:
+                    return b""
+                self._body = self.client.get_object(
+                    Bucket=self.bucket, Key=self._keys.pop(0)
+                )["Body"]
+            data = (
+                self._body.read(size)
+                if size is not None and size >= 0
+                else self._body.read()
+            )
+            if data:
+                return data
+            self._body = None
+
+
+class ObjectLeaseFile(LeaseFile):
+    """`LeaseFile` kept in the object `key`. Like a `LeaseFile` it is made atomic by the
+    submission row lock."""
+
+    def __init__(self, client: ObjectStoreClient, bucket: str, key: str):
+        super().__init__(None)
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+
+    def read(self) -> dict:
+        try:
+            return json.load(
+                self.client.get_object(Bucket=self.bucket, Key=self.key)["Body"]
+            )
+        except Exception as ex:
+            if not is_not_found(ex):
+                raise
+            return {"token": None, "expires": 0.0, "version": 0}
+
+    def _write(self, state: dict) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=json.dumps(state).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+
+@dataclass
+class _Source:
+    """The content of ``source.json``."""
+
+    files: Dict[str, ManifestEntry] = field(default_factory=dict)
+    keys: Dict[str, str] = field(default_factory=dict)
+    """Key of the content object of each file by name."""
+    package: Optional[dict] = None
+    """Key, size and checksums of the package as uploaded, `None` after single files
+    were changed."""
+
+    @classmethod
+    def from_json(cls, data: dict) -> "_Source":
+        files = {
+            entry["name"]: ManifestEntry(
+                **{k: v for k, v in entry.items() if k != "key"}
+            )
+            for entry in data["files"]
+        }
+        return cls(
+            files=files,
+            keys={entry["name"]: entry["key"] for entry in data["files"]},
+            package=data.get("package"),
+        )
+
+    def to_json(self) -> bytes:
+        files = [
+            {**asdict(self.files[name]), "key": self.keys[name]}
+            for name in sorted(self.files)
+        ]
+        return json.dumps(
+            {"package": self.package, "files": files}, separators=(",", ":")
+        ).encode("utf-8")
+
+
+@dataclass
+class ObjectStagedPackage:
+    """A source package written to the object store but not yet published."""
+
+    submission_id: int
+    checksum: str
+    """Checksum of the package in the primary algorithm."""
+    manifest: List[ManifestEntry]
+    """Files extracted from the package."""
+    source: _Source
+    """The source to publish, the files already there and those of the package."""
+    keys: List[str]
+    """Objects written for the package, deleted if it is discarded."""
+    package: str
+    """Name of the package file, as recorded on the submission."""
+    summary: SourceSummary
+    """Size, file count and format of the source as it will be once published."""
+
+
+class ObjectFileStore(SubmissionFileStore):
+    """Submission files in the bucket `bucket` of an S3 compatible object store, see
+    `submit_ce.file_store.object_store`.
+
+    The client is used from the threads of `io_pool`, which does the blocking calls of
+    the async methods, and of `part_pool`, which uploads the parts of multipart uploads
+    and small files. boto3 clients are thread safe."""
+
+    def __init__(
+        self,
+        client: ObjectStoreClient,
+        bucket: str,
+        prefix: str = "",
+        io_pool: Optional[Executor] = None,
+        max_io_workers: int = 4,
+        part_pool: Optional[Executor] = None,
+        max_parts_in_flight: int = 4,
+        part_size: int = 8 * 1024**2,
+        checksum_algorithms: Sequence[str] = ("md5",),
+        read_size: int = DEFAULT_READ_SIZE,
+        extraction_limits: ExtractionLimits = ExtractionLimits(),
+        scratch_dir: Optional[str] = None,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        """Prefix of all keys of the store. Ex. ``submissions/``"""
+        self.io_pool = (
+            io_pool
+            if io_pool is not None
+            else ThreadPoolExecutor(
+                max_workers=max_io_workers, thread_name_prefix="object-store-io"
+            )
+        )
+        """Bounded pool the async methods use for blocking calls so they are not done on
+        the event loop."""
+        self.part_pool = (
+            part_pool
+            if part_pool is not None
+            else ThreadPoolExecutor(
+                max_workers=max_parts_in_flight, thread_name_prefix="object-store-parts"
+            )
+        )
+        """Pool for uploads of parts and small files, separate from `io_pool` which
+        waits on them."""
+        self.max_parts_in_flight = max_parts_in_flight
+        """Parts and small files uploaded at once for each upload."""
+        self.part_size = part_size
+        """Size of the parts of multipart uploads, at least `MIN_PART_SIZE` for S3."""
+        self.checksum_algorithms = validate_algorithms(checksum_algorithms)
+        """Algorithms to compute checksums with, see `submit_ce.file_store.checksum`.
+        The first is the primary."""
+        self.read_size = read_size
+        """Size of reads when copying or hashing files."""
+        self.extraction_limits = extraction_limits
+        """Limits on the number of members and unpacked size of source packages."""
+        self.scratch_dir = scratch_dir
+        """Local directory files of a package are extracted to on their way to the
+        store, the system temp dir by default. Each file is removed once it is
+        uploaded."""
+        self._background = set()
+        """Deletes running in `io_pool`."""
+
+    # Source
+
+    async def get_source_file(
+        self, submission_id: int, path: str
+    ) -> Optional[StoredFile]:
+        """The file `path` in the source of the submission, `None` if there is no such
+        file."""
+        return await self._run_io(self._get_source_file, submission_id, path)
+
+    async def get_source_package(self, submission_id: int) -> Optional[StoredFile]:
+        """The source package of the submission, `None` if no source has been deposited.
+
+        After single files have been changed a tar.gz of the source is made and
+        stored."""
+        return await self._run_io(self._get_source_package, submission_id)
+
+    async def store_source_file(
+        self, submission_id: int, path: str, content: AsyncIterator[bytes]
+    ) -> ManifestEntry:
+        """Add or replace the single file `path` in the source of the submission.
+
+        Raises
+        ------
+        ExtractionError
+            If the file would put the source over `extraction_limits`.
+        SecurityError
+            If `path` is outside of the source directory."""
+        reader = AsyncIteratorReader(content, asyncio.get_running_loop())
+        return await self._run_io(self._store_source_file, submission_id, path, reader)
+
+    async def delete_source_file(self, submission_id: int, path: str) -> bool:
+        """Remove the single file `path` from the source of the submission, returns
+        whether there was one."""
+        return await self._run_io(self._delete_source_file, submission_id, path)
+
+    async def store_source_package(
+        self, submission_id: int, content: IO[bytes], chunk_size: Optional[int] = None
+    ) -> str:
+        """Store a source package for a submission, returns checksum.
+
+        Raises
+        ------
+        ExtractionError
+            If the package is not valid or is over `extraction_limits`.
+        SecurityError
+            If a member of the package would be outside of the source directory."""
+        staged = await self.stage_source_package(submission_id, content, chunk_size)
+        return await self.publish_staged(staged)
+
+    async def stage_source_package(
+        self, submission_id: int, content: IO[bytes], chunk_size: Optional[int] = None
+    ) -> ObjectStagedPackage:
+        """Write and extract a source package like `store_source_package` but don't
+        publish it."""
+        return await self._run_io(
+            self._stage_package,
+            getattr(content, "file", content),
+            submission_id,
+            chunk_size or self.read_size,
+            getattr(content, "filename", None),
+        )
+
+    async def publish_staged(self, staged: ObjectStagedPackage) -> str:
+        """Make a staged package the live source with a single PUT, returns checksum."""
+        return await self._run_io(self._publish_staged, staged)
+
+    def discard_staged(self, staged: ObjectStagedPackage) -> None:
+        """Drop a staged package without publishing it."""
+        self._delete_in_background(staged.keys)
+
+    def get_source_pacakge_checksum(
+        self, submission_id: int, algorithm: Optional[str] = None
+    ) -> str:
+        return self.get_source_checksum(submission_id, algorithm)
+
+    def get_source_checksum(
+        self, submission_id: int, algorithm: Optional[str] = None
+    ) -> str:
+        """Checksum of the source package, or of the manifest after single files were
+        changed."""
+        algorithm = algorithm or self.checksum_algorithms[0]
+        source = self._read_source(submission_id)
+        if source is None:
+            raise FileNotFoundError(f"No source package for submission {submission_id}")
+        if source.package is not None and algorithm in source.package["checksums"]:
+            return source.package["checksums"][algorithm]
+        if source.package is not None:
+            return self._read_checksums(source.package["key"], [algorithm])[algorithm]
+        return manifest_checksum(source.files.values(), algorithm)
+
+    def does_source_exist(self, submission_id: int) -> bool:
+        """Determine whether source has been deposited for a submission."""
+        return self._read_source(submission_id) is not None
+
+    async def list_source_files(
+        self, submission_id: int
+    ) -> Optional[List[ManifestEntry]]:
+        """The files of the source of the submission by name, `None` if no source has
+        been deposited."""
+        source = await self._run_io(self._read_source, submission_id)
+        return (
+            [source.files[name] for name in sorted(source.files)]
+            if source is not None
+            else None
+        )
+
+    # Resumable uploads
+
+    async def create_upload(
+        self, submission_id: int, length: int, filename: Optional[str] = None
+    ) -> UploadState:
+        """Start a resumable upload of `length` bytes, see
+        `submit_ce.file_store.upload`.
+
+        Each chunk is stored as an object of its own. Bytes of a chunk whose request was
+        cut off are not kept, the client continues from the end of the last whole
+        chunk."""
+        return await self._run_io(self._create_upload, submission_id, length, filename)
+
+    async def get_upload(self, submission_id: int) -> Optional[UploadState]:
+        """The upload in progress for the submission, `None` if there is none."""
+        return await self._run_io(self._get_upload, submission_id)
+
+    async def append_upload(
+        self,
+        submission_id: int,
+        offset: int,
+        content: AsyncIterator[bytes],
+        checksum: Optional[Tuple[str, bytes]] = None,
+    ) -> UploadState:
+        """Append a chunk to the upload in progress, `offset` must be the offset of the
+        upload.
+
+        Raises
+        ------
+        UploadError
+            See the subclasses in `submit_ce.file_store.upload`."""
+        reader = AsyncIteratorReader(content, asyncio.get_running_loop())
+        return await self._run_io(
+            self._append_upload, submission_id, offset, reader, checksum
+        )
+
+    async def finish_upload(self, submission_id: int) -> str:
+        """Extract and publish the completed upload, returns checksum."""
+        staged = await self.stage_upload(submission_id)
+        return await self.publish_staged(staged)
+
+    async def stage_upload(self, submission_id: int) -> ObjectStagedPackage:
+        """Extract the completed upload without publishing it, the upload is removed
+        either way."""
+        return await self._run_io(self._finish_upload, submission_id)
+
+    async def delete_upload(self, submission_id: int) -> bool:
+        """Discard the upload in progress, returns whether there was one."""
+        return await self._run_io(self._delete_upload, submission_id)
+
+    def lease_file(self, submission_id: int) -> ObjectLeaseFile:
+        """Lease and version of the files of the submission, see
+        `submit_ce.file_store.lease`."""
+        return ObjectLeaseFile(
+            self.client, self.bucket, self._key(submission_id, "lease.json")
+        )
+
+    # Preview
+
+    def store_preview(
+        self,
+        submission_id: int,
+        content: IO[bytes],
+        chunk_size: Optional[int] = None,
+        source_checksum: Optional[str] = None,
+    ) -> str:
+        """Store a preview PDF for a submission, returns checksum. `source_checksum` is
+        kept in its metadata."""
+        chunk_size = chunk_size or self.read_size
+        hasher = MultiHasher(self.checksum_algorithms)
+        writer = self._writer(self._preview_key(submission_id), "application/pdf")
+        try:
+            for chunk in iter(lambda: content.read(chunk_size), b""):
+                hasher.update(chunk)
+                writer.write(chunk)
+            metadata = checksum_metadata(hasher.checksums())
+            if source_checksum is not None:
+                metadata[SOURCE_CHECKSUM_METADATA] = source_checksum
+            writer.close(metadata)
+        except BaseException:
+            writer.abort()
+            raise
+        return hasher.checksum
+
+    def get_preview_source_checksum(self, submission_id: int) -> Optional[str]:
+        """Checksum of the source the preview was made from, from its metadata."""
+        head = self._head(self._preview_key(submission_id))
+        return (
+            head.get("Metadata", {}).get(SOURCE_CHECKSUM_METADATA)
+            if head is not None
+            else None
+        )
+
+    async def delete_preview(self, submission_id: int) -> bool:
+        """Delete the preview PDF of a submission, returns whether there was one."""
+        return await self._run_io(self._delete_preview, submission_id)
+
+    def _delete_preview(self, submission_id: int) -> bool:
+        key = self._preview_key(submission_id)
+        existed = self._head(key) is not None
+        self._delete_keys([key])
+        return existed
+
+    async def get_preview(self, submission_id: int) -> Optional[StoredFile]:
+        """The preview PDF of the submission, `None` if there is no preview."""
+        return await self._run_io(self._get_preview, submission_id)
+
+    def get_preview_checksum(
+        self, submission_id: int, algorithm: Optional[str] = None
+    ) -> str:
+        """Get the checksum of the preview PDF for a submission from its metadata."""
+        algorithm = algorithm or self.checksum_algorithms[0]
+        return self._read_checksums(self._preview_key(submission_id), [algorithm])[
+            algorithm
+        ]
+
+    def does_preview_exist(self, submission_id: int) -> bool:
+        """Determine whether a preview has been deposited for a submission."""
+        return self._head(self._preview_key(submission_id)) is not None
+
+    def is_available(self) -> bool:
+        """Determine whether the bucket can be reached."""
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+            return True
+        except Exception as ex:
+            logger.warning(
+                "Object store bucket %s is not available: %s", self.bucket, ex
+            )
+            return False
+
+    def wait_for_background(self) -> None:
+        """Wait for deletes started in the background to finish."""
+        futures.wait(list(self._background))
+
+    # Keys
+
+    def _submission_prefix(self, submission_id: int) -> str:
+        if not isinstance(submission_id, int):
+            raise SecurityError(
+                "Submission ID is improperly typed. This is a security concern."
+            )
+        return f"{self.prefix}{str(submission_id)[:4]}/{submission_id}/"
+
+    def _key(self, submission_id: int, name: str) -> str:
+        return self._submission_prefix(submission_id) + name
+
+    def _preview_key(self, submission_id: int) -> str:
+        return self._key(submission_id, f"{submission_id}.pdf")
+
+    def _new_object_key(self, submission_id: int) -> str:
+        return self._key(submission_id, f"objects/{uuid.uuid4().hex}")
+
+    def _upload_chunk_key(self, submission_id: int, offset: int) -> str:
+        return self._key(submission_id, f"upload/{offset:020d}")
+
+    # Object helpers
+
+    def _writer(self, key: str, content_type: Optional[str] = None) -> MultipartWriter:
+        return MultipartWriter(
+            self.client,
+            self.bucket,
+            key,
+            self.part_pool,
+            self.part_size,
+            self.max_parts_in_flight,
+            content_type,
+        )
+
+    def _head(self, key: str) -> Optional[dict]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except Exception as ex:
+            if not is_not_found(ex):
+                raise
+            return None
+
+    def _read_checksums(self, key: str, algorithms: Sequence[str]) -> Dict[str, str]:
+        """Checksums of the object `key` from its metadata, reading the object for any
+        that are missing."""
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        metadata = head.get("Metadata", {})
+        checksums = {
+            algorithm: metadata.get(f"checksum-{algorithm}") for algorithm in algorithms
+        }
+        missing = [
+            algorithm for algorithm, checksum in checksums.items() if checksum is None
+        ]
+        if missing:
+            hasher = MultiHasher(missing)
+            reader = ObjectReader(self.client, self.bucket, [key])
+            for chunk in iter(lambda: reader.read(self.read_size), b""):
+                hasher.update(chunk)
+            checksums.update(hasher.checksums())
+        return checksums
+
+    def _stored_object(
+        self, key: str, size: int, checksum: str, name: str
+    ) -> StoredFile:
+        return StoredFile(
+            path=None,
+            size=size,
+            checksum=checksum,
+            name=name,
+            read_range=functools.partial(self._read_range, key),
+        )
+
+    async def _read_range(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Stream the bytes `start` to `end`, inclusive, of `key` with a ranged GET."""
+        response = await self._run_io(
+            functools.partial(
+                self.client.get_object,
+                Bucket=self.bucket,
+                Key=key,
+                Range=f"bytes={start}-{end}",
+            )
+        )
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await self._run_io(body.read, self.read_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+    def _delete_in_background(self, keys: Sequence[str]) -> None:
+        """Delete the objects `keys` without waiting for it."""
+        keys = [key for key in keys if key]
+        if not keys:
+            return
+        future = self.io_pool.submit(self._delete_keys, keys)
+        self._background.add(future)
+        future.add_done_callback(self._background.discard)
+
+    def _delete_keys(self, keys: Sequence[str]) -> None:
+        for start in range(0, len(keys), 1000):
+            batch = keys[start : start + 1000]
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+
+    def _list_keys(self, prefix: str) -> List[Tuple[str, int]]:
+        """Keys and sizes of the objects under `prefix`, in key order."""
+        objects = []
+        kwargs = {}
+        while True:
+            response = self.client.list_objects_v2(
+                Bucket=self.bucket, Prefix=prefix, **kwargs
+            )
+            objects.extend(
+                (item["Key"], item["Size"]) for item in response.get("Contents", [])
+            )
+            if not response.get("IsTruncated"):
+                return objects
+            kwargs = {"ContinuationToken": response["NextContinuationToken"]}
+
+    # Source helpers
+
+    def _read_source(self, submission_id: int) -> Optional[_Source]:
+        try:
+            body = self.client.get_object(
+                Bucket=self.bucket, Key=self._key(submission_id, "source.json")
+            )["Body"]
+        except Exception as ex:
+            if not is_not_found(ex):
+                raise
+            return None
+        return _Source.from_json(json.load(body))
+
+    def _write_source(
+        self, submission_id: int, source: _Source, old: Optional[_Source]
+    ) -> None:
+        """Make `source` the live source and delete the objects of `old` that it does
+        not use."""
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(submission_id, "source.json"),
+            Body=source.to_json(),
+            ContentType="application/json",
+        )
+        if old is None:
+            return
+        unused = set(old.keys.values()) - set(source.keys.values())
+        if old.package is not None and old.package != source.package:
+            unused.add(old.package["key"])
+        if old.files != source.files:
+            unused.add(self._built_package_key(submission_id, old))
+        self._delete_in_background(sorted(unused))
+
+    def _built_package_key(self, submission_id: int, source: _Source) -> str:
+        checksum = manifest_checksum(source.files.values(), self.checksum_algorithms[0])
+        return self._key(
+            submission_id, f"package/built-{checksum.replace(':', '-')}.tar.gz"
+        )
+
+    def _get_source_file(self, submission_id: int, path: str) -> Optional[StoredFile]:
+        name = self._source_file_name(path)
+        source = self._read_source(submission_id)
+        if source is None or name not in source.files:
+            return None
+        entry = source.files[name]
+        return self._stored_object(
+            source.keys[name], entry.size, entry.checksum, posixpath.basename(name)
+        )
+
+    def _get_source_package(self, submission_id: int) -> Optional[StoredFile]:
+        source = self._read_source(submission_id)
+        if source is None:
+            return None
+        if source.package is not None:
+            package = source.package
+            return self._stored_object(
+                package["key"],
+                package["size"],
+                package["checksums"][self.checksum_algorithms[0]],
+                f"{submission_id}{PACKAGE_SUFFIXES[package['format']]}",
+            )
+        key = self._built_package_key(submission_id, source)
+        head = self._head(key)
+        if head is not None:
+            checksum = self._read_checksums(key, self.checksum_algorithms[:1])[
+                self.checksum_algorithms[0]
+            ]
+            return self._stored_object(
+                key, head["ContentLength"], checksum, f"{submission_id}.tar.gz"
+            )
+        hasher = MultiHasher(self.checksum_algorithms)
+        writer = self._writer(key, "application/gzip")
+        try:
+            with (
+                gzip.GzipFile(
+                    filename="",
+                    mode="wb",
+                    fileobj=TeeWriter(writer, hasher),
+                    compresslevel=6,
+                ) as gz,
+                tarfile.open(fileobj=gz, mode="w|") as tar,
+            ):
+                for name in sorted(source.files):
+                    info = tarfile.TarInfo(name)
+                    info.size = source.files[name].size
+                    tar.addfile(
+                        info,
+                        ObjectReader(self.client, self.bucket, [source.keys[name]]),
+                    )
+            writer.close(checksum_metadata(hasher.checksums()))
+        except BaseException:
+            writer.abort()
+            raise
+        return self._stored_object(
+            key, writer.size, hasher.checksum, f"{submission_id}.tar.gz"
+        )
+
+    def _store_source_file(
+        self, submission_id: int, path: str, reader: IO[bytes]
+    ) -> ManifestEntry:
+        name = self._source_file_name(path)
+        source = self._read_source(submission_id) or _Source()
+        if any(other.startswith(name + "/") for other in source.files):
+            raise SecurityError(f"Source file {name} is a directory")
+        others = [entry for entry in source.files.values() if entry.name != name]
+        if len(others) >= self.extraction_limits.max_members:
+            raise ExtractionError(
+                f"Source has more than {self.extraction_limits.max_members} files"
+            )
+        max_size = self.extraction_limits.max_total_size - sum(
+            entry.size for entry in others
+        )
+        key = self._new_object_key(submission_id)
+        hasher = MultiHasher(self.checksum_algorithms[:1])
+        writer = self._writer(key)
+        head = b""
+        try:
+            for chunk in iter(lambda: reader.read(self.read_size), b""):
+                if writer.size + len(chunk) > max_size:
+                    raise ExtractionError(
+                        "Source is larger than "
+                        f"{self.extraction_limits.max_total_size} bytes"
+                    )
+                hasher.update(chunk)
+                if len(head) < HEAD_SIZE:
+                    head += chunk[: HEAD_SIZE - len(head)]
+                writer.write(chunk)
+            writer.close(checksum_metadata(hasher.checksums()))
+        except BaseException:
+            writer.abort()
+            raise
+        entry = ManifestEntry.from_head(
+            name, writer.size, hasher.checksum, time.time(), head
+        )
+        new = _Source(
+            files={**source.files, name: entry}, keys={**source.keys, name: key}
+        )
+        self._write_source(submission_id, new, source)
+        return entry
+
+    def _delete_source_file(self, submission_id: int, path: str) -> bool:
+        name = self._source_file_name(path)
+        source = self._read_source(submission_id)
+        if source is None or name not in source.files:
+            return False
+        new = _Source(
+            files={k: v for k, v in source.files.items() if k != name},
+            keys={k: v for k, v in source.keys.items() if k != name},
+        )
+        self._write_source(submission_id, new, source)
+        return True
+
+    @staticmethod
+    def _source_file_name(path: str) -> str:
+        name = safe_member_path(path)
+        if not name:
+            raise SecurityError("Path of a source file must not be empty")
+        return name
+
+    def _stage_package(
+        self,
+        reader: IO[bytes],
+        submission_id: int,
+        read_size: int,
+        filename: Optional[str] = None,
+    ) -> ObjectStagedPackage:
+        """Stream `reader` to a package object and extract its files into content
+        objects in one pass.
+
+        The files are written to a scratch directory by `PackageExtractor`, which checks
+        the limits and paths, and each is uploaded and removed as soon as it is
+        written."""
+        source = self._read_source(submission_id) or _Source()
+        reader = PushbackReader(reader)
+        package_format = detect_package_format(reader.peek(DETECT_SIZE))
+        stored_format = TAR_GZ if package_format == SINGLE_FILE else package_format
+        package_key = self._key(
+            submission_id,
+            f"package/{uuid.uuid4().hex}{PACKAGE_SUFFIXES[stored_format]}",
+        )
+        keys: Dict[str, str] = {}
+        uploads: List[futures.Future] = []
+        slots = threading.BoundedSemaphore(self.max_parts_in_flight)
+        hasher = MultiHasher(self.checksum_algorithms)
+        package = self._writer(package_key)
+        scratch = tempfile.mkdtemp(prefix="object-store-", dir=self.scratch_dir)
+
+        def upload_file(path, entry: ManifestEntry) -> None:
+            key = self._new_object_key(submission_id)
+            keys[entry.name] = key
+            if entry.size > self.part_size:
+                self._upload_file(path, key, entry)
+                return
+            for done in [f for f in uploads if f.done()]:
+                done.result()
+            slots.acquire()
+            future = self.part_pool.submit(self._upload_file, path, key, entry)
+            future.add_done_callback(lambda _: slots.release())
+            uploads.append(future)
+
+        try:
+            modes = FileModes(
+                file_mode=0o600, dir_mode=0o700, uid=os.geteuid(), gid=os.getegid()
+            )
+            if package_format != SINGLE_FILE:
+                extractor = PackageExtractor(
+                    scratch,
+                    modes,
+                    self.extraction_limits,
+                    self.checksum_algorithms[0],
+                    read_size,
+                    on_file=upload_file,
+                )
+                tee = TeeReader(reader, package, hasher)
+                manifest = extractor.extract(tee, package_format)
+                tee.drain(read_size)
+            else:
+                with (
+                    gzip.GzipFile(
+                        filename="",
+                        mode="wb",
+                        fileobj=TeeWriter(package, hasher),
+                        compresslevel=6,
+                    ) as compressed,
+                    tarfile.open(fileobj=compressed, mode="w|") as repack,
+                ):
+
+                    def repack_and_upload(path, entry):
+                        repack.add(path, entry.name)
+                        upload_file(path, entry)
+
+                    extractor = PackageExtractor(
+                        scratch,
+                        modes,
+                        self.extraction_limits,
+                        self.checksum_algorithms[0],
+                        read_size,
+                        on_file=repack_and_upload,
+                    )
+                    manifest = extractor.extract(reader, package_format, filename)
+            for future in uploads:
+                future.result()
+            package.close(checksum_metadata(hasher.checksums()))
+        except BaseException:
+            futures.wait(uploads)
+            package.abort()
+            self._delete_in_background(list(keys.values()))
+            raise
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        new = _Source(
+            files=dict(source.files),
+            keys=dict(source.keys),
+            package={
+                "key": package_key,
+                "format": stored_format,
+                "size": package.size,
+                "checksums": hasher.checksums(),
+            },
+        )
+        for entry in manifest:
+            new.files[entry.name] = entry
+            new.keys[entry.name] = keys[entry.name]
+        return ObjectStagedPackage(
+            submission_id=submission_id,
+            checksum=hasher.checksum,
+            manifest=manifest,
+            source=new,
+            keys=[package_key, *keys.values()],
+            package=f"{submission_id}{PACKAGE_SUFFIXES[stored_format]}",
+            summary=summarize_source(new.files.values()),
+        )
+
+    def _upload_file(self, path: str, key: str, entry: ManifestEntry) -> None:
+        """Upload the extracted file at `path` to `key` with its checksum as metadata,
+        then remove it."""
+        metadata = checksum_metadata({self.checksum_algorithms[0]: entry.checksum})
+        try:
+            with open(path, "rb") as f:
+                if entry.size <= self.part_size:
+                    self.client.put_object(
+                        Bucket=self.bucket,
+                        Key=key,
+                        Body=f.read(),
+                        Metadata=metadata,
+                        ContentType="application/octet-stream",
+                    )
+                    return
+                writer = self._writer(key)
+                try:
+                    for chunk in iter(lambda: f.read(self.read_size), b""):
+                        writer.write(chunk)
+                    writer.close(metadata)
+                except BaseException:
+                    writer.abort()
+                    raise
+        finally:
+            os.unlink(path)
+
+    def _publish_staged(self, staged: ObjectStagedPackage) -> str:
+        old = self._read_source(staged.submission_id)
+        self._write_source(staged.submission_id, staged.source, old)
+        return staged.checksum
+
+    # Upload helpers
+
+    def _create_upload(
+        self, submission_id: int, length: int, filename: Optional[str]
+    ) -> UploadState:
+        self._delete_upload(submission_id)
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(submission_id, "upload.json"),
+            Body=json.dumps({"length": length, "filename": filename}).encode("utf-8"),
+            ContentType="application/json",
+        )
+        return UploadState(offset=0, length=length, filename=filename)
+
+    def _get_upload(self, submission_id: int) -> Optional[UploadState]:
+        try:
+            body = self.client.get_object(
+                Bucket=self.bucket, Key=self._key(submission_id, "upload.json")
+            )["Body"]
+        except Exception as ex:
+            if not is_not_found(ex):
+                raise
+            return None
+        state = json.load(body)
+        offset = sum(
+            size for _, size in self._list_keys(self._key(submission_id, "upload/"))
+        )
+        return UploadState(
+            offset=offset, length=state["length"], filename=state.get("filename")
+        )
+
+    def _append_upload(
+        self,
+        submission_id: int,
+        offset: int,
+        reader: IO[bytes],
+        checksum: Optional[Tuple[str, bytes]],
+    ) -> UploadState:
+        state = self._get_upload(submission_id)
+        if state is None:
+            raise UploadNotFound(
+                f"No upload in progress for submission {submission_id}"
+            )
+        if offset != state.offset:
+            raise UploadOffsetMismatch(
+                f"Upload is at offset {state.offset}, not {offset}"
+            )
+        chunk_hash = new_chunk_hash(checksum)
+        writer = self._writer(self._upload_chunk_key(submission_id, offset))
+        try:
+            for chunk in iter(lambda: reader.read(self.read_size), b""):
+                if offset + writer.size + len(chunk) > state.length:
+                    raise UploadTooLarge(
+                        f"Upload is longer than its length of {state.length} bytes"
+                    )
+                writer.write(chunk)
+                if chunk_hash is not None:
+                    chunk_hash.update(chunk)
+            if chunk_hash is not None and chunk_hash.digest() != checksum[1]:
+                raise UploadChecksumMismatch(
+                    f"{checksum[0]} digest of the chunk does not match Upload-Checksum"
+                )
+            if writer.size:
+                writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+        return UploadState(
+            offset=offset + writer.size, length=state.length, filename=state.filename
+        )
+
+    def _finish_upload(self, submission_id: int) -> ObjectStagedPackage:
+        state = self._get_upload(submission_id)
+        if state is None:
+            raise UploadNotFound(
+                f"No upload in progress for submission {submission_id}"
+            )
+        if not state.complete:
+            raise UploadError(f"Upload has {state.offset} of {state.length} bytes")
+        try:
+            chunks = [
+                key for key, _ in self._list_keys(self._key(submission_id, "upload/"))
+            ]
+            return self._stage_package(
+                ObjectReader(self.client, self.bucket, chunks),
+                submission_id,
+                self.read_size,
+                state.filename,
+            )
+        finally:
+            self._delete_upload(submission_id)
+
+    def _delete_upload(self, submission_id: int) -> bool:
+        state_key = self._key(submission_id, "upload.json")
+        existed = self._head(state_key) is not None
+        self._delete_keys(
+            [
+                state_key,
+                *(
+                    key
+                    for key, _ in self._list_keys(self._key(submission_id, "upload/"))
+                ),
+            ]
+        )
+        return existed
+
+    def _get_preview(self, submission_id: int) -> Optional[StoredFile]:
+        key = self._preview_key(submission_id)
+        head = self._head(key)
+        if head is None:
+            return None
+        checksum = (
+            head.get("Metadata", {}).get(f"checksum-{self.checksum_algorithms[0]}")
+            or self._read_checksums(key, self.checksum_algorithms[:1])[
+                self.checksum_algorithms[0]
+            ]
+        )
+        return self._stored_object(
+            key, head["ContentLength"], checksum, f"{submission_id}.pdf"
+        )
+
+    async def _run_io(self, fn: Callable[..., T], *args) -> T:
+        """Run blocking `fn` in `io_pool`."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.io_pool, functools.partial(fn, *args)
+        )
@@ -0,0 +1,103 @@
+"""Setting the modes and owner of a tree of files that was not written by the store.
+
+Files the store writes get their mode and owner on the open file as they are written,
+see `submit_ce.file_store.extract`. This is for trees from before that, such as sources
+written by the legacy system. Most of such a tree usually has the right modes already,
+so each path is checked with one ``lstat`` and only changed where it differs, and the
+checks are spread over threads since they are mostly waiting on the disk.
+"""
+
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple, Union
+
+from submit_ce.file_store.extract import FileModes
+
+BATCH_SIZE = 256
+"""Paths checked by a thread at a time."""
+
+
+@dataclass
+class ModeChanges:
+    """What `set_tree_modes` did."""
+
+    checked: int = 0
+    """Paths checked, symlinks are skipped."""
+    chmods: int = 0
+    """Paths whose mode was changed."""
+    chowns: int = 0
+    """Paths whose owner was changed."""
+
+    def add(self, other: "ModeChanges") -> None:
+        self.checked += other.checked
+        self.chmods += other.chmods
+        self.chowns += other.chowns
+
+
+def set_tree_modes(
+    root: Union[str, Path], modes: FileModes, workers: int = 8
+) -> ModeChanges:
+    """Give the tree at `root`, `root` included, the modes and owner of `modes`,
+    changing only what differs.
+
+    The tree is listed with ``os.scandir``, whose entries know whether they are
+    directories without a stat, while `workers` threads check and fix batches of
+    `BATCH_SIZE` paths."""
+    changes = ModeChanges()
+    if not os.path.isdir(root):
+        changes.add(_set_modes([(str(root), False)], modes))
+        return changes
+    with ThreadPoolExecutor(
+        max_workers=max(1, workers), thread_name_prefix="file-store-modes"
+    ) as pool:
+        results = [
+            pool.submit(_set_modes, batch, modes) for batch in _batches(str(root))
+        ]
+        for result in results:
+            changes.add(result.result())
+    return changes
+
+
+def _batches(root: str):
+    """Batches of the paths of the tree at `root` with whether each is a directory,
+    symlinks left out."""
+    batch: List[Tuple[str, bool]] = [(root, True)]
+    directories = [root]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_symlink():
+                    continue
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if is_dir:
+                    directories.append(entry.path)
+                batch.append((entry.path, is_dir))
+                if len(batch) == BATCH_SIZE:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def _set_modes(batch: List[Tuple[str, bool]], modes: FileModes) -> ModeChanges:
+    changes = ModeChanges()
+    file_mode, dir_mode = stat.S_IMODE(modes.file_mode), stat.S_IMODE(modes.dir_mode)
+    for path, is_dir in batch:
+        st = os.lstat(path)
+        if stat.S_ISLNK(st.st_mode):
+            continue
+        changes.checked += 1
+        chowned = st.st_uid != modes.uid or st.st_gid != modes.gid
+        if chowned:
+            os.chown(path, modes.uid, modes.gid, follow_symlinks=False)
+            changes.chowns += 1
+        mode = dir_mode if is_dir else file_mode
+        if (
+            chowned or stat.S_IMODE(st.st_mode) != mode
+        ):  # chown may clear the setgid bit
+            os.chmod(path, mode)
+            changes.chmods += 1
+    return changes
@@ -0,0 +1,85 @@
+"""Which TeX file of a source is the main one, the file that is compiled.
+
+Like the file types, this looks only at the first `HEAD_SIZE` bytes of each TeX file,
+which the store has in hand as the file is written. Each TeX file gets a score in its
+manifest entry when it is written, so the main files of a source of thousands of files
+are ranked from the manifest without opening any file.
+"""
+
+import posixpath
+import re
+from typing import Iterable, List, Optional, TYPE_CHECKING
+
+from submit_ce.file_store.file_types import TEX
+
+if TYPE_CHECKING:
+    from submit_ce.file_store.manifest import ManifestEntry
+
+HEAD_SIZE = 4096
+"""Bytes of the start of a TeX file looked at. The preamble up to ``\\begin{document}``
+is usually shorter."""
+
+_DOCUMENTCLASS = re.compile(
+    rb"\\document(?:class|style)\s*(?:\[[^\]]*\])?\s*\{\s*([^}\s]*)\s*\}"
+)
+_BEGIN_DOCUMENT = re.compile(rb"\\begin\s*\{document\}")
+_PDFOUTPUT = re.compile(rb"\\pdfoutput\s*=\s*1")
+_MAIN_NAMES = ("main", "ms", "paper", "article", "manuscript")
+_PART_CLASSES = (b"subfiles", b"standalone")
+"""Classes of parts of a document that are compiled on their own as well as input by the
+main file."""
+
+
+def main_file_score(name: str, file_type: Optional[str], head: bytes) -> Optional[int]:
+    """How likely the file `name` is the main file of a TeX source, from the first
+    `HEAD_SIZE` bytes of it, `head`.
+
+    0 for a TeX file that cannot be the main file and `None` for any other file. A
+    ``\\documentclass`` counts the most, then ``\\begin{document}`` and
+    ``\\pdfoutput=1``. A file at the top of the source or with a name like ``main.tex``
+    breaks ties."""
+    if file_type != TEX:
+        return None
+    if b"\\document" not in head and b"\\begin" not in head:
+        return 0
+    documentclass = _search(_DOCUMENTCLASS, head)
+    begin_document = _search(_BEGIN_DOCUMENT, head) is not None
+    if documentclass is None and not begin_document:
+        return 0
+    pdfoutput = _search(_PDFOUTPUT, head) is not None
+    score = 8 if documentclass is not None else 0
+    if documentclass is not None and documentclass.group(1) in _PART_CLASSES:
+        score -= 6
+    score += 4 if begin_document else 0
+    score += 1 if pdfoutput else 0
+    score += 1 if "/" not in name else 0
+    score += (
+        1
+        if posixpath.splitext(posixpath.basename(name))[0].lower() in _MAIN_NAMES
+        else 0
+    )
+    return score
+
+
+def _search(pattern: re.Pattern, head: bytes) -> Optional[re.Match]:
+    """First match of `pattern` in `head` that is not in a TeX comment.
+
+    Only the lines with a match are checked for comments, most of a head is not looked
+    at twice."""
+    for match in pattern.finditer(head):
+        line = head[head.rfind(b"\n", 0, match.start()) + 1 : match.start()]
+        if b"%" not in line.replace(b"\\%", b""):
+            return match
+    return None
+
+
+def rank_main_files(entries: Iterable["ManifestEntry"]) -> List[str]:
+    """Names of the files that may be the main file of a source, the most likely first.
+
+    Files with the same score are ordered by depth and then name, so the result does not
+    depend on the order of the manifest."""
+    candidates = [entry for entry in entries if entry.main_score]
+    candidates.sort(
+        key=lambda entry: (-entry.main_score, entry.name.count("/"), entry.name)
+    )
+    return [entry.name for entry in candidates]
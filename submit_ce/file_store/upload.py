@@ -0,0 +1,110 @@
+"""Resumable uploads of source packages.
+
+An upload is created with the length of the package, then the package is sent in chunks,
+each appended at the offset the store has so far. If a connection drops the client asks
+for the offset and continues from there. Each chunk may carry a digest that is checked
+before the chunk is accepted. When the last byte arrives the package is extracted from
+the staged file, which is then renamed to the package path.
+
+The protocol follows the core of tus (https://tus.io/protocols/resumable-upload), with
+one upload per submission.
+"""
+
+import base64
+import binascii
+import hashlib
+from dataclasses import dataclass
+from typing import Optional, Tuple, Dict
+
+UPLOAD_CHECKSUM_ALGORITHMS = ("md5", "sha1", "sha256", "sha512", "blake2b")
+"""Algorithms accepted for the digest of a chunk."""
+
+
+class UploadError(ValueError):
+    """An upload request that can't be applied."""
+
+
+class UploadNotFound(UploadError):
+    """There is no upload in progress for the submission."""
+
+
+class UploadOffsetMismatch(UploadError):
+    """A chunk was sent for an offset other than the offset of the upload."""
+
+
+class UploadTooLarge(UploadError):
+    """More bytes were sent than the length of the upload."""
+
+
+class UploadChecksumMismatch(UploadError):
+    """The digest of a chunk does not match the digest sent with it."""
+
+
+@dataclass(frozen=True)
+class UploadState:
+    """An upload in progress."""
+
+    offset: int
+    """Bytes received so far."""
+
+    length: int
+    """Size of the whole package in bytes."""
+
+    filename: Optional[str] = None
+    """Name of the uploaded file, used if it is a single file."""
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == self.length
+
+
+def parse_upload_checksum(header: Optional[str]) -> Optional[Tuple[str, bytes]]:
+    """Algorithm and digest of an ``Upload-Checksum`` header of the form ``{algorithm}
+    {base64 digest}``.
+
+    Raises
+    ------
+    UploadError
+        If the header can't be parsed or the algorithm is not supported."""
+    if not header:
+        return None
+    try:
+        algorithm, encoded = header.split()
+        digest = base64.b64decode(encoded, validate=True)
+    except (ValueError, binascii.Error):
+        raise UploadError(
+            f"Upload-Checksum must be '{{algorithm}} {{base64 digest}}', not '{header}'"
+        )
+    if algorithm not in UPLOAD_CHECKSUM_ALGORITHMS:
+        raise UploadError(
+            "Upload-Checksum algorithm must be one of "
+            f"{list(UPLOAD_CHECKSUM_ALGORITHMS)}"
+        )
+    return algorithm, digest
+
+
+def parse_upload_metadata(header: Optional[str]) -> Dict[str, str]:
+    """Values of an ``Upload-Metadata`` header, comma separated ``{key} {base64 value}``
+    pairs.
+
+    Raises
+    ------
+    UploadError
+        If the header can't be parsed."""
+    metadata = {}
+    for pair in (header or "").split(","):
+        if not pair.strip():
+            continue
+        key, _, encoded = pair.strip().partition(" ")
+        try:
+            metadata[key] = base64.b64decode(encoded, validate=True).decode("utf-8")
+        except (ValueError, binascii.Error):
+            raise UploadError(
+                f"Upload-Metadata value for {key} must be base64 encoded UTF-8"
+            )
+    return metadata
+
+
+def new_chunk_hash(checksum: Optional[Tuple[str, bytes]]):
+    """Hash object for the algorithm of `checksum`, `None` if there is no checksum."""
+    return hashlib.new(checksum[0]) if checksum is not None else None
@@ -0,0 +1,80 @@
+"""Jobs that are done after a request returns, such as unpacking an uploaded package.
+
+A request enqueues a `Job` on a `JobQueue` and returns. Workers, see
+`submit_ce.jobs.worker`, claim jobs from the queue and run the handler for the kind of
+the job. The state of the latest job of a submission is shown with the submission so a
+client can tell when its upload is processed.
+"""
+
+from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobFailed(RuntimeError):
+    """Raised by a handler for a job that cannot succeed, it is not retried."""
+
+
+@dataclass(frozen=True)
+class Job:
+    """A unit of work on a submission."""
+
+    job_id: int
+    kind: str
+    """Which handler runs the job. Ex. process_upload"""
+    submission_id: int
+    state: str
+    """`QUEUED`, `RUNNING`, `DONE` or `FAILED`."""
+    attempts: int
+    """Times the job was claimed, a job whose worker died is claimed again."""
+    created: float
+    """Unix timestamp of when the job was enqueued."""
+    updated: float
+    """Unix timestamp of the last change of state."""
+    error: Optional[str] = None
+    """Why the job failed."""
+    result: Optional[str] = None
+    """Result of the handler as JSON."""
+
+
+class JobQueue(metaclass=ABCMeta):
+
+    @abstractmethod
+    def enqueue(self, kind: str, submission_id: int) -> Job:
+        """Add a job, or return the job of `kind` for the submission that is still
+        queued.
+
+        A job reads the current state of the submission when it runs, so one queued job
+        covers any number of requests made before it starts."""
+        ...
+
+    @abstractmethod
+    def claim(self, worker: str) -> Optional[Job]:
+        """Take the oldest queued job to run, `None` if there is none. Safe to call from
+        any number of processes."""
+        ...
+
+    @abstractmethod
+    def complete(self, job: Job, result: Optional[str] = None) -> None:
+        """Record that `job` finished, `result` is JSON."""
+        ...
+
+    @abstractmethod
+    def fail(self, job: Job, error: str, retry: bool = False) -> None:
+        """Record that `job` failed. With `retry` it is queued again unless it has run
+        out of attempts."""
+        ...
+
+    @abstractmethod
+    def get(self, job_id: int) -> Optional[Job]: ...
+
+    @abstractmethod
+    def latest(self, submission_id: int, kind: Optional[str] = None) -> Optional[Job]:
+        """The most recently enqueued job of the submission, of `kind` if given, `None`
+        if there is none."""
+        ...
@@ -0,0 +1,162 @@
+"""A `JobQueue` in a SQLite file, for workers on the same host as the API.
+
+It needs no service. Processes share the queue through the file, each call opens its own
+connection, so the queue can be handed to worker processes by its path. A job is claimed
+in an immediate transaction, which takes the write lock of the database, so only one
+worker gets it. A job that stays running longer than `stale_seconds`, because its worker
+died, is claimed again up to `max_attempts` times.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Iterator, Union
+
+from submit_ce.jobs import Job, JobQueue, QUEUED, RUNNING, DONE, FAILED
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    submission_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, job_id);
+CREATE INDEX IF NOT EXISTS jobs_submission ON jobs (submission_id, job_id);
+"""
+
+_COLUMNS = (
+    "job_id, kind, submission_id, state, attempts, created, updated, error, result"
+)
+
+
+class SqliteJobQueue(JobQueue):
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        stale_seconds: float = 30 * 60,
+        max_attempts: int = 3,
+        timeout: float = 30.0,
+    ):
+        self.path = str(path)
+        """Database file, created if it does not exist."""
+        self.stale_seconds = stale_seconds
+        """Seconds after which a running job is taken to have lost its worker."""
+        self.max_attempts = max_attempts
+        """Times a job is claimed before it is failed."""
+        self.timeout = timeout
+        """Seconds to wait for the write lock of the database."""
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    def enqueue(self, kind: str, submission_id: int) -> Job:
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE submission_id = ? AND kind = ? AND "
+                "state = ? "
+                f"ORDER BY job_id DESC LIMIT 1",
+                (submission_id, kind, QUEUED),
+            ).fetchone()
+            if row is not None:
+                return Job(*row)
+            row = db.execute(
+                f"INSERT INTO jobs (kind, submission_id, state, created, updated) "
+                f"VALUES (?, ?, ?, ?, ?) RETURNING {_COLUMNS}",
+                (kind, submission_id, QUEUED, now, now),
+            ).fetchone()
+        return Job(*row)
+
+    def claim(self, worker: str) -> Optional[Job]:
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET state = ?, error = 'Worker stopped before the job "
+                "finished', updated = ? "
+                "WHERE state = ? AND updated < ? AND attempts >= ?",
+                (FAILED, now, RUNNING, now - self.stale_seconds, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT job_id FROM jobs WHERE state = ? OR (state = ? AND updated < "
+                "?) "
+                "ORDER BY job_id LIMIT 1",
+                (QUEUED, RUNNING, now - self.stale_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            row = db.execute(
+                "UPDATE jobs SET state = ?, worker = ?, attempts = attempts + 1, "
+                "updated = ? "
+                f"WHERE job_id = ? RETURNING {_COLUMNS}",
+                (RUNNING, worker, now, row[0]),
+            ).fetchone()
+        return Job(*row)
+
+    def complete(self, job: Job, result: Optional[str] = None) -> None:
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = NULL, updated = ? "
+                "WHERE job_id = ?",
+                (DONE, result, time.time(), job.job_id),
+            )
+
+    def fail(self, job: Job, error: str, retry: bool = False) -> None:
+        state = QUEUED if retry and job.attempts < self.max_attempts else FAILED
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE job_id = ?",
+                (state, error, time.time(), job.job_id),
+            )
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._connect() as db:
+            row = db.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return Job(*row) if row is not None else None
+
+    def latest(self, submission_id: int, kind: Optional[str] = None) -> Optional[Job]:
+        with self._connect() as db:
+            if kind is None:
+                row = db.execute(
+                    f"SELECT {_COLUMNS} FROM jobs WHERE submission_id = ? ORDER BY "
+                    "job_id DESC LIMIT 1",
+                    (submission_id,),
+                ).fetchone()
+            else:
+                row = db.execute(
+                    f"SELECT {_COLUMNS} FROM jobs WHERE submission_id = ? AND kind = ? "
+                    f"ORDER BY job_id DESC LIMIT 1",
+                    (submission_id, kind),
+                ).fetchone()
+        return Job(*row) if row is not None else None
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """A transaction that holds the write lock from its start, so a read and the
+        write that depends on it are atomic across processes."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
@@ -0,0 +1,109 @@
+"""Worker processes that run the jobs of a `JobQueue` on the local host.
+
+Each process claims a job, runs the handler for its kind and records the result, and
+waits for `poll_seconds` when the queue is empty. The processes are spawned rather than
+forked so they don't inherit the threads, event loop or database connections of the API
+process. Handlers and the queue are pickled to the processes, so handlers must be module
+level functions.
+
+A handler that raises `JobFailed` fails the job. Any other exception is taken to be
+transient, a lost lock or connection, and the job is queued again until it runs out of
+attempts.
+"""
+
+import logging
+import multiprocessing
+import os
+import socket
+from typing import Callable, Dict, Optional, List
+
+from submit_ce.jobs import Job, JobQueue, JobFailed
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Job], Optional[str]]
+"""Runs a job and returns its result as JSON."""
+
+
+def run_one(
+    queue: JobQueue, handlers: Dict[str, Handler], worker: str
+) -> Optional[Job]:
+    """Claim and run one job, returns it in its new state or `None` if the queue was
+    empty."""
+    job = queue.claim(worker)
+    if job is None:
+        return None
+    handler = handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise JobFailed(f"No handler for jobs of kind {job.kind}")
+        result = handler(job)
+    except JobFailed as ex:
+        queue.fail(job, str(ex))
+    except Exception as ex:
+        logger.exception(
+            "Job %s of submission %s failed", job.job_id, job.submission_id
+        )
+        queue.fail(job, f"{type(ex).__name__}: {ex}", retry=True)
+    else:
+        queue.complete(job, result)
+    return queue.get(job.job_id)
+
+
+def work(
+    queue: JobQueue, handlers: Dict[str, Handler], stop, poll_seconds: float = 1.0
+) -> None:
+    """Run jobs until `stop`, a `multiprocessing.Event`, is set."""
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    while not stop.is_set():
+        try:
+            if run_one(queue, handlers, worker) is not None:
+                continue
+        except Exception:  # the queue itself failed, wait and try again
+            logger.exception("Could not claim a job")
+        stop.wait(poll_seconds)
+
+
+class LocalWorkers:
+    """`processes` worker processes for `queue`."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, Handler],
+        processes: int = 2,
+        poll_seconds: float = 1.0,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.processes = processes
+        self.poll_seconds = poll_seconds
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        self._processes: List[multiprocessing.Process] = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        for number in range(self.processes):
+            process = self._context.Process(
+                target=work,
+                name=f"job-worker-{number}",
+                daemon=True,
+                args=(self.queue, self.handlers, self._stop, self.poll_seconds),
+            )
+            process.start()
+            self._processes.append(process)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Stop the processes, letting jobs that are running finish for up to `timeout`
+        seconds.
+
+        A job whose process had to be terminated stays running and is claimed again once
+        it is stale."""
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._processes = []
@@ -0,0 +1,213 @@
+"""Preview PDFs of submissions, compiled from their source.
+
+`PreviewBuilder.build` compiles the source of a submission and stores the PDF with
+`store_preview`, along with the checksum of the source it was compiled from. A build of
+a source that has not changed since its preview returns the stored preview without
+compiling, and builds of the same source that overlap share one compile.
+
+Compiles run in a pool of processes, TeX is slow and a run that goes wrong should not
+take the API process with it. The compile step is a `Compiler`, see
+`submit_ce.preview.pdflatex`, tests and deployments without TeX pass their own.
+"""
+
+import asyncio
+import multiprocessing
+import shutil
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, List
+
+from submit_ce.file_store import SubmissionFileStore, StoredFile
+from submit_ce.file_store.file_types import PDF, SOURCE_PDF
+from submit_ce.file_store.manifest import summarize_source
+
+
+class CompileError(RuntimeError):
+    """The source could not be compiled into a preview, compiling it again would not
+    help."""
+
+
+Compiler = Callable[[Path, str, Path], Path]
+"""Compiles a main file, relative to a source directory, into an output directory and
+returns the path of the PDF.
+
+Raises `CompileError`. It is run in the pool of the `PreviewBuilder` so it must be
+picklable, a module level function or an instance of a module level class."""
+
+
+@dataclass(frozen=True)
+class PreviewResult:
+    """A preview that was built or was already up to date."""
+
+    checksum: str
+    """Checksum of the preview PDF."""
+    source_checksum: str
+    """Checksum of the source the preview was made from."""
+    compiled: bool
+    """Whether a preview was made from the source, `False` when the stored preview was
+    already of this source."""
+
+
+class PreviewBuilder:
+    """Builds the previews of submissions with `compiler` in `pool`."""
+
+    def __init__(
+        self,
+        compiler: Compiler,
+        pool: Optional[Executor] = None,
+        max_workers: int = 2,
+        scratch_dir: Optional[str] = None,
+    ):
+        self.compiler = compiler
+        self.max_workers = max_workers
+        self._pool = pool
+        self._owns_pool = pool is None
+        self.scratch_dir = scratch_dir
+        """Where sources are copied to be compiled, the system temporary directory if
+        `None`."""
+        self._building: Dict[Tuple[int, str], asyncio.Future] = {}
+        """Compiles in progress by submission and source checksum."""
+
+    async def build(
+        self, store: SubmissionFileStore, submission_id: int, force: bool = False
+    ) -> PreviewResult:
+        """Build the preview of the submission unless the stored one is of its current
+        source, or `force`.
+
+        Raises
+        ------
+        CompileError
+            If there is no source, it has no main file or it does not compile."""
+        if not await asyncio.to_thread(store.does_source_exist, submission_id):
+            raise CompileError(f"Submission {submission_id} has no source")
+        # Read before the files are, so a source changed during the compile leaves a
+        # preview that looks out of date.
+        source_checksum = await asyncio.to_thread(
+            store.get_source_pacakge_checksum, submission_id
+        )
+        if not force:
+            preview = await self.current_preview(store, submission_id, source_checksum)
+            if preview is not None:
+                return PreviewResult(preview.checksum, source_checksum, compiled=False)
+        key = (submission_id, source_checksum)
+        building = self._building.get(key)
+        if building is None:
+            building = asyncio.ensure_future(
+                self._build(store, submission_id, source_checksum)
+            )
+            self._building[key] = building
+            building.add_done_callback(lambda _: self._building.pop(key, None))
+        return await asyncio.shield(building)
+
+    @staticmethod
+    async def current_preview(
+        store: SubmissionFileStore, submission_id: int, source_checksum: str
+    ) -> Optional[StoredFile]:
+        """The stored preview if it was made from the source with `source_checksum`."""
+        if (
+            await asyncio.to_thread(store.get_preview_source_checksum, submission_id)
+            != source_checksum
+        ):
+            return None
+        return await store.get_preview(submission_id)
+
+    @property
+    def pool(self) -> Executor:
+        """Where compiles run, a pool of `max_workers` processes started on the first
+        compile unless one was given."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def shutdown(self) -> None:
+        """Stop the processes of the pool, another is started if there is another
+        compile."""
+        if self._owns_pool and self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _build(
+        self, store: SubmissionFileStore, submission_id: int, source_checksum: str
+    ) -> PreviewResult:
+        entries = await store.list_source_files(submission_id) or []
+        summary = summarize_source(entries)
+        pdfs = [entry.name for entry in entries if entry.file_type == PDF]
+        if summary.source_format == SOURCE_PDF and len(pdfs) == 1:
+            main_file = None
+        elif summary.main_files:
+            main_file = summary.main_files[0]
+        else:
+            raise CompileError(
+                f"No main TeX file in the source of submission {submission_id}"
+            )
+
+        with tempfile.TemporaryDirectory(
+            prefix=f"preview-{submission_id}-", dir=self.scratch_dir
+        ) as work_dir:
+            source_dir, output_dir = Path(work_dir) / "src", Path(work_dir) / "out"
+            await self._copy_source(
+                store, submission_id, [entry.name for entry in entries], source_dir
+            )
+            if main_file is None:
+                pdf = source_dir / pdfs[0]
+            else:
+                output_dir.mkdir()
+                pdf = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, self.compiler, source_dir, main_file, output_dir
+                )
+            checksum = await asyncio.to_thread(
+                _store_pdf, store, submission_id, pdf, source_checksum
+            )
+        return PreviewResult(checksum, source_checksum, compiled=True)
+
+    @staticmethod
+    async def _copy_source(
+        store: SubmissionFileStore,
+        submission_id: int,
+        names: List[str],
+        source_dir: Path,
+    ) -> None:
+        """Copy the files of the source into `source_dir`, the compiler must not write
+        into the store."""
+        local, remote = [], []
+        for name in names:
+            stored = await store.get_source_file(submission_id, name)
+            if stored is None:
+                raise CompileError(
+                    f"{name} was removed from the source of submission {submission_id}"
+                )
+            (local if stored.path is not None else remote).append((name, stored))
+        await asyncio.to_thread(
+            _copy_files, [(name, stored.path) for name, stored in local], source_dir
+        )
+        for name, stored in remote:
+            path = source_dir / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as f:
+                if stored.size:
+                    async for chunk in stored.read_range(0, stored.size - 1):
+                        await asyncio.to_thread(f.write, chunk)
+
+
+def _copy_files(files: List[Tuple[str, Path]], source_dir: Path) -> None:
+    source_dir.mkdir(exist_ok=True)
+    for name, path in files:
+        dest = source_dir / name
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, dest)
+
+
+def _store_pdf(
+    store: SubmissionFileStore, submission_id: int, pdf: Path, source_checksum: str
+) -> str:
+    try:
+        with open(pdf, "rb") as f:
+            return store.store_preview(
+                submission_id, f, source_checksum=source_checksum
+            )
+    except FileNotFoundError as ex:
+        raise CompileError(f"The compiler did not write {pdf.name}") from ex
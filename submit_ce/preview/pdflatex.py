@@ -0,0 +1,56 @@
+"""`Compiler` that runs pdflatex."""
+
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Tuple
+
+from submit_ce.preview import CompileError
+
+LOG_TAIL = 2000
+"""Characters of the end of the log put in a `CompileError`."""
+
+
+@dataclass(frozen=True)
+class PdfLatex:
+    """Runs pdflatex on the main file `runs` times so references resolve.
+
+    It runs in the directory of the main file, where its relative inputs are. Shell
+    escape is off and the run stops at the first error instead of waiting for input."""
+
+    command: str = "pdflatex"
+    runs: int = 2
+    timeout: float = 300.0
+    """Seconds each run may take."""
+    options: Tuple[str, ...] = field(
+        default=("-interaction=nonstopmode", "-halt-on-error", "-no-shell-escape")
+    )
+
+    def __call__(self, source_dir: Path, main_file: str, output_dir: Path) -> Path:
+        main = Path(main_file)
+        args = [
+            self.command,
+            *self.options,
+            f"-output-directory={output_dir.resolve()}",
+            main.name,
+        ]
+        for _ in range(self.runs):
+            try:
+                run = subprocess.run(
+                    args,
+                    cwd=source_dir / main.parent,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    timeout=self.timeout,
+                )
+            except subprocess.TimeoutExpired as ex:
+                raise CompileError(
+                    f"{main_file} did not compile in {self.timeout:g} seconds"
+                ) from ex
+            except FileNotFoundError as ex:
+                raise CompileError(f"{self.command} is not installed") from ex
+            if run.returncode != 0:
+                log = run.stdout.decode("utf-8", "replace")[-LOG_TAIL:]
+                raise CompileError(f"{main_file} did not compile:\n{log}")
+        return output_dir / (main.stem + ".pdf")
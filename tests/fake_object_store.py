@@ -0,0 +1,219 @@
+"""In memory stand-in for the boto3 S3 client methods used by
+`submit_ce.file_store.object_store`."""
+
+import io
+import threading
+import uuid
+from collections import Counter
+from typing import Dict, Optional
+
+
+class ClientError(Exception):
+    """Shaped like ``botocore.exceptions.ClientError``."""
+
+    def __init__(self, code: str, operation: str):
+        super().__init__(
+            f"An error occurred ({code}) when calling the {operation} operation"
+        )
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Client:
+    """A single bucket in memory.
+
+    Parts of a multipart upload other than the last must be at least `min_part_size`, as
+    S3 requires. `calls` counts the calls of each method and `ranges` has the Range of
+    each ranged GET."""
+
+    def __init__(self, bucket: str = "submissions", min_part_size: int = 0):
+        self.bucket = bucket
+        self.min_part_size = min_part_size
+        self.objects: Dict[str, dict] = {}
+        self.uploads: Dict[str, dict] = {}
+        self.calls = Counter()
+        self.ranges = []
+        self.max_parts_at_once = 0
+        self._parts_now = 0
+        self._lock = threading.Lock()
+
+    def _check_bucket(self, bucket: str, operation: str) -> None:
+        self.calls[operation] += 1
+        if bucket != self.bucket:
+            raise ClientError("NoSuchBucket", operation)
+
+    def _get(self, key: str, operation: str) -> dict:
+        with self._lock:
+            if key not in self.objects:
+                raise ClientError(
+                    "NoSuchKey" if operation == "GetObject" else "404", operation
+                )
+            return self.objects[key]
+
+    def head_bucket(self, *, Bucket: str) -> dict:
+        self._check_bucket(Bucket, "HeadBucket")
+        return {}
+
+    def head_object(self, *, Bucket: str, Key: str) -> dict:
+        self._check_bucket(Bucket, "HeadObject")
+        obj = self._get(Key, "HeadObject")
+        return {
+            "ContentLength": len(obj["Body"]),
+            "Metadata": dict(obj["Metadata"]),
+            "ContentType": obj["ContentType"],
+        }
+
+    def get_object(self, *, Bucket: str, Key: str, Range: Optional[str] = None) -> dict:
+        self._check_bucket(Bucket, "GetObject")
+        obj = self._get(Key, "GetObject")
+        body = obj["Body"]
+        if Range is not None:
+            self.ranges.append((Key, Range))
+            first, last = Range.removeprefix("bytes=").split("-")
+            body = body[int(first) : int(last) + 1]
+        return {
+            "Body": io.BytesIO(body),
+            "ContentLength": len(body),
+            "Metadata": dict(obj["Metadata"]),
+        }
+
+    def put_object(
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        Body: bytes,
+        Metadata: Optional[dict] = None,
+        ContentType: str = "binary/octet-stream",
+    ) -> dict:
+        self._check_bucket(Bucket, "PutObject")
+        with self._lock:
+            self.objects[Key] = {
+                "Body": bytes(Body),
+                "Metadata": dict(Metadata or {}),
+                "ContentType": ContentType,
+            }
+        return {"ETag": f'"{uuid.uuid4().hex}"'}
+
+    def copy_object(
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        CopySource: dict,
+        Metadata: Optional[dict] = None,
+        MetadataDirective: str = "COPY",
+        ContentType: Optional[str] = None,
+    ) -> dict:
+        self._check_bucket(Bucket, "CopyObject")
+        source = self._get(CopySource["Key"], "CopyObject")
+        if CopySource["Key"] == Key and MetadataDirective != "REPLACE":
+            raise ClientError("InvalidRequest", "CopyObject")
+        metadata = Metadata if MetadataDirective == "REPLACE" else source["Metadata"]
+        with self._lock:
+            self.objects[Key] = {
+                "Body": source["Body"],
+                "Metadata": dict(metadata or {}),
+                "ContentType": ContentType or source["ContentType"],
+            }
+        return {}
+
+    def delete_objects(self, *, Bucket: str, Delete: dict) -> dict:
+        self._check_bucket(Bucket, "DeleteObjects")
+        with self._lock:
+            for item in Delete["Objects"]:
+                self.objects.pop(item["Key"], None)
+        return {}
+
+    def list_objects_v2(
+        self,
+        *,
+        Bucket: str,
+        Prefix: str,
+        ContinuationToken: Optional[str] = None,
+        MaxKeys: int = 2,
+    ) -> dict:
+        self._check_bucket(Bucket, "ListObjectsV2")
+        with self._lock:
+            keys = sorted(
+                key
+                for key in self.objects
+                if key.startswith(Prefix) and key > (ContinuationToken or "")
+            )
+            page = keys[:MaxKeys]
+            contents = [
+                {"Key": key, "Size": len(self.objects[key]["Body"])} for key in page
+            ]
+        response = {"Contents": contents, "IsTruncated": len(keys) > MaxKeys}
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1]
+        return response
+
+    def create_multipart_upload(
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        ContentType: str = "binary/octet-stream",
+        Metadata: Optional[dict] = None,
+    ) -> dict:
+        self._check_bucket(Bucket, "CreateMultipartUpload")
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[upload_id] = {
+                "Key": Key,
+                "Parts": {},
+                "ContentType": ContentType,
+                "Metadata": dict(Metadata or {}),
+            }
+        return {"UploadId": upload_id}
+
+    def upload_part(
+        self, *, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes
+    ) -> dict:
+        self._check_bucket(Bucket, "UploadPart")
+        with self._lock:
+            self._parts_now += 1
+            self.max_parts_at_once = max(self.max_parts_at_once, self._parts_now)
+        try:
+            etag = f'"{uuid.uuid4().hex}"'
+            with self._lock:
+                if UploadId not in self.uploads:
+                    raise ClientError("NoSuchUpload", "UploadPart")
+                self.uploads[UploadId]["Parts"][PartNumber] = (etag, bytes(Body))
+            threading.Event().wait(0.01)
+            return {"ETag": etag}
+        finally:
+            with self._lock:
+                self._parts_now -= 1
+
+    def complete_multipart_upload(
+        self, *, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict
+    ) -> dict:
+        self._check_bucket(Bucket, "CompleteMultipartUpload")
+        with self._lock:
+            upload = self.uploads.pop(UploadId, None)
+            if upload is None:
+                raise ClientError("NoSuchUpload", "CompleteMultipartUpload")
+            parts = MultipartUpload["Parts"]
+            if [part["PartNumber"] for part in parts] != sorted(upload["Parts"]):
+                raise ClientError("InvalidPart", "CompleteMultipartUpload")
+            bodies = []
+            for part in parts:
+                etag, body = upload["Parts"][part["PartNumber"]]
+                if etag != part["ETag"]:
+                    raise ClientError("InvalidPart", "CompleteMultipartUpload")
+                if part is not parts[-1] and len(body) < self.min_part_size:
+                    raise ClientError("EntityTooSmall", "CompleteMultipartUpload")
+                bodies.append(body)
+            self.objects[Key] = {
+                "Body": b"".join(bodies),
+                "Metadata": upload["Metadata"],
+                "ContentType": upload["ContentType"],
+            }
+        return {}
+
+    def abort_multipart_upload(self, *, Bucket: str, Key: str, UploadId: str) -> dict:
+        self._check_bucket(Bucket, "AbortMultipartUpload")
+        with self._lock:
+            self.uploads.pop(UploadId, None)
+        return {}
@@ -0,0 +1,46 @@
+"""In memory stand-in for the ``redis.Redis`` methods used by
+`submit_ce.cache.redis_backend`."""
+
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+
+class FakeRedis:
+    """Keys with expiry in memory. `calls` counts the calls of each method, set `down`
+    to make every call fail as if the server could not be reached."""
+
+    def __init__(self):
+        self.data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self.calls = Counter()
+        self.down = False
+        self._lock = threading.Lock()
+
+    def _call(self, name: str) -> None:
+        self.calls[name] += 1
+        if self.down:
+            raise ConnectionError("Error connecting to fake redis")
+
+    def get(self, name: str) -> Optional[bytes]:
+        self._call("get")
+        with self._lock:
+            value, expires = self.data.get(name, (None, None))
+            if expires is not None and expires <= time.monotonic():
+                del self.data[name]
+                return None
+            return value
+
+    def set(self, name: str, value: bytes, px: Optional[int] = None) -> bool:
+        self._call("set")
+        with self._lock:
+            self.data[name] = (
+                bytes(value),
+                time.monotonic() + px / 1000 if px is not None else None,
+            )
+        return True
+
+    def delete(self, *names: str) -> int:
+        self._call("delete")
+        with self._lock:
+            return sum(self.data.pop(name, None) is not None for name in names)
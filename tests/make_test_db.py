@@ -7,6 +7,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 import fire
 from submit_ce.fastapi.config import DEV_SQLITE_FILE
+# Adds the indexes of the submission listing to the metadata.
+import submit_ce.fastapi.implementations.submission_listing  # noqa: F401
 
 
 def create_all_legacy_db(test_db_file: str=DEV_SQLITE_FILE, echo: bool=False):
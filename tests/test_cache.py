@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+from submit_ce.cache import LocalCache, ReadThroughCache, MISSING
+from submit_ce.cache.redis_backend import RedisBackend
+from tests.fake_redis import FakeRedis
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Loader:
+    """Loads `value`, counting the loads."""
+
+    def __init__(self, value):
+        self.value = value
+        self.loads = 0
+
+    async def __call__(self):
+        self.loads += 1
+        return self.value
+
+
+def test_local_cache_lru_and_ttl():
+    clock = Clock()
+    cache = LocalCache(max_entries=2, ttl=5, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert (cache.get("a"), cache.get("c"), cache.evictions) == (1, 3, 1)
+
+    clock.now = 5
+    assert cache.get("a") is MISSING
+    assert len(cache) == 1
+    cache.set("a", 4)
+    cache.delete("a")
+    assert cache.get("a") is MISSING
+
+
+def test_read_through_local():
+    cache = ReadThroughCache(LocalCache())
+    load = Loader({"submission_id": 1, "title": "A"})
+    assert asyncio.run(cache.get("1", load)) == {"submission_id": 1, "title": "A"}
+    assert asyncio.run(cache.get("1", load)) == {"submission_id": 1, "title": "A"}
+    assert load.loads == 1
+
+    load.value = {"submission_id": 1, "title": "B"}
+    asyncio.run(cache.invalidate("1"))
+    assert asyncio.run(cache.get("1", load))["title"] == "B"
+    assert load.loads == 2
+    assert cache.metrics_dict() == {
+        "local_hits": 1,
+        "shared_hits": 0,
+        "misses": 2,
+        "invalidations": 1,
+        "evictions": 0,
+        "shared_errors": 0,
+        "hits": 1,
+        "hit_ratio": 0.3333,
+    }
+
+
+def test_read_through_without_tiers_loads_every_time():
+    cache = ReadThroughCache(None)
+    load = Loader({"submission_id": 1})
+    asyncio.run(cache.get("1", load))
+    asyncio.run(cache.get("1", load))
+    assert load.loads == 2
+
+
+def test_read_through_shared():
+    redis = FakeRedis()
+    first = ReadThroughCache(LocalCache(), RedisBackend(redis), prefix="s:")
+    second = ReadThroughCache(LocalCache(), RedisBackend(redis), prefix="s:")
+    load = Loader({"submission_id": 1, "updated": "2024-01-02T03:04:05"})
+
+    assert asyncio.run(first.get("1", load)) == load.value
+    assert list(redis.data) == ["s:1"]
+    assert asyncio.run(second.get("1", load)) == load.value
+    assert asyncio.run(second.get("1", load)) == load.value
+    assert load.loads == 1
+    assert (second.metrics.shared_hits, second.metrics.local_hits) == (1, 1)
+
+    asyncio.run(first.invalidate("1"))
+    assert not redis.data
+    assert (
+        second.local.get("1") == load.value
+    ), "other processes keep their local entry until it expires"
+
+
+def test_shared_down_falls_back_to_loading():
+    redis = FakeRedis()
+    redis.down = True
+    cache = ReadThroughCache(None, RedisBackend(redis))
+    load = Loader({"submission_id": 1})
+    assert asyncio.run(cache.get("1", load)) == {"submission_id": 1}
+    asyncio.run(cache.invalidate("1"))
+    assert load.loads == 1
+    assert cache.metrics.shared_errors == 3
+
+
+def test_value_loaded_during_invalidation_is_not_cached():
+    cache = ReadThroughCache(LocalCache(), RedisBackend(FakeRedis()))
+
+    async def load_while_changed():
+        await cache.invalidate("1")
+        return {"title": "old"}
+
+    assert asyncio.run(cache.get("1", load_while_changed)) == {"title": "old"}
+    assert cache.local.get("1") is MISSING
+    assert not cache.shared.client.data
+
+
+def test_redis_backend_ttl():
+    redis = FakeRedis()
+    backend = RedisBackend(redis)
+    backend.set("k", b"v", 2.5)
+    backend.set("short", b"v", 0.0001)
+    assert 2.4 < redis.data["k"][1] - time.monotonic() <= 2.5
+    assert backend.get("k") == b"v"
+    time.sleep(0.002)
+    assert backend.get("short") is None
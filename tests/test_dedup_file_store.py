@@ -0,0 +1,95 @@
+import asyncio
+import io
+import os
+from hashlib import sha256
+
+from fastapi import UploadFile
+
+from submit_ce.file_store.dedup_file_store import DedupFileStore
+from tests.test_legacy_file_store import make_tar_gz, chunks
+
+FIGURE = b"\x89PNG" * 1000
+STYLE = b"\\ProvidesPackage{mystyle}"
+
+
+def store_package(store, submission_id, files, mtime=0):
+    asyncio.run(
+        store.store_source_package(
+            submission_id, UploadFile(io.BytesIO(make_tar_gz(files, mtime)))
+        )
+    )
+    store.wait_for_background()
+
+
+def test_identical_files_share_a_blob(tmp_path):
+    store = DedupFileStore(root_dir=tmp_path)
+    store_package(
+        store, 12345678, {"main.tex": b"v1", "fig.png": FIGURE, "mystyle.sty": STYLE}
+    )
+    store_package(
+        store,
+        12345679,
+        {"main.tex": b"v2", "figs/fig.png": FIGURE, "mystyle.sty": STYLE},
+    )
+
+    first = tmp_path / "1234" / "12345678" / "src"
+    second = tmp_path / "1234" / "12345679" / "src"
+    assert (second / "figs" / "fig.png").read_bytes() == FIGURE
+    assert os.path.samefile(first / "fig.png", second / "figs" / "fig.png")
+    assert os.path.samefile(first / "mystyle.sty", second / "mystyle.sty")
+    assert not os.path.samefile(first / "main.tex", second / "main.tex")
+    figure_blob = store.blob_path(sha256(FIGURE).hexdigest())
+    assert os.path.samefile(figure_blob, first / "fig.png")
+    assert store.blob_references(sha256(FIGURE).hexdigest()) == 2
+    assert store.blob_references(sha256(b"v1").hexdigest()) == 1
+
+    # a replacement of the same files only adds links
+    store_package(
+        store, 12345678, {"main.tex": b"v1", "fig.png": FIGURE, "mystyle.sty": STYLE}
+    )
+    assert store.blob_references(sha256(FIGURE).hexdigest()) == 2
+    assert len(list(store.blob_dir.glob("*/*"))) == 4
+
+    asyncio.run(store.store_source_file(12345679, "mystyle.sty", chunks(STYLE)))
+    assert os.path.samefile(first / "mystyle.sty", second / "mystyle.sty")
+    assert (
+        asyncio.run(store.get_source_file(12345679, "mystyle.sty")).path.read_bytes()
+        == STYLE
+    )
+
+
+def test_deduplicated_files_have_the_mtime_of_the_manifest(tmp_path):
+    store = DedupFileStore(root_dir=tmp_path)
+    store_package(store, 12345678, {"fig.png": FIGURE}, mtime=1_000_000)
+    store_package(
+        store, 12345679, {"fig.png": FIGURE, "main.tex": b"v2"}, mtime=2_000_000
+    )
+    asyncio.run(store.store_source_file(12345679, "mystyle.sty", chunks(STYLE)))
+
+    for submission_id in (12345678, 12345679):
+        src = tmp_path / "1234" / str(submission_id) / "src"
+        for entry in asyncio.run(store.list_source_files(submission_id)):
+            stat = os.stat(src / entry.name)
+            assert stat.st_mtime == entry.mtime, entry.name
+            assert not stat.st_mode & 0o222, entry.name
+    mtimes = {
+        entry.name: entry.mtime
+        for entry in asyncio.run(store.list_source_files(12345679))
+    }
+    assert (mtimes["fig.png"], mtimes["main.tex"]) == (1_000_000, 2_000_000)
+
+
+def test_collect_garbage(tmp_path):
+    store = DedupFileStore(root_dir=tmp_path, blob_dir=tmp_path / "elsewhere")
+    store_package(store, 12345678, {"main.tex": b"v1", "fig.png": FIGURE})
+    asyncio.run(store.store_source_file(12345678, "main.tex", chunks(b"v2")))
+    assert store.collect_garbage(min_age=60) == (0, 0)
+
+    assert store.collect_garbage(min_age=-1) == (1, 2)
+    assert store.blob_references(sha256(b"v1").hexdigest()) == 0
+    assert store.blob_references(sha256(FIGURE).hexdigest()) == 1
+
+    # a blob removed by the collector is added again by the next upload of the content
+    store_package(store, 12345679, {"main.tex": b"v1"})
+    assert store.blob_references(sha256(b"v1").hexdigest()) == 1
+    assert (tmp_path / "1234" / "12345679" / "src" / "main.tex").read_bytes() == b"v1"
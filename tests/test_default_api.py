@@ -35,7 +35,6 @@ def test_start_alter(client: TestClient):
     assert response.status_code == 404
 
 
-
 def test_submission_id_accept_policy_post(client: TestClient):
     """Test case for submission_id_accept_policy_post."""
     headers = {}
@@ -201,3 +200,725 @@ def test_basic_submission(client: TestClient):
 
     assert response.status_code == 200 or response.text == ""
 
+
+def test_source_files(client: TestClient, tmp_path, monkeypatch):
+    from submit_ce.fastapi.api import default_api
+    from submit_ce.file_store.legacy_file_store import LegacyFileStore
+
+    monkeypatch.setattr(
+        default_api.implementation, "store", LegacyFileStore(root_dir=tmp_path)
+    )
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    response = client.put(
+        f"/v1/submission/{sid}/files/figs/fig1.png", content=b"\x89PNG" * 100
+    )
+    assert response.status_code == 200
+    checksum = response.text
+
+    response = client.get(f"/v1/submission/{sid}/files/figs/fig1.png")
+    assert response.status_code == 200
+    assert response.content == b"\x89PNG" * 100
+    response = client.head(f"/v1/submission/{sid}/files/figs/fig1.png")
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "400"
+
+    response = client.put(
+        f"/v1/submission/{sid}/files/figs/fig1.png", content=b"\x89PNG"
+    )
+    assert response.status_code == 200
+    assert response.text != checksum
+
+    assert client.delete(f"/v1/submission/{sid}/files/figs/fig1.png").status_code == 200
+    assert client.delete(f"/v1/submission/{sid}/files/figs/fig1.png").status_code == 404
+    assert client.get(f"/v1/submission/{sid}/files/figs/fig1.png").status_code == 404
+    assert (
+        client.put(f"/v1/submission/888888/files/main.tex", content=b"x").status_code
+        == 404
+    )
+    assert client.get(f"/v1/submission/{sid}/preview").status_code == 404
+
+    response = client.get(f"/v1/submission/{sid}/package")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    response = client.get(
+        f"/v1/submission/{sid}/package", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    response = client.get(
+        f"/v1/submission/{sid}/package", headers={"Range": "bytes=0-1"}
+    )
+    assert response.status_code == 206
+    assert response.content == b"\x1f\x8b"
+
+
+def test_resumable_upload(client: TestClient, tmp_path, monkeypatch):
+    import base64
+    import hashlib
+    import io
+    import tarfile
+    from submit_ce.fastapi.api import default_api
+    from submit_ce.file_store.legacy_file_store import LegacyFileStore
+
+    monkeypatch.setattr(
+        default_api.implementation, "store", LegacyFileStore(root_dir=tmp_path)
+    )
+
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        info = tarfile.TarInfo("main.tex")
+        info.size = 23
+        tar.addfile(info, io.BytesIO(b"\\documentclass{article}"))
+    package = buf.getvalue()
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    assert client.head(f"/v1/submission/{sid}/upload").status_code == 404
+    response = client.post(
+        f"/v1/submission/{sid}/upload", headers={"Upload-Length": str(len(package))}
+    )
+    assert response.status_code == 201
+    assert response.headers["Upload-Offset"] == "0"
+
+    chunk = package[:10]
+    response = client.patch(
+        f"/v1/submission/{sid}/upload",
+        content=chunk,
+        headers={
+            "Upload-Offset": "0",
+            "Upload-Checksum": "sha1 " + base64.b64encode(b"wrong digest").decode(),
+        },
+    )
+    assert response.status_code == 460
+    response = client.patch(
+        f"/v1/submission/{sid}/upload",
+        content=chunk,
+        headers={
+            "Upload-Offset": "0",
+            "Upload-Checksum": "sha1 "
+            + base64.b64encode(hashlib.sha1(chunk).digest()).decode(),
+        },
+    )
+    assert response.status_code == 200
+    assert response.text == ""
+    assert client.head(f"/v1/submission/{sid}/upload").headers["Upload-Offset"] == "10"
+    assert (
+        client.patch(
+            f"/v1/submission/{sid}/upload",
+            content=package,
+            headers={"Upload-Offset": "0"},
+        ).status_code
+        == 409
+    )
+
+    response = client.patch(
+        f"/v1/submission/{sid}/upload",
+        content=package[10:],
+        headers={"Upload-Offset": "10"},
+    )
+    assert response.status_code == 200
+    assert (
+        response.text
+        == base64.urlsafe_b64encode(hashlib.md5(package).digest()).decode()
+    )
+    assert (
+        client.get(f"/v1/submission/{sid}/files/main.tex").content
+        == b"\\documentclass{article}"
+    )
+
+
+def test_file_post_records_source(client: TestClient, tmp_path, monkeypatch):
+    import io
+    from submit_ce.fastapi.api import default_api
+    from submit_ce.file_store.legacy_file_store import LegacyFileStore
+
+    monkeypatch.setattr(
+        default_api.implementation, "store", LegacyFileStore(root_dir=tmp_path)
+    )
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    response = client.post(
+        f"/v1/submission/{sid}/files",
+        files={
+            "uploadFile": (
+                "paper.pdf",
+                io.BytesIO(b"%PDF-1.5 a paper"),
+                "application/pdf",
+            )
+        },
+    )
+    assert response.status_code == 200
+    submission = client.get(f"/v1/submission/{sid}").json()
+    assert (
+        submission["source_size"],
+        submission["source_format"],
+        submission["package"],
+    ) == (16, "pdf", f"{sid}.tar.gz")
+
+    client.put(
+        f"/v1/submission/{sid}/files/main.tex", content=b"\\documentclass{article}"
+    )
+    submission = client.get(f"/v1/submission/{sid}").json()
+    assert (
+        submission["source_size"],
+        submission["source_format"],
+        submission["package"],
+    ) == (39, "pdftex", f"{sid}.tar.gz")
+
+
+def test_file_post_in_background(client: TestClient, tmp_path, monkeypatch):
+    import io
+    import json
+    from submit_ce.fastapi.api import default_api
+    from submit_ce.fastapi.implementations.legacy_implementation import JOB_HANDLERS
+    from submit_ce.file_store.legacy_file_store import LegacyFileStore
+    from submit_ce.jobs.sqlite_queue import SqliteJobQueue
+    from submit_ce.jobs.worker import run_one
+    from tests.test_legacy_file_store import make_tar_gz
+
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+    monkeypatch.setattr(
+        default_api.implementation,
+        "store",
+        LegacyFileStore(root_dir=tmp_path / "files"),
+    )
+    monkeypatch.setattr(default_api.implementation, "jobs", queue)
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    package = make_tar_gz({"main.tex": b"\\documentclass{article}"})
+    response = client.post(
+        f"/v1/submission/{sid}/files",
+        files={"uploadFile": ("paper.tar.gz", io.BytesIO(package))},
+    )
+    assert response.status_code == 202
+    assert response.headers["location"] == f"/v1/submission/{sid}"
+    assert response.json()["state"] == "queued"
+    assert (
+        client.get(f"/v1/submission/{sid}").json()["file_processing"]["state"]
+        == "queued"
+    )
+    assert client.get(f"/v1/submission/{sid}/files/main.tex").status_code == 404
+
+    job = run_one(queue, JOB_HANDLERS, "test")
+    assert job.state == "done"
+    assert json.loads(job.result)["file_count"] == 1
+    submission = client.get(f"/v1/submission/{sid}").json()
+    assert submission["file_processing"]["state"] == "done"
+    assert submission["source_format"] == "tex"
+    assert (
+        client.get(f"/v1/submission/{sid}/files/main.tex").content
+        == b"\\documentclass{article}"
+    )
+
+    client.post(
+        f"/v1/submission/{sid}/files",
+        files={"uploadFile": ("bad.tar.gz", io.BytesIO(b"\x1f\x8bnot a tar"))},
+    )
+    assert run_one(queue, JOB_HANDLERS, "test").state == "failed"
+    assert client.get(f"/v1/submission/{sid}").json()["file_processing"]["error"]
+    assert client.get(f"/v1/submission/{sid}/files/main.tex").status_code == 200
+
+
+def test_preview(client: TestClient, tmp_path, monkeypatch):
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+    from submit_ce.fastapi.api import default_api
+    from submit_ce.fastapi.implementations.legacy_implementation import JOB_HANDLERS
+    from submit_ce.file_store.legacy_file_store import LegacyFileStore
+    from submit_ce.jobs.sqlite_queue import SqliteJobQueue
+    from submit_ce.jobs.worker import run_one
+    from submit_ce.preview import PreviewBuilder
+    from tests.test_preview import StubCompiler, MAIN
+    from tests.test_legacy_file_store import make_tar_gz
+
+    compiler = StubCompiler()
+    monkeypatch.setattr(
+        default_api.implementation,
+        "store",
+        LegacyFileStore(root_dir=tmp_path / "files"),
+    )
+    monkeypatch.setattr(
+        default_api.implementation,
+        "previews",
+        PreviewBuilder(compiler, ThreadPoolExecutor(1)),
+    )
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    assert client.post(f"/v1/submission/{sid}/preview").status_code == 400
+    package = make_tar_gz({"main.tex": MAIN, "sections/intro.tex": b"Hello"})
+    client.post(
+        f"/v1/submission/{sid}/files",
+        files={"uploadFile": ("paper.tar.gz", io.BytesIO(package))},
+    )
+
+    response = client.post(f"/v1/submission/{sid}/preview")
+    assert response.status_code == 200
+    assert response.json()["compiled"]
+    etag = f'"{response.json()["checksum"]}"'
+    assert client.post(f"/v1/submission/{sid}/preview").json()["compiled"] is False
+    assert compiler.compiles == ["main.tex"]
+
+    response = client.get(f"/v1/submission/{sid}/preview")
+    assert response.content.startswith(b"%PDF")
+    assert (response.headers["etag"], response.headers["cache-control"]) == (
+        etag,
+        "no-cache",
+    )
+    assert (
+        client.get(
+            f"/v1/submission/{sid}/preview", headers={"If-None-Match": etag}
+        ).status_code
+        == 304
+    )
+
+    monkeypatch.setattr(
+        default_api.implementation, "jobs", SqliteJobQueue(tmp_path / "jobs.db")
+    )
+    assert client.post(f"/v1/submission/{sid}/preview").status_code == 200
+    client.put(f"/v1/submission/{sid}/files/sections/intro.tex", content=b"Changed")
+    response = client.post(f"/v1/submission/{sid}/preview")
+    assert response.status_code == 202
+    assert (
+        client.get(f"/v1/submission/{sid}").json()["preview_processing"]["state"]
+        == "queued"
+    )
+    assert (
+        run_one(default_api.implementation.jobs, JOB_HANDLERS, "test").state == "done"
+    )
+    assert (
+        client.get(
+            f"/v1/submission/{sid}/preview", headers={"If-None-Match": etag}
+        ).status_code
+        == 200
+    )
+
+    assert client.delete(f"/v1/submission/{sid}/preview").status_code == 204
+    assert client.get(f"/v1/submission/{sid}/preview").status_code == 404
+    assert client.delete(f"/v1/submission/{sid}/preview").status_code == 404
+
+
+def test_get_submission_cached(client: TestClient, monkeypatch):
+    from submit_ce.cache import ReadThroughCache, LocalCache
+    from submit_ce.cache.redis_backend import RedisBackend
+    from submit_ce.fastapi.api import default_api
+    from tests.fake_redis import FakeRedis
+
+    cache = ReadThroughCache(LocalCache(ttl=60), RedisBackend(FakeRedis()))
+    monkeypatch.setattr(default_api.implementation, "submission_cache", cache)
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    first = client.get(f"/v1/submission/{sid}").json()
+    assert client.get(f"/v1/submission/0{sid}").json() == first
+    assert (cache.metrics.misses, cache.metrics.local_hits) == (1, 1)
+
+    client.post(
+        f"/v1/submission/{sid}/setLicense",
+        json={"license_uri": "http://arxiv.org/licenses/nonexclusive-distrib/1.0/"},
+    )
+    assert (
+        client.get(f"/v1/submission/{sid}").json()["license"]
+        == "http://arxiv.org/licenses/nonexclusive-distrib/1.0/"
+    )
+    assert cache.metrics.misses == 2
+    assert "hit_ratio" in client.get("/v1/status").text
+
+
+def test_submission_etag(client: TestClient):
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    response = client.get(f"/v1/submission/{sid}")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+    response = client.get(f"/v1/submission/{sid}", headers={"If-None-Match": etag})
+    assert (response.status_code, response.headers["etag"], response.content) == (
+        304,
+        etag,
+        b"",
+    )
+
+    license = {"license_uri": "http://arxiv.org/licenses/nonexclusive-distrib/1.0/"}
+    assert (
+        client.post(
+            f"/v1/submission/{sid}/setLicense", json=license, headers={"If-Match": etag}
+        ).status_code
+        == 200
+    )
+    changed = client.get(f"/v1/submission/{sid}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+    response = client.post(
+        f"/v1/submission/{sid}/setCategories",
+        headers={"If-Match": etag},
+        json={"primary_category": "cs.AI", "secondary_categories": []},
+    )
+    assert response.status_code == 412
+    assert (
+        client.get(f"/v1/submission/{sid}").headers["etag"] == changed.headers["etag"]
+    )
+    assert (
+        client.post(
+            f"/v1/submission/{sid}/setCategories",
+            headers={"If-Match": changed.headers["etag"]},
+            json={"primary_category": "cs.AI", "secondary_categories": []},
+        ).status_code
+        == 200
+    )
+    assert (
+        client.get(f"/v1/submission/{sid}").headers["etag"] != changed.headers["etag"]
+    )
+    assert (
+        client.post(
+            f"/v1/submission/{sid}/setLicense", json=license, headers={"If-Match": "*"}
+        ).status_code
+        == 200
+    )
+
+
+def numeric_user(app):
+    """Make the requests of `app` by a user with a numeric identifier, as the submitter
+    ids of the legacy DB are.
+
+    The stub user of `get_user` is ``bobsmith``, which `SubmissionData` rejects as a
+    submitter id."""
+    from submit_ce.fastapi.auth import get_user
+
+    async def user():
+        return (await get_user()).model_copy(update={"identifier": "1234"})
+
+    app.dependency_overrides[get_user] = user
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_submission_fields(app, client: TestClient, monkeypatch, cached):
+    from submit_ce.cache import ReadThroughCache, LocalCache
+    from submit_ce.fastapi.api import default_api
+    from submit_ce.fastapi.api.models.submission import SubmissionData
+
+    cache = ReadThroughCache(LocalCache(ttl=60) if cached else None)
+    monkeypatch.setattr(default_api.implementation, "submission_cache", cache)
+    numeric_user(app)
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    whole = client.get(f"/v1/submission/{sid}")
+    assert whole.headers["content-type"] == "application/json"
+    SubmissionData.model_validate(whole.json())
+
+    response = client.get(
+        f"/v1/submission/{sid}", params={"fields": "title, license,title"}
+    )
+    assert response.json() == {
+        "submission_id": int(sid),
+        "title": whole.json()["title"],
+        "license": None,
+    }
+    etag = response.headers["etag"]
+    assert etag.startswith("W/") and etag != f"W/{whole.headers['etag']}"
+    assert (
+        client.get(
+            f"/v1/submission/{sid}",
+            params={"fields": "title,license"},
+            headers={"If-None-Match": etag},
+        ).status_code
+        == 304
+    )
+    assert (
+        cache.metrics.misses == 1
+    )  # only the whole submission is read through the cache
+
+    license = {"license_uri": "http://arxiv.org/licenses/nonexclusive-distrib/1.0/"}
+    assert (
+        client.post(
+            f"/v1/submission/{sid}/setLicense", headers={"If-Match": etag}, json=license
+        ).status_code
+        == 412
+    )
+    assert (
+        client.post(
+            f"/v1/submission/{sid}/setLicense",
+            headers={"If-Match": whole.headers["etag"]},
+            json=license,
+        ).status_code
+        == 200
+    )
+    response = client.get(f"/v1/submission/{sid}", params={"fields": "title,license"})
+    assert (
+        response.json()["license"]
+        == "http://arxiv.org/licenses/nonexclusive-distrib/1.0/"
+    )
+    assert response.headers["etag"] != etag
+    etag = response.headers["etag"]
+
+    client.post(
+        f"/v1/submission/{sid}/setCategories",
+        json={"primary_category": "cs.AI", "secondary_categories": []},
+    )
+    assert (
+        client.get(
+            f"/v1/submission/{sid}",
+            params={"fields": "title,license"},
+            headers={"If-None-Match": etag},
+        ).status_code
+        == 304
+    )
+
+    response = client.get(
+        f"/v1/submission/{sid}", params={"fields": "title,not_a_field"}
+    )
+    assert response.status_code == 400 and "not_a_field" in response.text
+
+
+def test_submission_etag_with_jobs(client: TestClient, tmp_path, monkeypatch):
+    from submit_ce.fastapi.api import default_api
+    from submit_ce.fastapi.implementations.legacy_implementation import PROCESS_UPLOAD
+    from submit_ce.jobs.sqlite_queue import SqliteJobQueue
+
+    queue = SqliteJobQueue(tmp_path / "jobs.db")
+    monkeypatch.setattr(default_api.implementation, "jobs", queue)
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    row_etag = client.get(f"/v1/submission/{sid}").headers["etag"]
+    projected = client.get(f"/v1/submission/{sid}", params={"fields": "title"}).headers[
+        "etag"
+    ]
+    with_processing = client.get(
+        f"/v1/submission/{sid}", params={"fields": "title,file_processing"}
+    )
+    assert with_processing.json()["file_processing"] is None
+
+    queue.enqueue(PROCESS_UPLOAD, int(sid))
+    whole = client.get(f"/v1/submission/{sid}")
+    assert whole.headers["etag"].startswith(row_etag.rstrip('"') + ".")
+    assert (
+        client.get(f"/v1/submission/{sid}", params={"fields": "title"}).headers["etag"]
+        == projected
+    )
+    response = client.get(
+        f"/v1/submission/{sid}",
+        params={"fields": "title,file_processing"},
+        headers={"If-None-Match": with_processing.headers["etag"]},
+    )
+    assert (
+        response.status_code == 200
+        and response.json()["file_processing"]["state"] == "queued"
+    )
+
+    queue.claim("test")
+    assert client.get(f"/v1/submission/{sid}").headers["etag"] != whole.headers["etag"]
+    assert (
+        client.post(
+            f"/v1/submission/{sid}/setLicense",
+            headers={"If-Match": whole.headers["etag"]},
+            json={"license_uri": "http://arxiv.org/licenses/nonexclusive-distrib/1.0/"},
+        ).status_code
+        == 200
+    )
+
+
+def test_list_submissions(app, client: TestClient):
+    import datetime
+    from submit_ce.fastapi.api.models.submission import SubmissionPage
+
+    numeric_user(app)
+    since = datetime.datetime.utcnow().isoformat()
+    sids = [
+        int(client.post("/v1/start", json={"submission_type": "new"}).text)
+        for _ in range(5)
+    ]
+    client.post(
+        f"/v1/submission/{sids[1]}/setLicense",
+        json={"license_uri": "http://arxiv.org/licenses/nonexclusive-distrib/1.0/"},
+    )
+
+    listed, cursor, pages = [], None, 0
+    while True:
+        params = {
+            "type": "new",
+            "updated_since": since,
+            "limit": 2,
+            "fields": "license",
+            "submitter": "1234",
+        }
+        page = client.get(
+            "/v1/submissions",
+            params={**params, **({"cursor": cursor} if cursor else {})},
+        ).json()
+        listed += page["submissions"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert [row["submission_id"] for row in listed] == [
+        sids[1],
+        sids[4],
+        sids[3],
+        sids[2],
+        sids[0],
+    ]
+    assert set(listed[0]) == {"submission_id", "license"} and pages == 3
+    whole = client.get(
+        "/v1/submissions", params={"updated_since": since, "stage": 0, "limit": 1}
+    ).json()
+    assert (
+        whole["submissions"][0]["submission_id"] == sids[1]
+        and "created" in whole["submissions"][0]
+    )
+    SubmissionPage.model_validate(whole)
+
+    empty = client.get(
+        "/v1/submissions", params={"type": "cross", "updated_since": since}
+    ).json()
+    assert empty == {"submissions": [], "next_cursor": None}
+    assert (
+        client.get("/v1/submissions", params={"cursor": "not-a-cursor"}).status_code
+        == 400
+    )
+    assert client.get("/v1/submissions", params={"limit": 0}).status_code == 422
+
+
+def test_batch(client: TestClient):
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    etag = client.get(f"/v1/submission/{sid}").headers["etag"]
+    license = "http://arxiv.org/licenses/nonexclusive-distrib/1.0/"
+    response = client.post(
+        f"/v1/submission/{sid}/batch",
+        headers={"If-Match": etag},
+        json=[
+            {"accept_policy": {"accepted_policy_id": 3}},
+            {"set_license": {"license_uri": license}},
+            {"assert_authorship": {"i_am_author": True}},
+            {
+                "set_categories": {
+                    "primary_category": "cs.AI",
+                    "secondary_categories": [],
+                }
+            },
+            {
+                "set_categories": {
+                    "primary_category": "cs.AI",
+                    "secondary_categories": ["cs.LG"],
+                }
+            },
+            {"set_metadata": {"title": "Batched", "authors": "Smith, B."}},
+        ],
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert results[:3] == [None, None, "success"]
+    assert results[3]["new_primary"] == "cs.AI" and results[4]["new_primary"] is None
+    assert sorted(results[4]["new_secondaries"]) == ["cs.AI", "cs.LG"]
+    assert results[5] == "authors,title"
+    submission = client.get(f"/v1/submission/{sid}").json()
+    assert (
+        submission["agree_policy"],
+        submission["license"],
+        submission["is_author"],
+        submission["title"],
+    ) == (1, license, 1, "Batched")
+
+    response = client.post(
+        f"/v1/submission/{sid}/batch",
+        headers={"If-Match": etag},
+        json=[{"set_metadata": {"title": "Stale"}}],
+    )
+    assert response.status_code == 412
+    response = client.post(
+        f"/v1/submission/{sid}/batch",
+        json=[
+            {"set_metadata": {"title": "Rolled back"}},
+            {"accept_policy": {"accepted_policy_id": 2}},
+        ],
+    )
+    assert response.status_code == 400 and "Operation 1" in response.text
+    assert client.get(f"/v1/submission/{sid}").json()["title"] == "Batched"
+
+    assert client.post(f"/v1/submission/{sid}/batch", json=[{}]).status_code == 422
+    assert client.post(f"/v1/submission/{sid}/batch", json=[]).status_code == 422
+    assert (
+        client.post(
+            f"/v1/submission/{sid}/batch",
+            json=[
+                {
+                    "set_metadata": {"title": "Two"},
+                    "set_license": {"license_uri": license},
+                }
+            ],
+        ).status_code
+        == 422
+    )
+
+
+def test_file_lease_conflict(client: TestClient, tmp_path, monkeypatch):
+    from submit_ce.fastapi.api import default_api
+    from submit_ce.fastapi.implementations.legacy_implementation import (
+        legacy_specific_settings,
+    )
+    from submit_ce.file_store.legacy_file_store import LegacyFileStore
+
+    store = LegacyFileStore(root_dir=tmp_path)
+    monkeypatch.setattr(default_api.implementation, "store", store)
+    monkeypatch.setattr(legacy_specific_settings, "legacy_file_lock", "lease")
+    monkeypatch.setattr(legacy_specific_settings, "legacy_file_lease_wait_seconds", 0.2)
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    assert (
+        client.put(f"/v1/submission/{sid}/files/main.tex", content=b"a").status_code
+        == 200
+    )
+    assert store.lease_file(int(sid)).version() == 1
+
+    lease = store.lease_file(int(sid)).acquire(ttl=60)
+    assert (
+        client.put(f"/v1/submission/{sid}/files/main.tex", content=b"b").status_code
+        == 409
+    )
+    store.lease_file(int(sid)).release(lease, published=False)
+    assert (
+        client.put(f"/v1/submission/{sid}/files/main.tex", content=b"b").status_code
+        == 200
+    )
+    assert store.lease_file(int(sid)).version() == 2
+
+
+def test_source_files_list(client: TestClient, tmp_path, monkeypatch):
+    from submit_ce.fastapi.api import default_api
+    from submit_ce.file_store.legacy_file_store import LegacyFileStore
+
+    monkeypatch.setattr(
+        default_api.implementation, "store", LegacyFileStore(root_dir=tmp_path)
+    )
+
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    response = client.get(f"/v1/submission/{sid}/files")
+    assert response.status_code == 200
+    assert response.json()["files"] == []
+    assert response.json()["source_size"] == 0
+
+    client.put(
+        f"/v1/submission/{sid}/files/main.tex", content=b"\\documentclass{article}"
+    )
+    client.put(
+        f"/v1/submission/{sid}/files/figs/fig1.png", content=b"\x89PNG\r\n\x1a\n"
+    )
+    response = client.get(f"/v1/submission/{sid}/files")
+    listing = response.json()
+    assert [(f["path"], f["size"], f["file_type"]) for f in listing["files"]] == [
+        ("figs/fig1.png", 8, "image"),
+        ("main.tex", 23, "tex"),
+    ]
+    assert listing["file_count"] == 2
+    assert listing["source_size"] == 31
+    assert (listing["source_format"], listing["main_files"]) == ("pdftex", ["main.tex"])
+    assert listing["files"][0]["modified"] is not None
+
+    etag = response.headers["etag"]
+    assert (
+        client.get(
+            f"/v1/submission/{sid}/files", headers={"If-None-Match": etag}
+        ).status_code
+        == 304
+    )
+    client.delete(f"/v1/submission/{sid}/files/figs/fig1.png")
+    assert (
+        client.get(
+            f"/v1/submission/{sid}/files", headers={"If-None-Match": etag}
+        ).status_code
+        == 200
+    )
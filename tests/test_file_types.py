@@ -0,0 +1,46 @@
+import pytest
+
+from submit_ce.file_store.file_types import detect_file_type, source_format
+
+
+@pytest.mark.parametrize(
+    "name, head, file_type",
+    [
+        ("main.tex", b"\\documentclass{article}", "tex"),
+        ("paper", b"% a comment\n\n\\documentclass{article}", "tex"),
+        ("macros.sty", b"\\ProvidesPackage{macros}", "tex_aux"),
+        ("refs.bib", b"@article{a,}", "bibtex"),
+        ("main.bbl", b"\\begin{thebibliography}{1}", "bbl"),
+        ("fig1.eps", b"%PDF-1.5", "pdf"),
+        ("fig1.eps", b"%!PS-Adobe-3.0 EPSF-3.0", "postscript"),
+        ("fig1", b"\x89PNG\r\n\x1a\n\x00\x00", "image"),
+        ("fig1.jpg", b"\xff\xd8\xff\xe0", "image"),
+        ("00README.json", b"{}", "readme"),
+        ("index", b"<!DOCTYPE html><html>", "html"),
+        ("inner.tar.gz", b"\x1f\x8b\x08", "archive"),
+        ("notes.txt", b"some notes", "text"),
+        ("data.bin", bytes(range(256)), "binary"),
+    ],
+)
+def test_detect_file_type(name, head, file_type):
+    assert detect_file_type(name, head) == file_type
+
+
+@pytest.mark.parametrize(
+    "file_types, expected",
+    [
+        (["tex", "image", "pdf", "bibtex"], "pdftex"),
+        (["tex", "postscript", "bibtex"], "tex"),
+        (["tex", "postscript", "image"], "tex"),
+        (["tex", "tex_aux"], "tex"),
+        (["pdf"], "pdf"),
+        (["pdf", "readme"], "pdf"),
+        (["html", "image"], "html"),
+        (["postscript"], "ps"),
+        (["image", "text"], "invalid"),
+        ([None, None], None),
+        ([], None),
+    ],
+)
+def test_source_format(file_types, expected):
+    assert source_format(file_types) == expected
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+from submit_ce.jobs import JobFailed, QUEUED, RUNNING, DONE, FAILED
+from submit_ce.jobs.sqlite_queue import SqliteJobQueue
+from submit_ce.jobs.worker import LocalWorkers, run_one
+
+
+@pytest.fixture
+def queue(tmp_path) -> SqliteJobQueue:
+    return SqliteJobQueue(tmp_path / "jobs.db", max_attempts=2)
+
+
+def write_marker(job):
+    """Handler for the worker process test, module level so it can be pickled."""
+    with open(f"{job.kind}-{job.submission_id}", "w") as f:
+        f.write(str(job.job_id))
+    return '{"ok": true}'
+
+
+def test_enqueue_and_claim(queue):
+    first = queue.enqueue("process_upload", 1)
+    assert queue.enqueue("process_upload", 1) == first
+    second = queue.enqueue("process_upload", 2)
+    assert queue.latest(1) == first
+    assert queue.latest(3) is None
+    preview = queue.enqueue("build_preview", 1)
+    assert queue.latest(1) == preview
+    assert queue.latest(1, "process_upload") == first
+    assert queue.latest(2, "build_preview") is None
+
+    claimed = queue.claim("a")
+    assert (claimed.job_id, claimed.state, claimed.attempts) == (
+        first.job_id,
+        RUNNING,
+        1,
+    )
+    assert queue.enqueue("process_upload", 1).job_id not in (
+        first.job_id,
+        second.job_id,
+    )
+    queue.complete(claimed, '{"checksum": "x"}')
+    assert queue.get(first.job_id).state == DONE
+    assert queue.get(first.job_id).result == '{"checksum": "x"}'
+    assert queue.claim("b").job_id == second.job_id
+    assert queue.claim("c").job_id == preview.job_id
+
+
+def test_fail_and_retry(queue):
+    job = queue.enqueue("process_upload", 1)
+    queue.fail(queue.claim("a"), "lost the lock", retry=True)
+    assert queue.get(job.job_id).state == QUEUED
+    queue.fail(queue.claim("a"), "lost the lock", retry=True)
+    assert queue.get(job.job_id).state == FAILED
+    assert queue.get(job.job_id).error == "lost the lock"
+    assert queue.claim("a") is None
+
+
+def test_stale_job_claimed_again(tmp_path):
+    queue = SqliteJobQueue(tmp_path / "jobs.db", stale_seconds=0.05, max_attempts=2)
+    job = queue.enqueue("process_upload", 1)
+    assert queue.claim("a").job_id == job.job_id
+    assert queue.claim("b") is None
+    time.sleep(0.1)
+    assert queue.claim("b").attempts == 2
+    time.sleep(0.1)
+    assert queue.claim("c") is None
+    assert queue.get(job.job_id).state == FAILED
+
+
+def test_run_one(queue):
+    def fails(job):
+        raise JobFailed("not a valid package")
+
+    def breaks(job):
+        raise ConnectionError("database went away")
+
+    assert run_one(queue, {}, "a") is None
+    queue.enqueue("bad", 1)
+    assert run_one(queue, {"bad": fails}, "a").error == "not a valid package"
+    queue.enqueue("flaky", 2)
+    job = run_one(queue, {"flaky": breaks}, "a")
+    assert (job.state, job.error) == (QUEUED, "ConnectionError: database went away")
+    queue.enqueue("unknown", 3)
+    assert run_one(queue, {}, "a").state == FAILED
+
+
+def test_local_workers(queue, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    jobs = [queue.enqueue("mark", submission_id) for submission_id in range(4)]
+    workers = LocalWorkers(
+        queue, {"mark": write_marker}, processes=2, poll_seconds=0.05
+    )
+    workers.start()
+    try:
+        deadline = time.monotonic() + 60
+        while (
+            any(queue.get(job.job_id).state != DONE for job in jobs)
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.05)
+    finally:
+        workers.stop()
+    assert [queue.get(job.job_id).state for job in jobs] == [DONE] * 4
+    assert (tmp_path / "mark-3").read_text() == str(jobs[3].job_id)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from submit_ce.fastapi.api.models.agent import User, Client
+from submit_ce.fastapi.api.models.events import StartedNew, SetLicense
+from submit_ce.fastapi.implementations import legacy_async_implementation
+from submit_ce.fastapi.implementations.legacy_async_implementation import (
+    async_db_uri,
+    LegacyAsyncSubmitImplementation,
+)
+
+
+def test_async_db_uri():
+    assert async_db_uri("sqlite:///legacy.db") == "sqlite+aiosqlite:///legacy.db"
+    assert async_db_uri("mysql://u:p@db/arXiv") == "mysql+asyncmy://u:p@db/arXiv"
+    assert (
+        async_db_uri("mysql+mysqldb://u:p@db/arXiv") == "mysql+asyncmy://u:p@db/arXiv"
+    )
+
+
+def test_async_implementation(legacy_db):
+    engine, url, test_db_file = legacy_db
+    from arxiv.config import settings
+
+    settings.CLASSIC_DB_URI = url
+
+    user = User(
+        identifier="bobsmith",
+        forename="Bob",
+        surname="Smith",
+        suffix="",
+        email="bob@example.com",
+        affiliation="",
+    )
+    client = Client(remoteAddress="127.0.0.1", agent_type="test")
+    impl = LegacyAsyncSubmitImplementation()
+
+    async def run():
+        legacy_async_implementation.setup(None)
+        try:
+            async with legacy_async_implementation._async_session_factory() as session:
+                impl_data = {"session": session}
+                sid = await impl.start(
+                    impl_data, user, client, StartedNew(submission_type="new")
+                )
+                await impl.set_license_post(
+                    impl_data,
+                    user,
+                    client,
+                    sid,
+                    SetLicense(
+                        license_uri="http://creativecommons.org/licenses/by/4.0/"
+                    ),
+                )
+                data = await impl.get_submission(impl_data, user, client, sid)
+                assert str(data["submission_id"]) == sid
+                assert data["license"] == "http://creativecommons.org/licenses/by/4.0/"
+
+                with pytest.raises(HTTPException) as exc:
+                    await impl.get_submission(impl_data, user, client, "888888")
+                assert exc.value.status_code == 404
+        finally:
+            await legacy_async_implementation.shutdown(None)
+
+    asyncio.run(run())
@@ -0,0 +1,673 @@
+import asyncio
+import base64
+import io
+import os
+import stat
+import zipfile
+import tarfile
+from base64 import urlsafe_b64encode
+from hashlib import md5, sha256, blake2b
+
+import pytest
+from fastapi import UploadFile
+
+from submit_ce.file_store import SecurityError, atomic
+from submit_ce.file_store.extract import ExtractionError, ExtractionLimits
+from submit_ce.file_store.lease import LeaseHeld, LeaseLost
+from submit_ce.file_store.legacy_file_store import LegacyFileStore
+from submit_ce.file_store.manifest import SourceSummary, summarize_source
+from submit_ce.file_store.upload import (
+    UploadError,
+    UploadNotFound,
+    UploadOffsetMismatch,
+    UploadTooLarge,
+    UploadChecksumMismatch,
+    parse_upload_checksum,
+    parse_upload_metadata,
+)
+
+
+def make_tar_gz(files: dict, mtime: int = 0) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = mtime
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path) -> LegacyFileStore:
+    return LegacyFileStore(root_dir=tmp_path)
+
+
+def test_store_source_package(store, tmp_path):
+    package = make_tar_gz(
+        {"main.tex": b"\\documentclass{article}", "figs/fig1.png": b"\x89PNG" * 1000}
+    )
+    upload = UploadFile(io.BytesIO(package), filename="up.tar.gz")
+
+    checksum = asyncio.run(
+        store.store_source_package(12345678, upload, chunk_size=1024)
+    )
+
+    assert checksum == urlsafe_b64encode(md5(package).digest()).decode()
+    assert checksum == store.get_source_checksum(12345678)
+    src = tmp_path / "1234" / "12345678" / "src"
+    assert (src / "main.tex").read_bytes() == b"\\documentclass{article}"
+    assert (src / "figs" / "fig1.png").stat().st_size == 4000
+    assert store.does_source_exist(12345678)
+
+
+def test_store_source_package_bad_tar(store):
+    upload = UploadFile(io.BytesIO(b"not a tar file"), filename="up.tar.gz")
+    with pytest.raises(ExtractionError):
+        asyncio.run(store.store_source_package(12345679, upload))
+
+
+def test_checksum_sidecar(store, tmp_path):
+    package = make_tar_gz({"main.tex": b"\\documentclass{article}"})
+    checksum = asyncio.run(
+        store.store_source_package(12345678, UploadFile(io.BytesIO(package)))
+    )
+    sidecar = tmp_path / "1234" / "12345678" / "12345678.tar.gz.checksum"
+    assert sidecar.exists()
+    assert store.get_source_pacakge_checksum(12345678) == checksum
+
+    # a sidecar left stale by another writer is not trusted
+    other = make_tar_gz({"other.tex": b"\\documentclass{book}"})
+    (tmp_path / "1234" / "12345678" / "12345678.tar.gz").write_bytes(other)
+    assert (
+        store.get_source_checksum(12345678)
+        == urlsafe_b64encode(md5(other).digest()).decode()
+    )
+
+
+def test_store_preview(store):
+    pdf = b"%PDF-1.5 fake" * 100
+    checksum = store.store_preview(12345678, io.BytesIO(pdf))
+    assert checksum == urlsafe_b64encode(md5(pdf).digest()).decode()
+    assert store.get_preview_checksum(12345678) == checksum
+    assert store.does_preview_exist(12345678)
+    assert store.get_preview_source_checksum(12345678) is None
+
+    store.store_preview(12345678, io.BytesIO(pdf), source_checksum="src")
+    assert store.get_preview_source_checksum(12345678) == "src"
+    assert store.get_preview_checksum(12345678) == checksum
+    assert asyncio.run(store.delete_preview(12345678))
+    assert not store.does_preview_exist(12345678)
+    assert store.get_preview_source_checksum(12345678) is None
+    assert not asyncio.run(store.delete_preview(12345678))
+
+
+def test_checksum_algorithms(tmp_path):
+    store = LegacyFileStore(
+        root_dir=tmp_path, checksum_algorithms=["md5", "sha256", "blake2b"]
+    )
+    package = make_tar_gz({"main.tex": b"\\documentclass{article}"})
+    checksum = asyncio.run(
+        store.store_source_package(12345678, UploadFile(io.BytesIO(package)))
+    )
+    assert checksum == urlsafe_b64encode(md5(package).digest()).decode()
+    assert (
+        store.get_source_checksum(12345678, "sha256")
+        == f"sha256:{sha256(package).hexdigest()}"
+    )
+    assert (
+        store.get_source_checksum(12345678, "blake2b")
+        == f"blake2b:{blake2b(package).hexdigest()}"
+    )
+
+    with pytest.raises(ValueError):
+        LegacyFileStore(root_dir=tmp_path, checksum_algorithms=["crc32"])
+
+
+def test_extraction_limits_and_traversal(tmp_path):
+    store = LegacyFileStore(
+        root_dir=tmp_path, extraction_limits=ExtractionLimits(max_members=2)
+    )
+    package = make_tar_gz({"a.tex": b"a", "b.tex": b"b", "c.tex": b"c"})
+    with pytest.raises(ExtractionError):
+        asyncio.run(
+            store.store_source_package(12345678, UploadFile(io.BytesIO(package)))
+        )
+
+    store = LegacyFileStore(
+        root_dir=tmp_path, extraction_limits=ExtractionLimits(max_total_size=10)
+    )
+    package = make_tar_gz({"a.tex": b"a" * 11})
+    with pytest.raises(ExtractionError):
+        asyncio.run(
+            store.store_source_package(12345678, UploadFile(io.BytesIO(package)))
+        )
+
+    package = make_tar_gz({"../../escape.tex": b"a"})
+    with pytest.raises(SecurityError):
+        asyncio.run(
+            store.store_source_package(12345678, UploadFile(io.BytesIO(package)))
+        )
+    assert not (tmp_path / "1234" / "escape.tex").exists()
+
+    directory = tarfile.TarInfo("a")
+    directory.type = tarfile.DIRTYPE
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        tar.addfile(directory)
+        tar.addfile(tarfile.TarInfo("a"), io.BytesIO(b""))
+    with pytest.raises(SecurityError):
+        asyncio.run(
+            store.store_source_package(12345678, UploadFile(io.BytesIO(buf.getvalue())))
+        )
+
+
+def test_extraction_manifest_and_modes(tmp_path):
+    store = LegacyFileStore(
+        root_dir=tmp_path, source_file_mode=0o640, source_dir_mode=0o750
+    )
+    package = make_tar_gz(
+        {"./main.tex": b"\\documentclass{article}", "/figs/fig1.png": b"\x89PNG"}
+    )
+    source = tmp_path / "1234" / "12345678" / "src"
+    checksum, manifest = store._store_and_extract(io.BytesIO(package), 12345678, 1024)
+    assert {entry.name: entry.size for entry in manifest} == {
+        "main.tex": 23,
+        "figs/fig1.png": 4,
+    }
+    assert (
+        manifest[0].checksum
+        == urlsafe_b64encode(md5(b"\\documentclass{article}").digest()).decode()
+    )
+    assert stat.S_IMODE((source / "main.tex").stat().st_mode) == 0o640
+    assert stat.S_IMODE((source / "figs").stat().st_mode) == 0o750
+    assert stat.S_IMODE(source.stat().st_mode) == 0o750
+
+
+def make_zip(files: dict, streamed: bool = False) -> bytes:
+    """Zip with deflated members, `streamed` writes the sizes in data descriptors like
+    zip to a pipe does."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(
+        buf if not streamed else Unseekable(buf), "w", compression=zipfile.ZIP_DEFLATED
+    ) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+class Unseekable(io.RawIOBase):
+    def __init__(self, buf):
+        self.buf = buf
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buf.write(data)
+
+
+@pytest.mark.parametrize("package_format", ["tar", "bz2", "xz", "zip", "streamed-zip"])
+def test_package_formats(tmp_path, package_format):
+    files = {
+        "main.tex": b"\\documentclass{article}" * 1000,
+        "figs/fig1.png": b"\x89PNG" + bytes(range(256)) * 50,
+        "empty.txt": b"",
+    }
+    if package_format in ("zip", "streamed-zip"):
+        package = make_zip(files, streamed=package_format == "streamed-zip")
+    else:
+        buf = io.BytesIO()
+        with tarfile.open(
+            fileobj=buf, mode="w" if package_format == "tar" else f"w:{package_format}"
+        ) as tar:
+            for name, data in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        package = buf.getvalue()
+
+    store = LegacyFileStore(root_dir=tmp_path)
+    checksum = asyncio.run(
+        store.store_source_package(
+            12345678, UploadFile(io.BytesIO(package), filename="up"), chunk_size=1000
+        )
+    )
+    src = tmp_path / "1234" / "12345678" / "src"
+    for name, data in files.items():
+        assert (src / name).read_bytes() == data
+
+    # the package is stored as it was uploaded
+    suffix = {"tar": ".tar", "bz2": ".tar.bz2", "xz": ".tar.xz"}.get(
+        package_format, ".zip"
+    )
+    assert (
+        tmp_path / "1234" / "12345678" / f"12345678{suffix}"
+    ).read_bytes() == package
+    assert checksum == urlsafe_b64encode(md5(package).digest()).decode()
+    assert store.get_source_checksum(12345678) == checksum
+
+
+def test_upload_in_other_format_replaces_package(store, tmp_path):
+    asyncio.run(
+        store.store_source_package(
+            12345678, UploadFile(io.BytesIO(make_tar_gz({"a.tex": b"a"})))
+        )
+    )
+    package = make_zip({"b.tex": b"b"})
+    checksum = asyncio.run(
+        store.store_source_package(12345678, UploadFile(io.BytesIO(package)))
+    )
+    assert not (tmp_path / "1234" / "12345678" / "12345678.tar.gz").exists()
+    assert store.get_source_checksum(12345678) == checksum
+
+
+def test_single_file(tmp_path):
+    store = LegacyFileStore(root_dir=tmp_path)
+    pdf = b"%PDF-1.5 fake"
+    asyncio.run(
+        store.store_source_package(
+            12345678, UploadFile(io.BytesIO(pdf), filename="C:\\paper.pdf")
+        )
+    )
+    assert (tmp_path / "1234" / "12345678" / "src" / "paper.pdf").read_bytes() == pdf
+    with tarfile.open(tmp_path / "1234" / "12345678" / "12345678.tar.gz") as tar:
+        assert tar.getnames() == ["paper.pdf"]
+
+
+def test_bad_zip(tmp_path):
+    store = LegacyFileStore(root_dir=tmp_path)
+    package = make_zip({"main.tex": b"\\documentclass{article}" * 100})
+    corrupt = (
+        package.replace(b"main.tex", b"main.tex", 1)[:60] + b"\x00" * 10 + package[70:]
+    )
+    with pytest.raises(ExtractionError):
+        asyncio.run(
+            store.store_source_package(
+                12345678, UploadFile(io.BytesIO(corrupt), filename="up.zip")
+            )
+        )
+    with pytest.raises(ExtractionError):
+        asyncio.run(
+            store.store_source_package(
+                12345678, UploadFile(io.BytesIO(package[:80]), filename="up.zip")
+            )
+        )
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def test_source_file_put_get_delete(store, tmp_path):
+    package = make_tar_gz(
+        {"main.tex": b"\\documentclass{article}", "figs/fig1.png": b"\x89PNG" * 1000}
+    )
+    asyncio.run(store.store_source_package(12345678, UploadFile(io.BytesIO(package))))
+    package_checksum = store.get_source_checksum(12345678)
+
+    entry = asyncio.run(
+        store.store_source_file(12345678, "figs/fig2.png", chunks(b"\x89PNG", b"more"))
+    )
+    assert entry.name == "figs/fig2.png"
+    assert entry.size == 8
+    assert entry.checksum == urlsafe_b64encode(md5(b"\x89PNGmore").digest()).decode()
+    stored = asyncio.run(store.get_source_file(12345678, "figs/fig2.png"))
+    assert stored.path.read_bytes() == b"\x89PNGmore"
+    assert stored.checksum == entry.checksum
+    assert not list((tmp_path / "1234" / "12345678" / "src" / "figs").glob(".*.tmp"))
+
+    # the package no longer matches the source, the checksum comes from the manifest
+    assert not (tmp_path / "1234" / "12345678" / "12345678.tar.gz").exists()
+    assert store.does_source_exist(12345678)
+    with_fig2 = store.get_source_checksum(12345678)
+    assert with_fig2 != package_checksum
+
+    asyncio.run(
+        store.store_source_file(12345678, "main.tex", chunks(b"\\documentclass{book}"))
+    )
+    assert (
+        asyncio.run(store.get_source_file(12345678, "main.tex")).path.read_bytes()
+        == b"\\documentclass{book}"
+    )
+    assert store.get_source_checksum(12345678) != with_fig2
+
+    assert asyncio.run(store.delete_source_file(12345678, "figs/fig2.png"))
+    assert not asyncio.run(store.delete_source_file(12345678, "figs/fig2.png"))
+    assert asyncio.run(store.get_source_file(12345678, "figs/fig2.png")) is None
+    assert asyncio.run(store.get_source_file(12345678, "figs")) is None
+    assert store.get_source_checksum(12345678) not in (with_fig2, package_checksum)
+
+    with pytest.raises(SecurityError):
+        asyncio.run(store.store_source_file(12345678, "../escape.tex", chunks(b"x")))
+    with pytest.raises(SecurityError):
+        asyncio.run(store.get_source_file(12345678, "../../12345678.manifest.jsonl"))
+
+
+def test_source_file_limits(tmp_path):
+    store = LegacyFileStore(
+        root_dir=tmp_path,
+        extraction_limits=ExtractionLimits(max_members=2, max_total_size=10),
+    )
+    asyncio.run(store.store_source_file(12345678, "a.tex", chunks(b"12345")))
+    asyncio.run(
+        store.store_source_file(12345678, "a.tex", chunks(b"1234567"))
+    )  # replacing is not adding
+    with pytest.raises(ExtractionError):
+        asyncio.run(store.store_source_file(12345678, "b.tex", chunks(b"1234")))
+    assert asyncio.run(store.get_source_file(12345678, "b.tex")) is None
+    asyncio.run(store.store_source_file(12345678, "b.tex", chunks(b"123")))
+    with pytest.raises(ExtractionError):
+        asyncio.run(store.store_source_file(12345678, "c.tex", chunks(b"")))
+
+
+def test_get_source_package_and_preview(store, tmp_path):
+    assert asyncio.run(store.get_source_package(12345678)) is None
+    assert asyncio.run(store.get_preview(12345678)) is None
+
+    package = make_tar_gz({"main.tex": b"\\documentclass{article}"})
+    checksum = asyncio.run(
+        store.store_source_package(12345678, UploadFile(io.BytesIO(package)))
+    )
+    stored = asyncio.run(store.get_source_package(12345678))
+    assert stored.path.read_bytes() == package
+    assert (stored.size, stored.checksum) == (len(package), checksum)
+
+    # after a single file changes the package is made from the source
+    asyncio.run(store.store_source_file(12345678, "figs/fig1.png", chunks(b"\x89PNG")))
+    stored = asyncio.run(store.get_source_package(12345678))
+    assert (
+        stored.checksum
+        == urlsafe_b64encode(md5(stored.path.read_bytes()).digest()).decode()
+    )
+    with tarfile.open(stored.path) as tar:
+        assert sorted(tar.getnames()) == ["figs/fig1.png", "main.tex"]
+        assert tar.extractfile("figs/fig1.png").read() == b"\x89PNG"
+    assert store.get_source_pacakge_checksum(12345678) == stored.checksum
+
+    checksum = store.store_preview(12345678, io.BytesIO(b"%PDF-1.5 fake"))
+    stored = asyncio.run(store.get_preview(12345678))
+    assert (stored.size, stored.checksum) == (13, checksum)
+
+
+def test_source_package_changed_while_made(store, monkeypatch):
+    asyncio.run(
+        store.store_source_file(
+            12345678, "main.tex", chunks(b"\\documentclass{article}")
+        )
+    )
+    fchmod, changes = os.fchmod, []
+
+    def change_before_publish(fd, mode):
+        fchmod(fd, mode)
+        # the first is of the package being made, a file is written before it is
+        # published
+        if not changes:
+            changes.append(fd)
+            store._store_source_file(12345678, "b.tex", io.BytesIO(b"b"))
+
+    monkeypatch.setattr(os, "fchmod", change_before_publish)
+    stored = asyncio.run(store.get_source_package(12345678))
+    with tarfile.open(stored.path) as tar:
+        assert sorted(tar.getnames()) == ["b.tex", "main.tex"]
+    assert len(changes) == 1
+
+
+def test_resumable_upload(store, tmp_path):
+    package = make_tar_gz(
+        {
+            "main.tex": b"\\documentclass{article}",
+            "figs/fig1.png": bytes(range(256)) * 100,
+        }
+    )
+    half = len(package) // 2
+
+    state = asyncio.run(store.create_upload(12345678, len(package)))
+    assert (state.offset, state.length, state.complete) == (0, len(package), False)
+
+    state = asyncio.run(
+        store.append_upload(
+            12345678,
+            0,
+            chunks(package[:100], package[100:half]),
+            ("sha256", sha256(package[:half]).digest()),
+        )
+    )
+    assert state.offset == half
+    assert asyncio.run(store.get_upload(12345678)).offset == half
+
+    with pytest.raises(UploadOffsetMismatch):
+        asyncio.run(store.append_upload(12345678, 0, chunks(package)))
+    with pytest.raises(UploadChecksumMismatch):
+        asyncio.run(
+            store.append_upload(
+                12345678, half, chunks(package[half:]), ("md5", md5(b"other").digest())
+            )
+        )
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(
+            store.append_upload(12345678, half, chunks(package[half:], b"extra"))
+        )
+    assert asyncio.run(store.get_upload(12345678)).offset == half
+
+    # without a checksum the bytes before a dropped connection are kept
+    async def dropped():
+        yield package[half : half + 10]
+        raise ConnectionError()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(store.append_upload(12345678, half, dropped()))
+    assert asyncio.run(store.get_upload(12345678)).offset == half + 10
+
+    state = asyncio.run(
+        store.append_upload(12345678, half + 10, chunks(package[half + 10 :]))
+    )
+    assert state.complete
+    checksum = asyncio.run(store.finish_upload(12345678))
+    assert checksum == urlsafe_b64encode(md5(package).digest()).decode()
+    assert (tmp_path / "1234" / "12345678" / "12345678.tar.gz").read_bytes() == package
+    assert (
+        tmp_path / "1234" / "12345678" / "src" / "figs" / "fig1.png"
+    ).read_bytes() == bytes(range(256)) * 100
+    assert store.get_source_checksum(12345678) == checksum
+    assert asyncio.run(store.get_upload(12345678)) is None
+    assert not asyncio.run(store.delete_upload(12345678))
+
+
+def test_resumable_upload_not_a_package(store):
+    asyncio.run(store.create_upload(12345678, 9, filename="up.tar.gz"))
+    asyncio.run(store.append_upload(12345678, 0, chunks(b"not a tar")))
+    with pytest.raises(ExtractionError):
+        asyncio.run(store.finish_upload(12345678))
+    assert asyncio.run(store.get_upload(12345678)) is None
+    assert not store.does_source_exist(12345678)
+    with pytest.raises(UploadNotFound):
+        asyncio.run(store.append_upload(12345678, 0, chunks(b"x")))
+
+
+def test_parse_upload_headers():
+    assert parse_upload_checksum(None) is None
+    assert parse_upload_checksum("sha1 " + base64.b64encode(b"digest").decode()) == (
+        "sha1",
+        b"digest",
+    )
+    for header in ["sha1", "sha1 not*base64", "crc32 AAAA"]:
+        with pytest.raises(UploadError):
+            parse_upload_checksum(header)
+    assert parse_upload_metadata(
+        "filename " + base64.b64encode(b"main.tex").decode() + ",empty "
+    ) == {"filename": "main.tex", "empty": ""}
+
+
+@pytest.mark.parametrize("exchange", [True, False])
+def test_upload_is_published_atomically(tmp_path, monkeypatch, exchange):
+    if not exchange:
+        monkeypatch.setattr(atomic, "exchange_paths", lambda a, b: False)
+    store = LegacyFileStore(root_dir=tmp_path)
+    submission_path = tmp_path / "1234" / "12345678"
+    first = make_tar_gz({"main.tex": b"first", "figs/fig1.png": b"fig1"})
+    asyncio.run(store.store_source_package(12345678, UploadFile(io.BytesIO(first))))
+    reader = open(submission_path / "src" / "main.tex", "rb")
+
+    # a failed upload leaves the source as it was
+    bad = make_tar_gz({"main.tex": b"second", "../escape.tex": b"x"})
+    with pytest.raises(SecurityError):
+        asyncio.run(store.store_source_package(12345678, UploadFile(io.BytesIO(bad))))
+    assert (submission_path / "src" / "main.tex").read_bytes() == b"first"
+    assert (submission_path / "12345678.tar.gz").read_bytes() == first
+
+    # an upload adds to the source without changing files that readers have open
+    second = make_tar_gz({"main.tex": b"second", "figs/fig2.png": b"fig2"})
+    asyncio.run(store.store_source_package(12345678, UploadFile(io.BytesIO(second))))
+    assert reader.read() == b"first"
+    reader.close()
+    src = submission_path / "src"
+    assert (src / "main.tex").read_bytes() == b"second"
+    assert (src / "figs" / "fig1.png").read_bytes() == b"fig1"
+    assert (src / "figs" / "fig2.png").read_bytes() == b"fig2"
+
+    store.wait_for_background()
+    assert sorted(path.name for path in submission_path.iterdir()) == [
+        "12345678.manifest.jsonl",
+        "12345678.tar.gz",
+        "12345678.tar.gz.checksum",
+        "src",
+    ]
+
+
+def test_stale_staging_is_removed(store, tmp_path):
+    submission_path = tmp_path / "1234" / "12345678"
+    stale = submission_path / ".staging-crashed"
+    (stale / "src").mkdir(parents=True)
+    os.utime(stale, (0, 0))
+    asyncio.run(
+        store.store_source_package(
+            12345678, UploadFile(io.BytesIO(make_tar_gz({"a.tex": b"a"})))
+        )
+    )
+    store.wait_for_background()
+    assert not stale.exists()
+
+
+def test_exchange_paths(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "file").write_text("a")
+    (tmp_path / "b").mkdir()
+    if not atomic.exchange_paths(tmp_path / "a", tmp_path / "b"):
+        pytest.skip("renameat2 is not supported here")
+    assert not (tmp_path / "a" / "file").exists()
+    assert (tmp_path / "b" / "file").read_text() == "a"
+
+
+def test_lease_file(store):
+    lease_file = store.lease_file(12345678)
+    assert lease_file.version() == 0
+    lease = lease_file.acquire(ttl=60, now=1000)
+    with pytest.raises(LeaseHeld):
+        lease_file.acquire(ttl=60, now=1059)
+    lease_file.check(lease)
+    assert lease_file.release(lease, published=True) == 1
+    with pytest.raises(LeaseLost):
+        lease_file.release(lease, published=True)
+
+    # an expired lease is held until another writer takes it, then the first can't
+    # publish
+    first = lease_file.acquire(ttl=60, now=2000)
+    lease_file.check(first)
+    second = lease_file.acquire(ttl=60, now=2061)
+    with pytest.raises(LeaseLost):
+        lease_file.check(first)
+    assert lease_file.release(second, published=False) == 1
+
+
+def test_stage_and_publish(store, tmp_path):
+    asyncio.run(
+        store.store_source_package(
+            12345678, UploadFile(io.BytesIO(make_tar_gz({"a.tex": b"a"})))
+        )
+    )
+    package = make_tar_gz({"a.tex": b"new a"})
+    staged = asyncio.run(
+        store.stage_source_package(12345678, UploadFile(io.BytesIO(package)))
+    )
+    src = tmp_path / "1234" / "12345678" / "src"
+    assert (src / "a.tex").read_bytes() == b"a"
+    assert staged.summary == SourceSummary(
+        file_count=1, source_size=5, source_format="tex"
+    )
+    assert staged.package == "12345678.tar.gz"
+    assert (
+        asyncio.run(store.publish_staged(staged))
+        == urlsafe_b64encode(md5(package).digest()).decode()
+    )
+    assert (src / "a.tex").read_bytes() == b"new a"
+
+    staged = asyncio.run(
+        store.stage_source_package(
+            12345678, UploadFile(io.BytesIO(make_tar_gz({"b.tex": b"b"})))
+        )
+    )
+    store.discard_staged(staged)
+    store.wait_for_background()
+    assert not (src / "b.tex").exists()
+    assert not staged.staging.exists()
+
+
+def test_list_source_files(store, tmp_path):
+    assert asyncio.run(store.list_source_files(12345678)) is None
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for name, data in {
+            "main.tex": b"\\documentclass{article}",
+            "fig.eps": b"%!PS-Adobe",
+        }.items():
+            info = tarfile.TarInfo(name)
+            info.size, info.mtime = len(data), 1700000000
+            tar.addfile(info, io.BytesIO(data))
+    asyncio.run(
+        store.store_source_package(12345678, UploadFile(io.BytesIO(buf.getvalue())))
+    )
+    asyncio.run(store.store_source_file(12345678, "refs.bib", chunks(b"@article{a,}")))
+
+    files = asyncio.run(store.list_source_files(12345678))
+    assert summarize_source(files) == SourceSummary(
+        file_count=3, source_size=45, source_format="tex", main_files=("main.tex",)
+    )
+    assert [(f.name, f.size, f.file_type) for f in files] == [
+        ("fig.eps", 10, "postscript"),
+        ("main.tex", 23, "tex"),
+        ("refs.bib", 12, "bibtex"),
+    ]
+    assert files[0].mtime == 1700000000
+    assert files[2].mtime > 1700000000
+
+    # a source from before manifests is scanned
+    os.unlink(tmp_path / "1234" / "12345678" / "12345678.manifest.jsonl")
+    assert [
+        (f.name, f.file_type) for f in asyncio.run(store.list_source_files(12345678))
+    ] == [("fig.eps", "postscript"), ("main.tex", "tex"), ("refs.bib", "bibtex")]
+
+
+def test_legacy_source_modes_fixed(tmp_path):
+    store = LegacyFileStore(
+        root_dir=tmp_path, source_file_mode=0o640, source_dir_mode=0o750
+    )
+    src = tmp_path / "1234" / "12345678" / "src"
+    os.makedirs(src / "figs")
+    (src / "figs" / "fig.png").write_bytes(b"\x89PNG\r\n\x1a\n")
+    os.chmod(src / "figs" / "fig.png", 0o600)
+    assert asyncio.run(store.fix_source_modes(87654321)).checked == 0
+
+    asyncio.run(
+        store.store_source_package(
+            12345678, UploadFile(io.BytesIO(make_tar_gz({"main.tex": b"a"})))
+        )
+    )
+    assert stat.S_IMODE(os.stat(src / "figs" / "fig.png").st_mode) == 0o640
+    assert stat.S_IMODE(os.stat(src / "main.tex").st_mode) == 0o640
+
+    os.chmod(src / "main.tex", 0o666)
+    changes = asyncio.run(store.fix_source_modes(12345678))
+    assert (changes.checked, changes.chmods) == (4, 1)
+    assert stat.S_IMODE(os.stat(src / "main.tex").st_mode) == 0o640
@@ -0,0 +1,115 @@
+import os
+
+import arxiv.db
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from submit_ce.fastapi.implementations import legacy_implementation as legacy
+
+
+class FakeEngine:
+    def __init__(self, url, **kwargs):
+        self.url = url
+        self.kwargs = kwargs
+        self.disposed = []
+
+    def dispose(self, close=True):
+        self.disposed.append(close)
+
+
+class FakePreviews:
+    def shutdown(self):
+        pass
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    """The engines `setup` makes, with `create_engine` faked so no database is
+    needed."""
+    made = []
+
+    def create_engine(url, **kwargs):
+        made.append(FakeEngine(url, **kwargs))
+        return made[-1]
+
+    monkeypatch.setattr(legacy, "create_engine", create_engine)
+    monkeypatch.setattr(legacy, "configure_db_engine", lambda classic, latexml: None)
+    monkeypatch.setattr(legacy, "_engine", None)
+    monkeypatch.setattr(legacy, "_engine_pid", None)
+    monkeypatch.setattr(arxiv.db, "session_factory", arxiv.db.session_factory)
+    monkeypatch.setattr(legacy.implementation.impl, "previews", FakePreviews())
+    monkeypatch.setattr(legacy.settings, "CLASSIC_DB_URI", "mysql://user:pass@db/arXiv")
+    return made
+
+
+def test_setup_once_per_process(engines, monkeypatch):
+    monkeypatch.setattr(legacy.legacy_specific_settings, "legacy_db_pool_size", 3)
+    monkeypatch.setattr(legacy.legacy_specific_settings, "legacy_db_max_overflow", 4)
+    monkeypatch.setattr(legacy.legacy_specific_settings, "legacy_db_pool_timeout", 5)
+    monkeypatch.setattr(legacy.legacy_specific_settings, "legacy_db_pool_recycle", 60)
+    monkeypatch.setattr(
+        legacy.legacy_specific_settings, "legacy_db_pool_pre_ping", False
+    )
+
+    legacy.setup(None)
+    legacy.setup(None)
+    assert len(engines) == 1 and legacy._engine is engines[0]
+    assert engines[0].url == "mysql://user:pass@db/arXiv"
+    assert {
+        name: engines[0].kwargs[name]
+        for name in (
+            "pool_size",
+            "max_overflow",
+            "pool_timeout",
+            "pool_recycle",
+            "pool_pre_ping",
+        )
+    } == {
+        "pool_size": 3,
+        "max_overflow": 4,
+        "pool_timeout": 5,
+        "pool_recycle": 60,
+        "pool_pre_ping": False,
+    }
+    assert arxiv.db.session_factory.kw["bind"] is engines[0]
+
+
+def test_setup_after_fork(engines, monkeypatch):
+    legacy.setup(None)
+    parent = os.getpid()
+    monkeypatch.setattr(legacy.os, "getpid", lambda: parent + 1)
+    legacy.setup(None)
+    assert len(engines) == 2 and legacy._engine is engines[1]
+    assert engines[0].disposed == [
+        False
+    ]  # the parent's connections are left open for the parent
+    legacy.setup(None)
+    assert len(engines) == 2
+
+
+def test_shutdown_disposes_of_the_engine(engines):
+    legacy.setup(None)
+    legacy.shutdown(None)
+    assert engines[0].disposed == [True]
+    assert legacy._engine is None
+    legacy.shutdown(None)
+    legacy.setup(None)
+    assert len(engines) == 2
+
+
+def test_lock_row_on_sqlite(legacy_db, client):
+    sid = client.post("/v1/start", json={"submission_type": "new"}).text
+    url = legacy_db[1]
+    with Session(create_engine(url)) as locked:
+        legacy.check_submission_exists(locked, sid, lock_row=True)
+        with Session(create_engine(url, connect_args={"timeout": 0.1})) as other:
+            with pytest.raises(OperationalError, match="locked"):
+                legacy.check_submission_exists(other, sid, lock_row=True)
+            other.rollback()
+            locked.rollback()
+            assert legacy.check_submission_exists(
+                other, sid, lock_row=True
+            ).submission_id == int(sid)
+            other.rollback()
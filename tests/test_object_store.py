@@ -0,0 +1,257 @@
+import asyncio
+import io
+import os
+from base64 import urlsafe_b64encode
+from hashlib import md5
+
+import pytest
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from submit_ce.fastapi.api.responses import stored_file_response
+from submit_ce.file_store import SecurityError
+from submit_ce.file_store.extract import ExtractionError, ExtractionLimits
+from submit_ce.file_store.lease import LeaseHeld
+from submit_ce.file_store.object_store import ObjectFileStore
+from submit_ce.file_store.upload import UploadOffsetMismatch, UploadChecksumMismatch
+from tests.fake_object_store import FakeS3Client
+from tests.test_legacy_file_store import make_tar_gz, chunks
+
+PART_SIZE = 1024
+
+
+def legacy_md5(data: bytes) -> str:
+    return urlsafe_b64encode(md5(data).digest()).decode()
+
+
+async def read_all(stored) -> bytes:
+    return b"".join([chunk async for chunk in stored.read_range(0, stored.size - 1)])
+
+
+@pytest.fixture
+def client() -> FakeS3Client:
+    return FakeS3Client(min_part_size=PART_SIZE)
+
+
+@pytest.fixture
+def store(client, tmp_path) -> ObjectFileStore:
+    return ObjectFileStore(
+        client,
+        client.bucket,
+        prefix="sub/",
+        part_size=PART_SIZE,
+        read_size=256,
+        scratch_dir=str(tmp_path),
+    )
+
+
+def test_store_source_package(store, client, tmp_path):
+    figure = os.urandom(10 * PART_SIZE)
+    package = make_tar_gz(
+        {"main.tex": b"\\documentclass{article}", "figs/fig1.png": figure}
+    )
+
+    checksum = asyncio.run(
+        store.store_source_package(12345678, UploadFile(io.BytesIO(package)))
+    )
+
+    assert checksum == legacy_md5(package)
+    assert checksum == store.get_source_checksum(12345678)
+    assert store.does_source_exist(12345678)
+    assert client.max_parts_at_once > 1
+    assert not os.listdir(tmp_path)
+
+    stored = asyncio.run(store.get_source_file(12345678, "figs/fig1.png"))
+    assert stored.path is None
+    assert stored.size == len(figure)
+    assert stored.checksum == legacy_md5(figure)
+    assert asyncio.run(read_all(stored)) == figure
+
+    package_stored = asyncio.run(store.get_source_package(12345678))
+    assert package_stored.name == "12345678.tar.gz"
+    assert asyncio.run(read_all(package_stored)) == package
+    package_key = next(
+        key for key in client.objects if key.startswith("sub/1234/12345678/package/")
+    )
+    assert client.objects[package_key]["Metadata"] == {"checksum-md5": checksum}
+    files = asyncio.run(store.list_source_files(12345678))
+    assert [(entry.name, entry.file_type) for entry in files] == [
+        ("figs/fig1.png", "image"),
+        ("main.tex", "tex"),
+    ]
+    assert asyncio.run(store.get_source_file(12345678, "nope.tex")) is None
+
+
+def test_replace_removes_unused_objects(store, client):
+    asyncio.run(
+        store.store_source_package(
+            12345678, UploadFile(io.BytesIO(make_tar_gz({"a.tex": b"a"})))
+        )
+    )
+    asyncio.run(
+        store.store_source_package(
+            12345678,
+            UploadFile(io.BytesIO(make_tar_gz({"a.tex": b"new a", "b.tex": b"b"}))),
+        )
+    )
+    store.wait_for_background()
+    keys = [key for key in client.objects if key.startswith("sub/1234/12345678/")]
+    assert len([key for key in keys if "/objects/" in key]) == 2
+    assert len([key for key in keys if "/package/" in key]) == 1
+    assert (
+        asyncio.run(read_all(asyncio.run(store.get_source_file(12345678, "a.tex"))))
+        == b"new a"
+    )
+
+
+def test_bad_package_leaves_nothing(store, client):
+    with pytest.raises(ExtractionError):
+        asyncio.run(
+            store.store_source_package(
+                12345678, UploadFile(io.BytesIO(b"\x1f\x8bnot a tar"))
+            )
+        )
+    store.wait_for_background()
+    assert not client.objects
+    assert not client.uploads
+    assert not store.does_source_exist(12345678)
+
+
+def test_single_file_and_limits(client, tmp_path):
+    store = ObjectFileStore(
+        client,
+        client.bucket,
+        part_size=PART_SIZE,
+        scratch_dir=str(tmp_path),
+        extraction_limits=ExtractionLimits(max_members=2, max_total_size=10),
+    )
+    staged = asyncio.run(
+        store.stage_source_package(
+            12345678, UploadFile(io.BytesIO(b"hello"), filename="main.tex")
+        )
+    )
+    assert (staged.package, staged.summary.file_count, staged.summary.source_size) == (
+        "12345678.tar.gz",
+        1,
+        5,
+    )
+    asyncio.run(store.publish_staged(staged))
+    assert (
+        asyncio.run(read_all(asyncio.run(store.get_source_file(12345678, "main.tex"))))
+        == b"hello"
+    )
+    assert asyncio.run(store.get_source_package(12345678)).name == "12345678.tar.gz"
+    with pytest.raises(ExtractionError):
+        asyncio.run(store.store_source_file(12345678, "big.tex", chunks(b"123456")))
+
+
+def test_source_files(store, client):
+    asyncio.run(
+        store.store_source_package(
+            12345678, UploadFile(io.BytesIO(make_tar_gz({"a.tex": b"a"})))
+        )
+    )
+    package_checksum = store.get_source_checksum(12345678)
+
+    entry = asyncio.run(
+        store.store_source_file(
+            12345678, "figs/b.png", chunks(os.urandom(3 * PART_SIZE))
+        )
+    )
+    assert entry.size == 3 * PART_SIZE
+    stored = asyncio.run(store.get_source_file(12345678, "figs/b.png"))
+    assert stored.checksum == entry.checksum
+    store.wait_for_background()
+    assert client.objects[
+        [
+            key
+            for key in client.objects
+            if "/objects/" in key and len(client.objects[key]["Body"]) == entry.size
+        ][0]
+    ]["Metadata"] == {"checksum-md5": entry.checksum}
+    assert not [key for key in client.objects if "/package/" in key]
+
+    changed = store.get_source_checksum(12345678)
+    assert changed != package_checksum
+    built = asyncio.run(store.get_source_package(12345678))
+    assert built.checksum == asyncio.run(store.get_source_package(12345678)).checksum
+    assert client.calls["CompleteMultipartUpload"] >= 1
+
+    assert asyncio.run(store.delete_source_file(12345678, "figs/b.png"))
+    assert not asyncio.run(store.delete_source_file(12345678, "figs/b.png"))
+    assert store.get_source_checksum(12345678) not in (changed, package_checksum)
+    store.wait_for_background()
+    assert not [key for key in client.objects if "/package/built-" in key]
+    with pytest.raises(SecurityError):
+        asyncio.run(store.store_source_file(12345678, "../x.tex", chunks(b"x")))
+
+
+def test_preview_ranged_get(store, client):
+    pdf = os.urandom(5 * PART_SIZE)
+    checksum = store.store_preview(12345678, io.BytesIO(pdf))
+    assert checksum == legacy_md5(pdf) == store.get_preview_checksum(12345678)
+    assert store.does_preview_exist(12345678)
+    app = FastAPI()
+
+    @app.get("/preview")
+    async def preview(request: Request):
+        return stored_file_response(
+            request, await store.get_preview(12345678), media_type="application/pdf"
+        )
+
+    with TestClient(app) as http:
+        response = http.get("/preview", headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.content == pdf[100:200]
+        assert response.headers["content-range"] == f"bytes 100-199/{len(pdf)}"
+        assert client.ranges[-1] == ("sub/1234/12345678/12345678.pdf", "bytes=100-199")
+        assert (
+            http.get("/preview", headers={"If-None-Match": f'"{checksum}"'}).status_code
+            == 304
+        )
+        assert http.get("/preview").content == pdf
+
+
+def test_preview_source_checksum(store, client):
+    assert store.get_preview_source_checksum(12345678) is None
+    store.store_preview(12345678, io.BytesIO(b"%PDF-1.5 fake"), source_checksum="src")
+    assert store.get_preview_source_checksum(12345678) == "src"
+    assert asyncio.run(store.delete_preview(12345678))
+    assert not store.does_preview_exist(12345678)
+    assert store.get_preview_source_checksum(12345678) is None
+    assert not asyncio.run(store.delete_preview(12345678))
+
+
+def test_resumable_upload(store, client):
+    package = make_tar_gz({"main.tex": os.urandom(2000)})
+    asyncio.run(store.create_upload(12345678, len(package)))
+    state = asyncio.run(store.append_upload(12345678, 0, chunks(package[:1000])))
+    assert state.offset == 1000
+    with pytest.raises(UploadOffsetMismatch):
+        asyncio.run(store.append_upload(12345678, 0, chunks(package[1000:])))
+    with pytest.raises(UploadChecksumMismatch):
+        asyncio.run(
+            store.append_upload(
+                12345678, 1000, chunks(package[1000:]), ("md5", b"0" * 16)
+            )
+        )
+    assert asyncio.run(store.get_upload(12345678)).offset == 1000
+    checksum = ("md5", md5(package[1000:]).digest())
+    state = asyncio.run(
+        store.append_upload(12345678, 1000, chunks(package[1000:]), checksum)
+    )
+    assert state.complete
+
+    assert asyncio.run(store.finish_upload(12345678)) == legacy_md5(package)
+    assert asyncio.run(store.get_upload(12345678)) is None
+    assert not [key for key in client.objects if "/upload" in key]
+    assert not client.uploads
+
+
+def test_lease_file(store):
+    lease_file = store.lease_file(12345678)
+    lease = lease_file.acquire(ttl=60)
+    with pytest.raises(LeaseHeld):
+        store.lease_file(12345678).acquire(ttl=60)
+    assert lease_file.release(lease, published=True) == 1
+    assert store.lease_file(12345678).version() == 1
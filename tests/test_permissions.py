@@ -0,0 +1,54 @@
+import os
+import stat
+
+from submit_ce.file_store import permissions
+from submit_ce.file_store.extract import FileModes
+from submit_ce.file_store.permissions import set_tree_modes
+
+MODES = FileModes(file_mode=0o640, dir_mode=0o750, uid=os.geteuid(), gid=os.getegid())
+
+
+def mode(path) -> int:
+    return stat.S_IMODE(os.lstat(path).st_mode)
+
+
+def make_tree(root, files: int):
+    os.makedirs(root / "a" / "b")
+    for i in range(files):
+        (root / "a" / "b" / f"{i}.tex").write_bytes(b"x")
+    (root / "main.tex").write_bytes(b"x")
+    os.symlink("main.tex", root / "link.tex")
+
+
+def test_set_tree_modes(tmp_path, monkeypatch):
+    monkeypatch.setattr(permissions, "BATCH_SIZE", 4)
+    root = tmp_path / "src"
+    make_tree(root, 10)
+    for path in (
+        root,
+        root / "a",
+        root / "a" / "b",
+        root / "main.tex",
+        *(root / "a" / "b").iterdir(),
+    ):
+        os.chmod(path, 0o750 if path.is_dir() else 0o640)
+    os.chmod(root / "main.tex", 0o666)
+    os.chmod(root / "a" / "b", 0o777)
+    link_mode = os.lstat(root / "link.tex").st_mode
+
+    changes = set_tree_modes(root, MODES, workers=3)
+    assert (changes.checked, changes.chmods, changes.chowns) == (14, 2, 0)
+    assert mode(root / "main.tex") == 0o640
+    assert mode(root / "a" / "b") == 0o750
+    assert os.lstat(root / "link.tex").st_mode == link_mode
+
+    changes = set_tree_modes(root, MODES, workers=3)
+    assert (changes.checked, changes.chmods, changes.chowns) == (14, 0, 0)
+
+
+def test_set_modes_of_file(tmp_path):
+    path = tmp_path / "main.tex"
+    path.write_bytes(b"x")
+    os.chmod(path, 0o600)
+    assert set_tree_modes(path, MODES).chmods == 1
+    assert mode(path) == 0o640
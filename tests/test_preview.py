@@ -0,0 +1,137 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from fastapi import UploadFile
+
+from submit_ce.file_store.legacy_file_store import LegacyFileStore
+from submit_ce.file_store.object_store import ObjectFileStore
+from submit_ce.preview import PreviewBuilder, CompileError
+from submit_ce.preview.pdflatex import PdfLatex
+from tests.fake_object_store import FakeS3Client
+from tests.test_legacy_file_store import make_tar_gz, chunks
+
+MAIN = (
+    b"\\documentclass{article}\\begin{document}\\input{sections/intro}\\end{document}"
+)
+
+
+class StubCompiler:
+    """Writes a PDF of the names and contents of the source files instead of running
+    TeX."""
+
+    def __init__(self):
+        self.compiles = []
+
+    def __call__(self, source_dir: Path, main_file: str, output_dir: Path) -> Path:
+        self.compiles.append(main_file)
+        if b"\\error" in (source_dir / main_file).read_bytes():
+            raise CompileError(f"{main_file} did not compile")
+        pdf = output_dir / (Path(main_file).stem + ".pdf")
+        files = sorted(p for p in source_dir.rglob("*") if p.is_file())
+        pdf.write_bytes(
+            b"%PDF-1.5\n"
+            + b"\n".join(
+                bytes(p.relative_to(source_dir)) + b"=" + p.read_bytes() for p in files
+            )
+        )
+        return pdf
+
+
+@pytest.fixture
+def compiler() -> StubCompiler:
+    return StubCompiler()
+
+
+@pytest.fixture
+def builder(compiler) -> PreviewBuilder:
+    return PreviewBuilder(compiler, pool=ThreadPoolExecutor(2))
+
+
+@pytest.fixture(params=["legacy", "object"])
+def store(request, tmp_path):
+    if request.param == "legacy":
+        return LegacyFileStore(root_dir=tmp_path)
+    client = FakeS3Client()
+    return ObjectFileStore(client, client.bucket, scratch_dir=str(tmp_path))
+
+
+def deposit(store, files: dict) -> None:
+    asyncio.run(
+        store.store_source_package(12345678, UploadFile(io.BytesIO(make_tar_gz(files))))
+    )
+
+
+def test_build_is_keyed_by_source_checksum(store, builder, compiler):
+    deposit(store, {"main.tex": MAIN, "sections/intro.tex": b"Hello"})
+
+    built = asyncio.run(builder.build(store, 12345678))
+    assert built.compiled
+    assert compiler.compiles == ["main.tex"]
+    assert built.source_checksum == store.get_source_pacakge_checksum(12345678)
+    assert store.get_preview_source_checksum(12345678) == built.source_checksum
+    preview = asyncio.run(store.get_preview(12345678))
+    assert preview.checksum == built.checksum
+    assert store.get_preview_checksum(12345678) == built.checksum
+
+    again = asyncio.run(builder.build(store, 12345678))
+    assert (again.checksum, again.compiled) == (built.checksum, False)
+    assert compiler.compiles == ["main.tex"]
+
+    asyncio.run(
+        store.store_source_file(12345678, "sections/intro.tex", chunks(b"Changed"))
+    )
+    changed = asyncio.run(builder.build(store, 12345678))
+    assert changed.compiled and changed.checksum != built.checksum
+    assert len(compiler.compiles) == 2
+
+    forced = asyncio.run(builder.build(store, 12345678, force=True))
+    assert forced.compiled and forced.checksum == changed.checksum
+    assert len(compiler.compiles) == 3
+
+
+def test_overlapping_builds_share_a_compile(store, builder, compiler):
+    deposit(store, {"main.tex": MAIN, "sections/intro.tex": b"Hello"})
+
+    async def build_twice():
+        return await asyncio.gather(
+            builder.build(store, 12345678), builder.build(store, 12345678)
+        )
+
+    first, second = asyncio.run(build_twice())
+    assert first == second
+    assert compiler.compiles == ["main.tex"]
+
+
+def test_pdf_source_is_its_preview(tmp_path, builder, compiler):
+    store = LegacyFileStore(root_dir=tmp_path)
+    pdf = b"%PDF-1.5 the paper"
+    deposit(store, {"paper.pdf": pdf})
+    built = asyncio.run(builder.build(store, 12345678))
+    assert compiler.compiles == []
+    assert asyncio.run(store.get_preview(12345678)).path.read_bytes() == pdf
+    assert built.compiled
+
+
+def test_build_errors(tmp_path, builder):
+    store = LegacyFileStore(root_dir=tmp_path)
+    with pytest.raises(CompileError, match="no source"):
+        asyncio.run(builder.build(store, 12345678))
+
+    deposit(store, {"notes.txt": b"not tex"})
+    with pytest.raises(CompileError, match="No main TeX file"):
+        asyncio.run(builder.build(store, 12345678))
+
+    deposit(store, {"main.tex": b"\\documentclass{article}\\error"})
+    with pytest.raises(CompileError, match="did not compile"):
+        asyncio.run(builder.build(store, 12345678))
+    assert not store.does_preview_exist(12345678)
+
+
+def test_pdflatex_missing_command(tmp_path):
+    compiler = PdfLatex(command="no-such-pdflatex")
+    (tmp_path / "main.tex").write_bytes(MAIN)
+    with pytest.raises(CompileError, match="not installed"):
+        compiler(tmp_path, "main.tex", tmp_path)
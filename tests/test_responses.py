@@ -0,0 +1,92 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from submit_ce.fastapi.api.responses import (
+    parse_range,
+    RangeNotSatisfiable,
+    stored_file_response,
+)
+from submit_ce.file_store import StoredFile
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=90-200", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=-200", 100) == (0, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    for header in ["bytes=100-", "bytes=5-4", "bytes=-0"]:
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range(header, 100)
+
+
+@pytest.fixture
+def client(tmp_path) -> TestClient:
+    data = bytes(range(256)) * 1024
+    (tmp_path / "file.pdf").write_bytes(data)
+    stored = StoredFile(path=tmp_path / "file.pdf", size=len(data), checksum="abc123")
+    app = FastAPI()
+
+    @app.api_route("/file", methods=["GET", "HEAD"])
+    async def get_file(request: Request):
+        return stored_file_response(request, stored)
+
+    return TestClient(app)
+
+
+def test_stored_file_response(client):
+    data = bytes(range(256)) * 1024
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["etag"] == '"abc123"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "application/pdf"
+
+    response = client.head("/file")
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(data))
+    assert response.content == b""
+
+    response = client.get("/file", headers={"Range": "bytes=1000-300000"})
+    assert response.status_code == 206
+    assert (
+        response.headers["content-range"] == f"bytes 1000-{len(data) - 1}/{len(data)}"
+    )
+    assert response.content == data[1000:]
+
+    response = client.get("/file", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == data[-10:]
+
+    response = client.get("/file", headers={"Range": f"bytes={len(data)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(data)}"
+
+    # a range for another version of the file gets the whole file
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert response.status_code == 200
+    assert response.content == data
+    response = client.get(
+        "/file", headers={"Range": "bytes=0-9", "If-Range": '"abc123"'}
+    )
+    assert response.status_code == 206
+    assert response.content == data[:10]
+
+
+def test_stored_file_response_not_modified(client):
+    response = client.get("/file", headers={"If-None-Match": '"abc123"'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == '"abc123"'
+    assert (
+        client.get(
+            "/file", headers={"If-None-Match": '"other", W/"abc123"'}
+        ).status_code
+        == 304
+    )
+    assert client.get("/file", headers={"If-None-Match": '"other"'}).status_code == 200
@@ -0,0 +1,70 @@
+import pytest
+
+from submit_ce.file_store.manifest import ManifestEntry
+from submit_ce.file_store.tex_detect import main_file_score, rank_main_files
+
+MAIN = (
+    b"\\pdfoutput=1\n\\documentclass[11pt]{article}\n\\usepackage{graphicx}\n"
+    b"\\begin{document}\n"
+)
+
+
+@pytest.mark.parametrize(
+    "name, head, score",
+    [
+        ("main.tex", MAIN, 15),
+        ("paper.tex", b"\\documentclass{revtex4}\n\\begin{document}", 14),
+        ("src/paper.tex", b"\\documentclass{revtex4}\n\\begin{document}", 13),
+        ("old.tex", b"\\documentstyle[12pt]{article}", 9),
+        ("body.tex", b"\\begin{document}\n\\input{intro}", 5),
+        ("sections/intro.tex", b"\\section{Introduction}", 0),
+        ("commented.tex", b"% \\documentclass{article}\n\\section{A}", 0),
+        ("percent.tex", b"50\\% of \\documentclass{article}", 9),
+        (
+            "sections/part.tex",
+            b"\\documentclass[../main.tex]{subfiles}\n\\begin{document}",
+            6,
+        ),
+        ("fig.eps", b"%!PS-Adobe", None),
+    ],
+)
+def test_main_file_score(name, head, score):
+    file_type = "postscript" if name.endswith(".eps") else "tex"
+    assert main_file_score(name, file_type, head) == score
+
+
+def test_documentclass_after_detect_size():
+    head = b"%" + b"x" * 2000 + b"\n\\documentclass{article}"
+    assert (
+        ManifestEntry.from_head("main.tex", len(head), "c", None, head).main_score == 10
+    )
+
+
+def test_rank_main_files():
+    entries = [
+        ManifestEntry.from_head(name, len(head), "c", None, head)
+        for name, head in [
+            (
+                "sections/part.tex",
+                b"\\documentclass[../main.tex]{subfiles}\n\\begin{document}",
+            ),
+            ("b/main.tex", MAIN),
+            ("a/main.tex", MAIN),
+            ("notes.tex", b"\\section{Notes}"),
+            ("main.tex", MAIN),
+            ("fig.png", b"\x89PNG\r\n\x1a\n"),
+            ("old.tex", b"\\documentclass{article}"),
+        ]
+    ]
+    entries.append(
+        ManifestEntry(
+            name="from_old_manifest.tex", size=1, checksum="c", file_type="tex"
+        )
+    )
+    assert rank_main_files(entries) == [
+        "main.tex",
+        "a/main.tex",
+        "b/main.tex",
+        "old.tex",
+        "sections/part.tex",
+    ]